@@ -0,0 +1,59 @@
+"""
+Compare HTTP/1.1 `requests.Session` with `HTTP2Session` against local fake gateways.
+
+Usage: python -m benchmarks.http2_transport [--threads 32] [--calls 2000] [--delay 0.005]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from csob.fake_gateway import FakeGateway
+from csob.health import percentile
+from csob.http2 import FakeHTTP2Gateway, HTTP2Session
+
+
+def run(gateway, session, threads, calls):
+    client = gateway.client(session=session) if session is not None else gateway.client()
+    pay_ids = [client.payment_init(str(i), 100, False, 'https://localhost', 'Benchmark').response_json['payId']
+               for i in range(threads)]
+
+    def call(i):
+        started = time.perf_counter()
+        if i % 2:
+            client.payment_status(pay_ids[i % threads])
+        else:
+            client.payment_close(pay_ids[i % threads], None)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        latencies = sorted(executor.map(call, range(calls)))
+    duration = time.perf_counter() - started
+    client.session.close()
+    return {
+        'throughput': calls / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'sockets': gateway.connections_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--delay', type=float, default=0.005)
+    args = parser.parse_args()
+
+    for name, gateway_class, session_factory in (
+            ('HTTP/1.1 requests.Session', FakeGateway, lambda: None),
+            ('HTTP/2 HTTP2Session', FakeHTTP2Gateway, lambda: HTTP2Session(http1=False))):
+        with gateway_class() as gateway:
+            gateway.delay = args.delay
+            result = run(gateway, session_factory(), args.threads, args.calls)
+        print('{:<28} {throughput:8.1f} calls/s  p50 {p50_ms:7.2f} ms  p99 {p99_ms:7.2f} ms  sockets {sockets}'.format(
+            name, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Compare sequential calls with `APIClient.pipeline` against a local fake gateway.
+
+Usage: python -m benchmarks.pipeline [--calls 500] [--delay 0.01] [--send-workers 8]
+"""
+import argparse
+import time
+
+from csob.fake_gateway import FakeGateway
+from csob.pipeline import Operation
+
+
+def operations(calls):
+    for i in range(calls):
+        yield Operation('payment_init', (str(i), 100, False, 'https://localhost', 'Benchmark'))
+
+
+def run_sequential(client, calls):
+    for operation in operations(calls):
+        getattr(client, operation.name)(*operation.args)
+
+
+def run_pipeline(client, calls, send_workers):
+    for result in client.pipeline(operations(calls), send_workers=send_workers):
+        if result.error is not None:
+            raise result.error
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--delay', type=float, default=0.01)
+    parser.add_argument('--send-workers', type=int, default=8)
+    args = parser.parse_args()
+
+    for name, run in (
+            ('sequential', lambda client: run_sequential(client, args.calls)),
+            ('pipeline', lambda client: run_pipeline(client, args.calls, args.send_workers))):
+        with FakeGateway() as gateway:
+            gateway.delay = args.delay
+            client = gateway.client()
+            started = time.perf_counter()
+            run(client)
+            duration = time.perf_counter() - started
+            client.session.close()
+        print('{:<12} {:8.1f} calls/s'.format(name, args.calls / duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,35 @@
+import copy
+import gc
 import os
 import sys
-from base64 import b64encode
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from typing import List, Optional, Union, Dict
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Union
 
 import requests
 import import_string
-from cached_property import cached_property
 
 from csob.api_response import APIResponse
+from csob.circuit_breaker import CircuitBreakerRegistry
+from csob.customer_cache import CustomerInfoCache
+from csob.crypto import import_key, url_signature_cache
+from csob.deadline import Deadline
 from csob.enums import (
     Currency, HTTPMethod, Language, PaymentButtonBrand, PayMethod, PayOperation)
+from csob.hedging import HedgingPolicy
+from csob.instrumentation import Instrumentation
+from csob.ledger import Ledger
+from csob.models import OneClickInitRequest, PaymentInitRequest
+from csob.outbox import Outbox
 from csob.payment import Item
+from csob.pipeline import Pipeline, PipelineResult
+from csob.rate_limit import RateLimiter
+from csob.routing import EndpointSet
+from csob.resources import SignedCall
 from csob.resources.echo import EchoResource
+from csob.resources.oneclick import OneClickInitResource, OneClickStartResource
 from csob.resources.payment.close import PaymentCloseResource
 from csob.resources.customer.info import CustomerInfoResource
 from csob.resources.payment.init import PaymentInitResource
@@ -20,9 +37,19 @@ from csob.resources.payment.process import PaymentProcessResource
 from csob.resources.payment.refund import PaymentRefundResource
 from csob.resources.payment.reverse import PaymentReverseResource
 from csob.resources.payment.status import PaymentStatusResource
+from csob.slow_calls import SlowCallRecorder
+from csob.utils import locked_cached_property
 
 AmountHundredths = Union[Decimal, int]
 
+# Names (prefixes) of threads which `prepare_for_fork` refuses to fork, `after_fork` does not start them again
+FORK_UNSAFE_THREADS = ('csob-health-monitor', 'csob-poller-')
+
+# Attributes which `APIClient.replace` may change, resources get them from `resource_kwargs`
+REPLACEABLE_OPTIONS = frozenset((
+    'api_url', 'session', 'raise_exceptions', 'circuit_breakers', 'instrumentation', 'rate_limiter', 'hedging',
+    'ledger', 'customer_info_cache', 'slow_calls', 'endpoints', 'outbox', 'defer'))
+
 
 class APIClient:
     """
@@ -37,10 +64,31 @@ class APIClient:
     api_url: str
     session: requests.Session
     raise_exceptions: bool
+    circuit_breakers: Optional[CircuitBreakerRegistry]
+    instrumentation: Optional[Instrumentation]
+    rate_limiter: Optional[RateLimiter]
+    hedging: Optional[HedgingPolicy]
+    ledger: Optional[Ledger]
+    customer_info_cache: Optional[CustomerInfoCache]
+    slow_calls: Optional[SlowCallRecorder]
+    endpoints: Optional[EndpointSet]
+    outbox: Optional[Outbox]
+    # Operations return `SignedCall` instead of sending the request, see `replace`
+    defer: bool = False
 
     def __init__(self, merchant_id: str, private_key_path: str, gateway_public_key_path: Optional[str] = None,
                  api_url: str = 'https://api.platebnibrana.csob.cz/api/v1.7/',
-                 session_generator_str: Optional[str] = None, raise_exceptions: bool = True) -> None:
+                 session_generator_str: Optional[str] = None, raise_exceptions: bool = True,
+                 session: Optional[requests.Session] = None,
+                 circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 hedging: Optional[HedgingPolicy] = None,
+                 ledger: Optional[Ledger] = None,
+                 customer_info_cache: Optional[CustomerInfoCache] = None,
+                 slow_calls: Optional[SlowCallRecorder] = None,
+                 endpoints: Optional[EndpointSet] = None,
+                 outbox: Optional[Outbox] = None) -> None:
         """
         Load private and public key.
 
@@ -49,21 +97,64 @@ class APIClient:
             private_key_path: Path to Merchant’s private key
             gateway_public_key_path: Path to Payment Gateway's public key
             api_url: The API's url
-            session_generator_str: Python package path to the Session generator
+            session_generator_str: Python package path to the Session generator (a Session class or function
+                returning a Session, or a Session instance)
             raise_exceptions: Whether should functions return APIResponse with errors or raise exceptions.
+            session: Session to be used instead of the generated one, e.g. `csob.cassette.CassetteSession`.
+            circuit_breakers: Registry of circuit breakers guarding the calls, half-open breakers are probed
+                with `echo`.
+            instrumentation: Receives events emitted by the client and its components.
+            rate_limiter: Rate limiter consulted before every request, use a shared backend to limit
+                requests of all processes.
+            hedging: Hedging of slow `payment_status`, `customer_info` and `echo` GET requests.
+            ledger: Records results of payment operations for local queries.
+            customer_info_cache: Cache of `customer_info` results.
+            slow_calls: Captures phase timings of calls slower than its threshold.
+            endpoints: API URLs the requests are routed to by their health, `api_url` is then only the base
+                of the built URLs.
+            outbox: Stores events of payment status changes seen by calls and parsed return URLs.
 
         Warnings:
             If cart specified is specified it has to have at least 1 item (e.g. “Your purchase”) and at most 2 items.
             (e.g. “Your purchase” and “Shipping & Handling”). The limitation is given by the graphical design.
         """
         self.raise_exceptions = raise_exceptions
-        self.session = import_string(session_generator_str) if session_generator_str is not None else requests.Session()
-        self.session.headers.update({'Content-Type': 'application/json'})
+        self.session_generator_str = session_generator_str
+        self._owns_session = session is None
+        self.session = session if session is not None else self._generate_session()
         self.api_url = api_url
         self.gateway_public_key_path = (
             gateway_public_key_path or os.path.join(sys.prefix, 'csob_keys/mips_platebnibrana.csob.cz.pub'))
         self.private_key_path = private_key_path
         self.merchant_id = merchant_id
+        self.instrumentation = instrumentation
+        self.rate_limiter = rate_limiter
+        self.hedging = hedging
+        self.ledger = ledger
+        self.customer_info_cache = customer_info_cache
+        self.slow_calls = slow_calls
+        self.endpoints = endpoints
+        self.outbox = outbox
+        if endpoints is not None and instrumentation is not None:
+            endpoints.set_instrumentation(instrumentation)
+        if ledger is not None and instrumentation is not None:
+            ledger.set_instrumentation(instrumentation)
+        if slow_calls is not None and instrumentation is not None:
+            slow_calls.set_instrumentation(instrumentation)
+        self._mount_adapters()
+        if customer_info_cache is not None and instrumentation is not None:
+            customer_info_cache.set_instrumentation(instrumentation)
+        if hedging is not None and instrumentation is not None:
+            hedging.set_instrumentation(instrumentation)
+        if outbox is not None and instrumentation is not None:
+            outbox.set_instrumentation(instrumentation)
+        if instrumentation is not None:
+            instrumentation.register_collector('url_signature_cache', url_signature_cache.stats)
+        self.circuit_breakers = circuit_breakers
+        if circuit_breakers is not None:
+            if instrumentation is not None:
+                circuit_breakers.set_instrumentation(instrumentation)
+            circuit_breakers.register_probe(merchant_id, self._echo_probe)
 
     def payment_init(self, order_number: str, total_amount: AmountHundredths,
                      close_payment: bool, return_url: str, description: str,
@@ -77,7 +168,9 @@ class APIClient:
                      language: Language = Language.CZ,
                      ttl_sec: Optional[int] = None,
                      logo_version: Optional[int] = None,
-                     color_scheme_version: Optional[int] = None) -> APIResponse:
+                     color_scheme_version: Optional[int] = None,
+                     presign_process_url: bool = False,
+                     deadline: Optional[Deadline] = None) -> APIResponse:
         """
         Initialize new payment.
 
@@ -120,37 +213,60 @@ class APIClient:
             color_scheme_version: Version of the merchant colour scheme. Approved version must be provided
                 (if not, available approved version will be used). Should no approved logo
                 be available for merchant, default placeholder will be shown.
+            presign_process_url: Construct signed `payment/process` URL of the initialized payment and store it
+                in `APIResponse.process_url`.
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
 
         Returns:
             APIResponse
         """
-        if isinstance(total_amount, Decimal):
-            total_amount = int(total_amount * 100)
+        api_response = PaymentInitResource(deadline=deadline, **self.resource_kwargs).post(PaymentInitRequest(
+            order_number=order_number, pay_operation=pay_operation, pay_method=pay_method,
+            total_amount=total_amount, currency=currency, close_payment=close_payment, return_url=return_url,
+            return_method=return_method, description=description, language=language, merchant_data=merchant_data,
+            customer_id=customer_id, cart=cart, ttl_sec=ttl_sec, logo_version=logo_version,
+            color_scheme_version=color_scheme_version,
+        ))
+        if presign_process_url and api_response.is_okay and api_response.is_verified:
+            api_response.process_url = self.construct_payment_process_url(api_response.response_json['payId'])
+
+        return api_response
+
+    def construct_payment_process_url(self, pay_id: str) -> str:
+        """
+        Construct the signed url to redirect the user to after payment initialization.
+
+        No request is made, the url is signed locally and the customer's browser is redirected to it.
+
+        See Also:
+            https://github.com/csob/paymentgateway/wiki/eAPI-v1.7-EN#get--httpsapiplatebnibranacsobczapiv17paymentprocess-  # noqa
+
+        Args:
+            pay_id: Unique payment ID (assigned by the payment gateway in the init operation)
 
-        return PaymentInitResource(**self.resource_kwargs).post(
-            order_number=order_number, pay_operation=pay_operation.value,
-            pay_method=pay_method.value, total_amount=total_amount, currency=currency.value,
-            close_payment=close_payment, return_url=return_url, return_method=return_method.value,
-            description=description, language=language.value,
-            merchant_data=str(b64encode(bytes(merchant_data, "utf-8")), "utf-8") if merchant_data is not None else None,
-            customer_id=customer_id, cart=([i.dict for i in cart] if cart is not None else None),
-            ttl_sec=ttl_sec, logo_version=logo_version, color_scheme_version=color_scheme_version
-        )
+        Returns:
+            str - URL
+        """
+        return PaymentProcessResource(**self.resource_kwargs).get_process_url(pay_id)
 
-    def get_payment_process_url(self, pay_id: str) -> APIResponse:
+    def get_payment_process_url(self, pay_id: str, deadline: Optional[Deadline] = None) -> APIResponse:
         """
         Get the url to redirect the user to after payment initialization.
 
+        Notes:
+            This makes a request to the gateway, use `construct_payment_process_url` to get the url without it.
+
         See Also:
             https://github.com/csob/paymentgateway/wiki/eAPI-v1.7-EN#get--httpsapiplatebnibranacsobczapiv17paymentprocess-  # noqa
 
         Args:
             pay_id: Unique payment ID (assigned by the payment gateway in the init operation)
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
 
         Returns:
             APIResponse
         """
-        return PaymentProcessResource(**self.resource_kwargs).get(pay_id)
+        return PaymentProcessResource(deadline=deadline, **self.resource_kwargs).get(pay_id)
 
     def get_payment_button_params(self, pay_id: str, brand: PaymentButtonBrand) -> APIResponse:
         """
@@ -208,7 +324,7 @@ class APIClient:
         """
         return PaymentProcessResource(**self.resource_kwargs).parse_response_dict(post_data)
 
-    def payment_status(self, pay_id: str) -> APIResponse:
+    def payment_status(self, pay_id: str, deadline: Optional[Deadline] = None) -> APIResponse:
         """
         Get status of a payment.
 
@@ -217,13 +333,14 @@ class APIClient:
 
         Args:
             pay_id: Unique payment ID (assigned by the payment gateway in the init operation)
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
 
         Returns:
             APIResponse - Return values are identical with the definition contained in the payment/init operation.
         """
-        return PaymentStatusResource(**self.resource_kwargs).get(pay_id)
+        return PaymentStatusResource(deadline=deadline, **self.resource_kwargs).get(pay_id)
 
-    def payment_reverse(self, pay_id: str) -> APIResponse:
+    def payment_reverse(self, pay_id: str, deadline: Optional[Deadline] = None) -> APIResponse:
         """
         Reverse already authorised transaction.
 
@@ -232,13 +349,15 @@ class APIClient:
 
         Args:
             pay_id: Unique payment ID (assigned by the payment gateway in the init operation)
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
 
         Returns:
             APIResponse - Return values are identical with the definition contained in the payment/init operation.
         """
-        return PaymentReverseResource(**self.resource_kwargs).put(pay_id)
+        return PaymentReverseResource(deadline=deadline, **self.resource_kwargs).put(pay_id)
 
-    def payment_close(self, pay_id: str, total_amount: Optional[AmountHundredths]) -> APIResponse:
+    def payment_close(self, pay_id: str, total_amount: Optional[AmountHundredths],
+                      deadline: Optional[Deadline] = None) -> APIResponse:
         """
         The operation will add the transaction to settlement.
 
@@ -250,16 +369,15 @@ class APIClient:
             total_amount: Total amount in hundredths of the basic currency. Value must be positive and
                 less or equal than original amount (see totalAmount parameter in payment/init operation)
                 (Decimals are automatically converted.)
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
 
         Returns:
             APIResponse - Return values are identical with the definition contained in the payment/init operation.
         """
-        if isinstance(total_amount, Decimal):
-            total_amount = int(total_amount * 100)
-
-        return PaymentCloseResource(**self.resource_kwargs).put(pay_id, total_amount)
+        return PaymentCloseResource(deadline=deadline, **self.resource_kwargs).put(pay_id, total_amount)
 
-    def payment_refund(self, pay_id: str, amount: Optional[AmountHundredths] = None) -> APIResponse:
+    def payment_refund(self, pay_id: str, amount: Optional[AmountHundredths] = None,
+                       deadline: Optional[Deadline] = None) -> APIResponse:
         """
         Refund whole payment or it's part.
 
@@ -275,16 +393,14 @@ class APIClient:
             pay_id: Unique payment ID (assigned by the payment gateway in the init operation)
             amount: Requested refund amount for the partial refund in hundredths of the original currency.
                 (Decimals are automatically converted.)
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
 
         Returns:
             APIResponse - Return values are identical with the definition contained in the payment/init operation.
         """
-        if isinstance(amount, Decimal):
-            amount = int(amount * 100)
+        return PaymentRefundResource(deadline=deadline, **self.resource_kwargs).put(pay_id, amount)
 
-        return PaymentRefundResource(**self.resource_kwargs).put(pay_id, amount)
-
-    def echo(self, method: HTTPMethod = HTTPMethod.GET) -> APIResponse:
+    def echo(self, method: HTTPMethod = HTTPMethod.GET, deadline: Optional[Deadline] = None) -> APIResponse:
         """
         Test if API is working and provided merchant_id and private_key are valid.
 
@@ -294,11 +410,12 @@ class APIClient:
         Args:
             method: The operation may be called using the POST method (parameters are sent in the request body in the
                 JSON format) or using the GET method – the request contains items directly in the URL.
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
 
         Returns:
             APIResponse
         """
-        resource = EchoResource(**self.resource_kwargs)
+        resource = EchoResource(deadline=deadline, **self.resource_kwargs)
         if method == HTTPMethod.GET:
             return resource.get()
         elif method == HTTPMethod.POST:
@@ -306,7 +423,7 @@ class APIClient:
         else:
             raise ValueError('Invalid method for `echo`.')
 
-    def customer_info(self, customer_id: str) -> APIResponse:
+    def customer_info(self, customer_id: str, deadline: Optional[Deadline] = None) -> APIResponse:
         """
         List information about customers with remembered cards.
 
@@ -315,13 +432,241 @@ class APIClient:
 
         Args:
             customer_id: Customer’s ID assigned in the e-shop, maximum length 50 characters.
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
 
         Returns:
             APIResponse
         """
-        return CustomerInfoResource(**self.resource_kwargs).get(customer_id)
+        return CustomerInfoResource(deadline=deadline, **self.resource_kwargs).get(customer_id)
+
+    def oneclick_init(self, orig_pay_id: str, order_number: str, total_amount: AmountHundredths, description: str,
+                      currency: Currency = Currency.CZK, client_ip: Optional[str] = None,
+                      merchant_data: Optional[str] = None, deadline: Optional[Deadline] = None) -> APIResponse:
+        """
+        Initialize a new payment charged on the card of a one-click payment template.
+
+        See Also:
+            https://github.com/csob/paymentgateway/wiki/eAPI-v1.7-EN#post-httpsapiplatebnibranacsobczapiv17oneclickinit-
+
+        Args:
+            orig_pay_id: payId of the payment template (payment initialized with `PayOperation.ONE_CLICK_PAYMENT`)
+            order_number: Reference number of the order, 10 digits max.
+            total_amount: Total amount in hundredths of the basic currency. (Decimals are automatically converted.)
+            description: Brief description of the purchase, maximum length is 255 characters.
+            currency: Currency code.
+            client_ip: IP address of the customer.
+            merchant_data: Any additional data, they will be BASE64 encoded. Maximum length for encoding is
+                255 characters.
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
+
+        Returns:
+            APIResponse - payId of the new payment is in `response_json`
+        """
+        return OneClickInitResource(deadline=deadline, **self.resource_kwargs).post(OneClickInitRequest(
+            orig_pay_id=orig_pay_id, order_number=order_number, client_ip=client_ip, total_amount=total_amount,
+            currency=currency, description=description, merchant_data=merchant_data,
+        ))
+
+    def oneclick_start(self, pay_id: str, deadline: Optional[Deadline] = None) -> APIResponse:
+        """
+        Start processing of a payment initialized by `oneclick_init`.
+
+        See Also:
+            https://github.com/csob/paymentgateway/wiki/eAPI-v1.7-EN#post-httpsapiplatebnibranacsobczapiv17oneclickstart-
+
+        Args:
+            pay_id: payId returned by `oneclick_init`
+            deadline: Time budget of the call, `DeadlineExceededException` is raised when it expires before sending.
+
+        Returns:
+            APIResponse
+        """
+        return OneClickStartResource(deadline=deadline, **self.resource_kwargs).post(pay_id)
+
+    def pipeline(self, operations: Iterable, sign_workers: Optional[int] = None, send_workers: int = 8,
+                 queue_size: int = 64, deadline: Optional[Deadline] = None,
+                 outcomes: bool = False) -> Iterator[PipelineResult]:
+        """
+        Call many operations, signing of the next requests overlaps with sending of the previous ones.
+
+        Example:
+            for result in client.pipeline(Operation('payment_status', (pay_id,)) for pay_id in pay_ids):
+                ...
+
+        Args:
+            operations: `csob.pipeline.Operation` instances (name of the method, args and kwargs)
+            sign_workers: Number of signing threads, defaults to the number of CPUs
+            send_workers: Number of sending threads
+            queue_size: Size of the queues between the stages
+            deadline: Deadline of the operations which do not have their own one
+            outcomes: Send without raising exceptions and return `csob.outcome.Outcome` of every sent operation
+                in `PipelineResult.outcome`, count them with `csob.outcome.OutcomeCounter`
+
+        Returns:
+            Iterator of `PipelineResult` in the order of completion, errors are returned in `PipelineResult.error`
+        """
+        return Pipeline(self, sign_workers=sign_workers, send_workers=send_workers, queue_size=queue_size,
+                        deadline=deadline, outcomes=outcomes).run(operations)
+
+    def _generate_session(self) -> requests.Session:
+        if self.session_generator_str is None:
+            session = requests.Session()
+        else:
+            session = import_string(self.session_generator_str)
+            if callable(session):
+                session = session()
+        session.headers.update({'Content-Type': 'application/json'})
+        return session
+
+    def warm_up(self) -> 'APIClient':
+        """
+        Read and parse the keys and build resource arguments now instead of on the first call.
+
+        Returns:
+            APIClient
+        """
+        import_key(self.resource_kwargs['private_key'])
+        import_key(self.resource_kwargs['gateway_key'])
+        return self
+
+    def replace(self, **options: Any) -> 'APIClient':
+        """
+        Get a copy of the client with the given options replaced, the client itself is not changed.
+
+        The copy shares the parsed keys and everything not replaced, e.g. `client.replace(raise_exceptions=False)`
+        or `client.replace(defer=True)` signing the requests without sending them. Components keep
+        the instrumentation they got from the client.
+
+        Args:
+            options: Attributes of the client listed in `REPLACEABLE_OPTIONS`
+
+        Returns:
+            APIClient
+
+        Raises:
+            ValueError - an option cannot be replaced
+        """
+        client = copy.copy(self)
+        if 'session' in options:
+            client._owns_session = False
+        client._set_options(options)
+        return client
+
+    def _set_options(self, options: Dict[str, Any]) -> None:
+        unknown = set(options) - REPLACEABLE_OPTIONS
+        if unknown:
+            raise ValueError('Options {} cannot be replaced.'.format(', '.join(sorted(unknown))))
+        for name, value in options.items():
+            setattr(self, name, value)
+        # The snapshot is built again from the attributes on the next access
+        self.__dict__.pop('resource_kwargs', None)
+
+    def prepare_for_fork(self) -> 'APIClient':
+        """
+        Prepare the client in the master process of a pre-forking server (e.g. gunicorn `on_starting` hook).
+
+        The client is warmed up so the parsed keys are shared by the workers through copy-on-write pages, open
+        connections are closed so no socket is shared by the workers and garbage collector is frozen
+        so it does not touch (and copy) the shared objects.
+
+        Returns:
+            APIClient
+
+        Raises:
+            RuntimeError - a health monitor or a sharded poller is running, threads do not run in the workers,
+                start them in the workers instead
+        """
+        running = sorted(
+            thread.name for thread in threading.enumerate() if thread.name.startswith(FORK_UNSAFE_THREADS))
+        if running:
+            raise RuntimeError('Stop {} before forking, threads do not run in forked processes.'.format(
+                ', '.join(running)))
+        self.warm_up()
+        self._close_connections()
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+        return self
+
+    def after_fork(self, preconnect: int = 0) -> 'APIClient':
+        """
+        Rebuild the connection pool in the worker process (e.g. gunicorn `post_fork` hook).
+
+        Generated sessions are created anew, a session given as an instance gets its connection pools emptied
+        (and its `after_fork` called, e.g. `csob.http2.HTTP2Session`). Threads of the hedging policy, the ledger
+        and the outbox are started anew.
 
-    @cached_property
+        Args:
+            preconnect: Number of connections (including TLS handshake) to open to the gateway now
+
+        Returns:
+            APIClient
+        """
+        if self._owns_session:
+            self._close_connections()
+            self._set_options({'session': self._generate_session()})
+            self._mount_adapters()
+        else:
+            self._close_connections()
+            if hasattr(self.session, 'after_fork'):
+                self.session.after_fork()  # type: ignore
+        for component in (self.hedging, self.ledger, self.outbox):
+            if component is not None:
+                component.after_fork()
+
+        if preconnect:
+            self.preconnect(preconnect)
+        return self
+
+    def _mount_adapters(self) -> None:
+        """
+        Mount the adapter timing connections of the slow call recorder for the gateway URLs.
+        """
+        if self.slow_calls is not None:
+            urls = [self.api_url] + (self.endpoints.urls if self.endpoints is not None else [])
+            self.slow_calls.mount(self.session, urls)
+
+    def _close_connections(self) -> None:
+        for adapter in self.session.adapters.values():
+            adapter.close()
+
+    def preconnect(self, count: int) -> None:
+        """
+        Open connections to the gateway in the pool of the session by sending `echo` requests at once.
+
+        Args:
+            count: Number of connections to open, connections over the pool size of the session are not kept
+        """
+        resource_kwargs = dict(self.resource_kwargs, circuit_breakers=None, raise_exception=False, defer=True)
+        calls = [EchoResource(**resource_kwargs).get() for _ in range(count)]
+        # Requests are signed in advance and sent together, so each of them takes its own connection
+        barrier = threading.Barrier(count)
+
+        def send(call: SignedCall) -> None:
+            barrier.wait()
+            try:
+                call.send()
+            except requests.RequestException:
+                pass
+
+        with ThreadPoolExecutor(count, thread_name_prefix='csob-preconnect') as executor:
+            list(executor.map(send, calls))
+
+    def _echo_probe(self) -> bool:
+        """
+        Check the gateway with `echo` bypassing circuit breakers.
+
+        Returns:
+            bool - whether the gateway responded with verified OK
+        """
+        resource = EchoResource(**dict(self.resource_kwargs, circuit_breakers=None, raise_exception=False))
+        try:
+            api_response = resource.get()
+        except requests.RequestException:
+            return False
+        return api_response.is_okay and bool(api_response.is_verified)
+
+    @locked_cached_property
     def _private_key(self) -> str:
         """
         Get text representation of private key.
@@ -332,10 +677,10 @@ class APIClient:
         with open(self.private_key_path, 'r') as f:
             return f.read()
 
-    @cached_property
+    @locked_cached_property
     def gateway_public_key(self) -> str:
         """
-        Get text representation of private key.
+        Get text representation of gateway public key, `_gateway_public_key` is used when set.
 
         Returns:
             str
@@ -344,17 +689,31 @@ class APIClient:
             return self._gateway_public_key
 
         with open(self.gateway_public_key_path, 'r') as f:
-            self._gateway_public_key = f.read()
+            return f.read()
 
-        return self._gateway_public_key
+    @locked_cached_property
+    def resource_kwargs(self) -> Mapping[str, Any]:
+        """
+        Get immutable snapshot of the configuration passed to resources.
 
-    @cached_property
-    def resource_kwargs(self) -> Dict:
-        return {
+        Returns:
+            Mapping
+        """
+        return MappingProxyType({
             'base_url': self.api_url,
             'merchant_id': self.merchant_id,
             'gateway_key': self.gateway_public_key,
             'private_key': self._private_key,
             'session': self.session,
             'raise_exception': self.raise_exceptions,
-        }
+            'circuit_breakers': self.circuit_breakers,
+            'instrumentation': self.instrumentation,
+            'rate_limiter': self.rate_limiter,
+            'hedging': self.hedging,
+            'ledger': self.ledger,
+            'customer_info_cache': self.customer_info_cache,
+            'slow_calls': self.slow_calls,
+            'endpoints': self.endpoints,
+            'outbox': self.outbox,
+            'defer': self.defer,
+        })
@@ -4,12 +4,13 @@ from cached_property import cached_property
 from requests import Response
 
 from csob.enums import ResultCode, PaymentStatus
-from csob.exceptions import SERVICE_RESULT_CODE_EXCEPTION_DICT
+from csob.exceptions import SERVICE_RESULT_CODE_EXCEPTION_DICT, ServiceResultCodeException
 
 
 class APIResponse:
     api_response: Optional[Response] = None
     is_verified: Optional[bool] = None
+    process_url: Optional[str] = None
     _parsed_data: Optional[dict] = None
 
     def __init__(self, api_response: Optional[Response] = None, parsed_data: Optional[dict] = None,
@@ -22,7 +23,8 @@ class APIResponse:
 
         if self.is_verified:
             if raise_exception and self.is_okay is False:
-                raise SERVICE_RESULT_CODE_EXCEPTION_DICT[self.result_code]
+                exception_class = SERVICE_RESULT_CODE_EXCEPTION_DICT.get(self.result_code, ServiceResultCodeException)
+                raise exception_class(self.api_response, self.result_message, self)
 
     @cached_property
     def response_json(self) -> Optional[dict]:
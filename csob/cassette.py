@@ -0,0 +1,161 @@
+import gzip
+import json
+import re
+from enum import Enum
+from itertools import cycle
+from threading import Lock
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from csob.exceptions import CassetteMissException
+
+DTTM_RE = re.compile(r'^\d{14}$')
+
+
+class CassetteMode(Enum):
+    """
+    Mode of `CassetteSession`.
+    """
+
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+
+class Interaction(NamedTuple):
+    status_code: int
+    content_type: Optional[str]
+    body: str
+
+
+def get_request_key(method: str, url: str, json_data: Optional[Dict] = None) -> str:
+    """
+    Get key identifying the request regardless of the time it was signed at.
+
+    Host is dropped from the URL, trailing `dttm` and `signature` of signed GET URLs are replaced by placeholders
+    and `dttm` and `signature` are removed from the body.
+
+    Args:
+        method: HTTP method
+        url: Whole URL of the request
+        json_data: Request body
+
+    Returns:
+        str - the key
+    """
+    segments = urlsplit(url).path.rstrip('/').split('/')
+    if len(segments) >= 2 and DTTM_RE.match(segments[-2]):
+        segments[-2:] = ['{dttm}', '{signature}']
+    key = '{} {}'.format(method.upper(), '/'.join(segments))
+
+    if json_data:
+        body = {k: v for k, v in json_data.items() if k not in ('dttm', 'signature')}
+        key += ' ' + json.dumps(body, sort_keys=True, separators=(',', ':'))
+    return key
+
+
+class Cassette:
+    """
+    Recorded request/response pairs stored as JSON lines, gzipped when the path ends with `.gz`.
+
+    Every line holds the request key and status code, content type and body of the response. Responses recorded
+    for the same key are replayed in a cycle.
+    """
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.interactions: Dict[str, List[Interaction]] = {}
+        self._cycles: Dict[str, Iterator[Interaction]] = {}
+        self._lock = Lock()
+
+    def _open(self, mode: str) -> IO[str]:
+        if self.path.endswith('.gz'):
+            return gzip.open(self.path, mode + 't', encoding='utf-8')  # type: ignore
+        return open(self.path, mode, encoding='utf-8')
+
+    def load(self) -> 'Cassette':
+        with self._open('r') as f:
+            for line in f:
+                record = json.loads(line)
+                self.append(record['key'], Interaction(record['status'], record.get('type'), record['body']))
+        return self
+
+    def save(self) -> None:
+        with self._open('w') as f:
+            for key, interactions in self.interactions.items():
+                for interaction in interactions:
+                    f.write(json.dumps({
+                        'key': key,
+                        'status': interaction.status_code,
+                        'type': interaction.content_type,
+                        'body': interaction.body,
+                    }, separators=(',', ':')) + '\n')
+
+    def append(self, key: str, interaction: Interaction) -> None:
+        with self._lock:
+            self.interactions.setdefault(key, []).append(interaction)
+            self._cycles.pop(key, None)
+
+    def play(self, key: str) -> Interaction:
+        """
+        Get the next recorded response for the key.
+
+        Raises:
+            CassetteMissException
+        """
+        with self._lock:
+            if key not in self.interactions:
+                raise CassetteMissException(key)
+            if key not in self._cycles:
+                self._cycles[key] = cycle(self.interactions[key])
+            return next(self._cycles[key])
+
+
+class CassetteSession(requests.Session):
+    """
+    Session which records gateway traffic into a cassette or replays it without network.
+
+    Replayed responses are real `requests.Response` objects with the recorded body, so they go through the whole
+    `parse_response` -> `verify_signature` -> `APIResponse` path of the resources. Recorded cassette is written
+    on `close`.
+    """
+    cassette: Cassette
+    mode: CassetteMode
+
+    def __init__(self, path: str, mode: CassetteMode = CassetteMode.REPLAY) -> None:
+        """
+        Args:
+            path: Path to the cassette file
+            mode: Record the traffic or replay it from the cassette
+        """
+        super().__init__()
+        self.mode = mode
+        self.cassette = Cassette(path)
+        if mode == CassetteMode.REPLAY:
+            self.cassette.load()
+
+    def request(self, method, url, *args, **kwargs):
+        key = get_request_key(method, url, kwargs.get('json'))
+        if self.mode == CassetteMode.RECORD:
+            response = super().request(method, url, *args, **kwargs)
+            self.cassette.append(key, Interaction(response.status_code, response.headers.get('Content-Type'),
+                                                  response.text))
+            return response
+
+        interaction = self.cassette.play(key)
+        response = requests.Response()
+        response.status_code = interaction.status_code
+        response._content = interaction.body.encode('utf-8')
+        response.encoding = 'utf-8'
+        if interaction.content_type is not None:
+            response.headers['Content-Type'] = interaction.content_type
+        response.url = url
+        response.request = requests.Request(method, url, json=kwargs.get('json')).prepare()
+        return response
+
+    def close(self) -> None:
+        if self.mode == CassetteMode.RECORD:
+            self.cassette.save()
+        super().close()
@@ -0,0 +1,225 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from decimal import Decimal
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Set, Union
+
+from csob.api_response import APIResponse
+from csob.enums import Currency, PaymentStatus
+
+if TYPE_CHECKING:
+    from csob.api import APIClient
+
+# Statuses after which the charge is finished
+FINAL_STATUSES = frozenset((
+    PaymentStatus.PAYMENT_CANCELED, PaymentStatus.PAYMENT_CONFIRMED, PaymentStatus.PAYMENT_REVERSED,
+    PaymentStatus.PAYMENT_DENIED, PaymentStatus.PAYMENT_WAITING_FOR_SETTLEMENT, PaymentStatus.PAYMENT_SETTLED,
+))
+SUCCESSFUL_STATUSES = frozenset((
+    PaymentStatus.PAYMENT_CONFIRMED, PaymentStatus.PAYMENT_WAITING_FOR_SETTLEMENT, PaymentStatus.PAYMENT_SETTLED,
+))
+
+
+class ChargeJob(NamedTuple):
+    """
+    Charge of the card remembered by the payment template `orig_pay_id`, `order_number` identifies the job.
+    """
+    orig_pay_id: str
+    order_number: str
+    amount: Union[Decimal, int]
+
+
+class ChargeOutcome(NamedTuple):
+    job: ChargeJob
+    ok: bool
+    pay_id: Optional[str] = None
+    payment_status: Optional[PaymentStatus] = None
+    result_code: Optional[int] = None
+    error: Optional[str] = None
+    resumed: bool = False
+
+
+class ChargeCheckpoint:
+    """
+    Progress of the charges appended to a JSON lines file.
+
+    Every finished step of a job is written, so a resumed run never initializes or starts the same charge twice.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def load(self) -> Dict[str, Dict]:
+        """
+        Get the last recorded state of every job keyed by the order number.
+        """
+        states: Dict[str, Dict] = {}
+        if not os.path.exists(self.path):
+            return states
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    states.setdefault(record['orderNo'], {}).update(record)
+        return states
+
+    def write(self, order_number: str, **data) -> None:
+        line = json.dumps(dict(data, orderNo=order_number)) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class ChargeEngine:
+    """
+    Charges stored cards with one-click payments: oneclick/init, oneclick/start and payment/status of every job.
+
+    Jobs are run by `concurrency` threads and consumed lazily. Requests are limited by `rate_limiter` of the client.
+    With a checkpoint the progress is recorded and a rerun with the same jobs skips finished jobs and continues
+    unfinished ones from their last step.
+    """
+    description: str
+    currency: Currency
+    concurrency: int
+    status_attempts: int
+    status_interval: float
+
+    def __init__(self, client: 'APIClient', description: str, currency: Currency = Currency.CZK,
+                 concurrency: int = 16, checkpoint_path: Optional[str] = None, status_attempts: int = 5,
+                 status_interval: float = 1.0, sleep: Callable[[float], None] = time.sleep) -> None:
+        """
+        Args:
+            client: Client sending the requests
+            description: Description of the charges
+            currency: Currency of the amounts
+            concurrency: Number of jobs processed at once
+            checkpoint_path: Path of the checkpoint file, no checkpoint is kept when None
+            status_attempts: Number of status checks of a started payment before giving up
+            status_interval: Seconds between the status checks
+            sleep: Sleep function
+        """
+        self.client = client
+        self.description = description
+        self.currency = currency
+        self.concurrency = concurrency
+        self.checkpoint_path = checkpoint_path
+        self.status_attempts = status_attempts
+        self.status_interval = status_interval
+        self._sleep = sleep
+
+    @staticmethod
+    def _failed(job: ChargeJob, api_response: APIResponse, pay_id: Optional[str] = None) -> ChargeOutcome:
+        return ChargeOutcome(job, False, pay_id, api_response.payment_status, api_response.result_code,
+                             api_response.result_message or 'HTTP {}'.format(api_response.http_status_code))
+
+    def _rejected(self, job: ChargeJob, api_response: APIResponse, pay_id: Optional[str], resumed: bool,
+                  write: Callable[..., None]) -> ChargeOutcome:
+        """
+        Get outcome of a failed init or start, only a verified result code of the gateway finishes the job.
+        HTTP errors and unverified responses leave the job at its last step to be retried when resumed.
+        """
+        outcome = self._failed(job, api_response, pay_id)._replace(resumed=resumed)
+        if api_response.is_verified and api_response.http_status_code in (None, 200):
+            write(job.order_number, step='done', ok=False, error=outcome.error)
+        return outcome
+
+    def charge(self, job: ChargeJob, state: Optional[Dict] = None,
+               checkpoint: Optional[ChargeCheckpoint] = None) -> ChargeOutcome:
+        """
+        Run the job from its last recorded step.
+
+        Args:
+            job: The job
+            state: Recorded state of the job
+            checkpoint: Records the progress
+
+        Returns:
+            ChargeOutcome
+        """
+        state = state or {}
+        write = checkpoint.write if checkpoint is not None else lambda *args, **kwargs: None
+        pay_id = state.get('payId')
+        resumed = bool(state)
+        try:
+            if pay_id is None:
+                api_response = self.client.oneclick_init(
+                    job.orig_pay_id, job.order_number, job.amount, self.description, currency=self.currency)
+                if not api_response.is_okay or not api_response.is_verified:
+                    return self._rejected(job, api_response, None, resumed, write)
+                pay_id = api_response.response_json['payId']  # type: ignore
+                write(job.order_number, step='init', payId=pay_id)
+
+            if state.get('step') != 'start':
+                api_response = self.client.oneclick_start(pay_id)  # type: ignore
+                if not api_response.is_okay or not api_response.is_verified:
+                    return self._rejected(job, api_response, pay_id, resumed, write)
+                write(job.order_number, step='start')
+
+            for attempt in range(self.status_attempts):
+                if attempt:
+                    self._sleep(self.status_interval)
+                api_response = self.client.payment_status(pay_id)  # type: ignore
+                if api_response.payment_status in FINAL_STATUSES:
+                    break
+        except Exception as e:
+            # The job stays unfinished in the checkpoint and continues from its last step when resumed
+            return ChargeOutcome(job, False, pay_id, error='{}: {}'.format(type(e).__name__, e), resumed=resumed)
+
+        status = api_response.payment_status
+        if status not in FINAL_STATUSES:
+            return ChargeOutcome(job, False, pay_id, status, api_response.result_code, 'Payment is not finished.',
+                                 resumed=resumed)
+        ok = status in SUCCESSFUL_STATUSES
+        write(job.order_number, step='done', ok=ok, paymentStatus=int(status))  # type: ignore
+        return ChargeOutcome(job, ok, pay_id, status, api_response.result_code, resumed=resumed)
+
+    def run(self, jobs: Iterable[ChargeJob]) -> Iterator[ChargeOutcome]:
+        """
+        Run the jobs.
+
+        Args:
+            jobs: Jobs with unique order numbers
+
+        Returns:
+            Iterator of outcomes in the order of completion, jobs finished by a previous run are reported with
+            `resumed` set
+        """
+        checkpoint = ChargeCheckpoint(self.checkpoint_path) if self.checkpoint_path is not None else None
+        states = checkpoint.load() if checkpoint is not None else {}
+        pending: Set[Future] = set()
+        try:
+            with ThreadPoolExecutor(self.concurrency, thread_name_prefix='csob-charges') as executor:
+                try:
+                    for job in jobs:
+                        job = ChargeJob(*job)
+                        state = states.get(job.order_number, {})
+                        if state.get('step') == 'done':
+                            status = state.get('paymentStatus')
+                            yield ChargeOutcome(job, state['ok'], state.get('payId'),
+                                                PaymentStatus(status) if status is not None else None,
+                                                error=state.get('error'), resumed=True)
+                            continue
+                        if len(pending) >= self.concurrency * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                yield future.result()
+                        pending.add(executor.submit(self.charge, job, state, checkpoint))
+                    while pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+                finally:
+                    # Queued jobs are not started when the consumer stops early, the executor waits for running ones
+                    for future in pending:
+                        future.cancel()
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
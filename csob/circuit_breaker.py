@@ -0,0 +1,237 @@
+import time
+from collections import deque
+from enum import Enum
+from threading import Lock
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from csob.exceptions import CircuitOpenException
+from csob.instrumentation import Instrumentation
+
+
+class CircuitState(Enum):
+    """
+    State of the circuit breaker.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreakerSnapshot(NamedTuple):
+    merchant_id: str
+    endpoint: str
+    state: CircuitState
+    calls: int
+    failures: int
+    retry_after: float
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guarding a single endpoint of a single merchant.
+
+    Outcomes of the last `window_size` calls are kept. A call is a failure when it failed on transport level, the
+    gateway responded with 5xx HTTP status or result code 900, or when it took longer than `latency_threshold`.
+    When at least `minimum_calls` were made and the ratio of failures reaches `error_rate_threshold` the breaker
+    opens and all calls fail fast with `CircuitOpenException`.
+
+    After `reset_timeout` seconds the breaker goes half-open. If a probe is set (`APIClient` uses `echo`) it is
+    called first and decides whether the breaker closes or opens again, otherwise a single trial call is let through.
+    """
+    merchant_id: str
+    endpoint: str
+    error_rate_threshold: float
+    latency_threshold: Optional[float]
+    minimum_calls: int
+    reset_timeout: float
+
+    def __init__(self, merchant_id: str, endpoint: str, error_rate_threshold: float = 0.5,
+                 latency_threshold: Optional[float] = None, window_size: int = 20, minimum_calls: int = 10,
+                 reset_timeout: float = 30.0, probe: Optional[Callable[[], bool]] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            merchant_id: Merchant’s ID the breaker belongs to
+            endpoint: Resource url the breaker belongs to
+            error_rate_threshold: Ratio of failed calls in the window which opens the breaker
+            latency_threshold: Calls slower than this (in seconds) are counted as failures
+            window_size: Number of the last calls considered
+            minimum_calls: Minimal number of calls in the window before the breaker may open
+            reset_timeout: Seconds after which an open breaker goes half-open
+            probe: Callable returning whether the gateway is healthy, used in half-open state
+            instrumentation: Receives state changes of the breaker
+            clock: Monotonic time source
+        """
+        self.merchant_id = merchant_id
+        self.endpoint = endpoint
+        self.error_rate_threshold = error_rate_threshold
+        self.latency_threshold = latency_threshold
+        self.minimum_calls = minimum_calls
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self.instrumentation = instrumentation
+        self._clock = clock
+        self._window: Deque[bool] = deque(maxlen=window_size)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    def _set_state(self, state: CircuitState) -> None:
+        old_state, self._state = self._state, state
+        if state == CircuitState.OPEN:
+            self._opened_at = self._clock()
+        elif state == CircuitState.CLOSED:
+            self._window.clear()
+        if old_state != state and self.instrumentation is not None:
+            self.instrumentation.emit(
+                'circuit_breaker.{}'.format(state.value), merchant_id=self.merchant_id, endpoint=self.endpoint,
+                old_state=old_state.value)
+
+    def _retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def _reject(self) -> CircuitOpenException:
+        if self.instrumentation is not None:
+            self.instrumentation.emit('circuit_breaker.rejected', merchant_id=self.merchant_id, endpoint=self.endpoint)
+        return CircuitOpenException(self.merchant_id, self.endpoint, self._retry_after())
+
+    def before_call(self) -> None:
+        """
+        Check whether a call may be made.
+
+        Raises:
+            CircuitOpenException
+        """
+        with self._lock:
+            if self._state == CircuitState.CLOSED:
+                return
+            if self._state == CircuitState.OPEN:
+                if self._retry_after() > 0:
+                    raise self._reject()
+                self._set_state(CircuitState.HALF_OPEN)
+            if self._trial_running:
+                raise self._reject()
+            self._trial_running = True
+
+        if self.probe is None:
+            # The call itself is the trial, `record` decides about the state.
+            return
+
+        try:
+            healthy = self.probe()
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            self._trial_running = False
+            self._set_state(CircuitState.CLOSED if healthy else CircuitState.OPEN)
+            if not healthy:
+                raise self._reject()
+
+    def record(self, failed: bool, latency: float) -> None:
+        """
+        Record outcome of a call.
+
+        Args:
+            failed: Whether the call failed
+            latency: Duration of the call in seconds
+        """
+        if self.latency_threshold is not None and latency > self.latency_threshold:
+            failed = True
+
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN:
+                self._trial_running = False
+                self._set_state(CircuitState.OPEN if failed else CircuitState.CLOSED)
+                return
+            if self._state == CircuitState.OPEN:
+                return
+
+            self._window.append(failed)
+            if len(self._window) >= self.minimum_calls:
+                if sum(self._window) / len(self._window) >= self.error_rate_threshold:
+                    self._set_state(CircuitState.OPEN)
+
+    def snapshot(self) -> CircuitBreakerSnapshot:
+        with self._lock:
+            return CircuitBreakerSnapshot(
+                merchant_id=self.merchant_id, endpoint=self.endpoint, state=self._state, calls=len(self._window),
+                failures=sum(self._window),
+                retry_after=self._retry_after() if self._state == CircuitState.OPEN else 0.0,
+            )
+
+
+class CircuitBreakerRegistry:
+    """
+    Holds circuit breakers per merchant and endpoint.
+
+    One registry may be shared by several `APIClient` instances, breakers are created on first use with the
+    keyword arguments given to the registry. Probes are registered per merchant by `APIClient`.
+    """
+
+    def __init__(self, instrumentation: Optional[Instrumentation] = None, **breaker_kwargs) -> None:
+        """
+        Args:
+            instrumentation: Receives state changes of the breakers, the registry state is exported
+                as `circuit_breakers` collector.
+            **breaker_kwargs: Keyword arguments of `CircuitBreaker`
+        """
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._probes: Dict[str, Callable[[], bool]] = {}
+        self._breaker_kwargs = breaker_kwargs
+        self._lock = Lock()
+        self.instrumentation: Optional[Instrumentation] = None
+        if instrumentation is not None:
+            self.set_instrumentation(instrumentation)
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        if self.instrumentation is None:
+            self.instrumentation = instrumentation
+            instrumentation.register_collector('circuit_breakers', self.snapshot)
+
+    def register_probe(self, merchant_id: str, probe: Callable[[], bool]) -> None:
+        """
+        Set probe used by half-open breakers of the merchant.
+
+        Args:
+            merchant_id: Merchant’s ID
+            probe: Callable returning whether the gateway is healthy
+        """
+        with self._lock:
+            self._probes[merchant_id] = probe
+            for (breaker_merchant_id, _), breaker in self._breakers.items():
+                if breaker_merchant_id == merchant_id:
+                    breaker.probe = probe
+
+    def get(self, merchant_id: str, endpoint: str) -> CircuitBreaker:
+        """
+        Get breaker for the merchant and endpoint, create it if it does not exist yet.
+
+        Args:
+            merchant_id: Merchant’s ID
+            endpoint: Resource url
+
+        Returns:
+            CircuitBreaker
+        """
+        key = (merchant_id, endpoint)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = CircuitBreaker(
+                        merchant_id, endpoint, probe=self._probes.get(merchant_id),
+                        instrumentation=self.instrumentation, **self._breaker_kwargs)
+                    self._breakers[key] = breaker
+        return breaker
+
+    def snapshot(self) -> List[CircuitBreakerSnapshot]:
+        return [breaker.snapshot() for breaker in list(self._breakers.values())]
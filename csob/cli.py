@@ -0,0 +1,403 @@
+"""
+Bulk operations over payments listed in a CSV or JSON lines file.
+
+Usage:
+    csob refund --input refunds.csv --output results.jsonl --merchant-id A3746UdxZO --private-key merchant.key \\
+        --concurrency 8 --rate 20
+
+Every input row holds `payId` and for `close` and `refund` optionally `amount` in hundredths. Rows are read,
+sent and written one by one, so memory does not grow with the size of the file. Results are written in the order
+of completion with the number of the input row. With `--resume` the rows with a final result in the output
+(`FINAL_KINDS`) are skipped and new results are appended, the input must not change between the runs. Rows which
+failed on transport, with an HTTP error or an invalid signature are sent again by `status`, the other commands
+write them as `review` without sending them, as the gateway may have executed the operation. `--dry-run` only
+signs the requests.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import IO, Any, Callable, Container, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from csob.api import APIClient
+from csob.enums import OutcomeKind
+from csob.outcome import Outcome
+from csob.pipeline import Operation, Pipeline, PipelineResult
+from csob.rate_limit import RateLimiter
+
+COMMANDS = {
+    'status': 'payment_status',
+    'close': 'payment_close',
+    'refund': 'payment_refund',
+    'reverse': 'payment_reverse',
+}
+
+FIELDS = ('row', 'payId', 'command', 'kind', 'resultCode', 'httpStatus', 'paymentStatus', 'error', 'method', 'url',
+          'request')
+
+# Kinds of rows which were not sent
+INVALID = 'invalid'
+SIGNED = 'signed'
+# The previous attempt may have been executed, the payment has to be checked before sending the row again
+REVIEW = 'review'
+
+# Kinds of results which are not retried by `--resume`
+FINAL_KINDS = frozenset((OutcomeKind.OK.value, OutcomeKind.GATEWAY_ERROR.value, INVALID, REVIEW))
+
+# Commands which `--resume` may send again after a failure with unknown result
+IDEMPOTENT_COMMANDS = frozenset(('status',))
+
+_DONE = object()
+
+
+def get_format(path: str, file_format: Optional[str]) -> str:
+    if file_format is not None:
+        return file_format
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_rows(f: IO[str], file_format: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Read rows of the file, rows are numbered from 1 and blank lines of JSON lines are skipped.
+    """
+    if file_format == 'csv':
+        yield from enumerate(csv.DictReader(f), 1)
+        return
+    number = 0
+    for text in f:
+        if not text.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(text)
+        except ValueError:
+            row = None
+        yield number, row
+
+
+def get_operation(command: str, row: Any) -> Operation:
+    """
+    Get operation of the input row.
+
+    Raises:
+        ValueError - the row is not valid
+    """
+    if not isinstance(row, dict):
+        raise ValueError('Row is not an object.')
+    pay_id = str(row.get('payId') or '').strip()
+    if not pay_id:
+        raise ValueError('Missing payId.')
+    args: Tuple = (pay_id,)
+    if command in ('close', 'refund'):
+        amount = row.get('amount')
+        if amount is not None and str(amount).strip():
+            try:
+                amount = int(str(amount).strip())
+            except ValueError:
+                raise ValueError('Amount `{}` is not an integer.'.format(amount))
+            if amount <= 0:
+                raise ValueError('Amount must be positive.')
+        else:
+            amount = None
+        args += (amount,)
+    return Operation(COMMANDS[command], args)
+
+
+class ResumeState:
+    """
+    Rows with a final result written to the output.
+
+    Rows complete nearly in order, so all rows up to `watermark` are done and only the few rows completed
+    after a gap are kept in `done`. Rows whose last result is not final are kept in `failed`.
+    """
+
+    def __init__(self) -> None:
+        self.watermark = 0
+        self.done: Set[int] = set()
+        self.failed: Set[int] = set()
+
+    def add(self, row: int) -> None:
+        self.done.add(row)
+        while self.watermark + 1 in self.done:
+            self.watermark += 1
+            self.done.discard(self.watermark)
+
+    def __contains__(self, row: int) -> bool:
+        return row <= self.watermark or row in self.done
+
+    @classmethod
+    def from_output(cls, f: IO[str], file_format: str) -> 'ResumeState':
+        state = cls()
+        for _, record in read_rows(f, file_format):
+            try:
+                row = int(record['row'])
+                if record['kind'] in FINAL_KINDS:
+                    state.add(row)
+                    state.failed.discard(row)
+                else:
+                    state.failed.add(row)
+            except (TypeError, KeyError, ValueError):
+                continue
+        return state
+
+
+def truncate_partial_line(path: str) -> None:
+    """
+    Remove the last line of the file when it is not terminated, e.g. after the process was killed while writing it.
+    """
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            chunk_start = max(0, position - 4096)
+            f.seek(chunk_start)
+            chunk = f.read(position - chunk_start)
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                if chunk_start + newline + 1 != end:
+                    f.truncate(chunk_start + newline + 1)
+                return
+            position = chunk_start
+        f.truncate(0)
+
+
+class RecordWriter:
+    """
+    Writes result records to the output, every record is flushed as soon as it is written.
+    """
+
+    def __init__(self, f: IO[str], file_format: str, header: bool = True) -> None:
+        self.f = f
+        self.file_format = file_format
+        self._csv_writer = None
+        if file_format == 'csv':
+            self._csv_writer = csv.DictWriter(f, FIELDS, extrasaction='ignore')
+            if header:
+                self._csv_writer.writeheader()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._csv_writer is not None:
+            record = dict(record)
+            if record.get('request') is not None:
+                record['request'] = json.dumps(record['request'])
+            self._csv_writer.writerow(record)
+        else:
+            self.f.write(json.dumps(record) + '\n')
+        self.f.flush()
+
+
+class BulkRunner:
+    """
+    Runs a command over the rows through `APIClient.pipeline`, at most `send_workers` requests are in flight.
+    """
+
+    def __init__(self, client: APIClient, command: str, send_workers: int = 8, sign_workers: Optional[int] = None,
+                 queue_size: int = 64) -> None:
+        """
+        Args:
+            client: Client calling the gateway, rate limited by its `rate_limiter`
+            command: One of `COMMANDS`
+            send_workers: Number of requests in flight
+            sign_workers: Number of signing threads, defaults to the number of CPUs
+            queue_size: Size of the queues between the pipeline stages
+        """
+        if command not in COMMANDS:
+            raise ValueError('Unknown command `{}`.'.format(command))
+        self.client = client
+        self.command = command
+        self.send_workers = send_workers
+        self.sign_workers = sign_workers
+        self.queue_size = queue_size
+
+    def _record(self, number: int, row: Any, **data: Any) -> Dict[str, Any]:
+        pay_id = row.get('payId') if isinstance(row, dict) else None
+        record = dict.fromkeys(FIELDS)
+        record.update(row=number, payId=pay_id, command=self.command, **data)
+        return record
+
+    def _outcome_record(self, number: int, row: Any, outcome: Outcome) -> Dict[str, Any]:
+        response_json = outcome.response_json or {}
+        return self._record(number, row, kind=outcome.kind.value, resultCode=outcome.result_code,
+                            httpStatus=outcome.http_status, paymentStatus=response_json.get('paymentStatus'),
+                            error=outcome.error)
+
+    def run(self, rows: Iterable[Tuple[int, Any]], dry_run: bool = False,
+            review: Container[int] = ()) -> Iterator[Dict[str, Any]]:
+        """
+        Run the command.
+
+        Args:
+            rows: Numbers and rows of the input, consumed lazily
+            dry_run: Only sign the requests, records hold the signed request instead of the outcome
+            review: Numbers of the rows which are not sent but written as `REVIEW`
+
+        Returns:
+            Iterator of result records in the order of completion
+        """
+        if dry_run:
+            yield from self._sign(rows)
+            return
+
+        records: Queue = Queue(self.queue_size)
+        stop = Event()
+        in_flight: Dict[int, Tuple[int, Any]] = {}
+        errors: List[Exception] = []
+
+        def put(record: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    records.put(record, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def operations() -> Iterator[Operation]:
+            position = 0
+            for number, row in rows:
+                if number in review:
+                    record = self._record(number, row, kind=REVIEW, error='Result of the previous attempt is unknown.')
+                    if not put(record):
+                        return
+                    continue
+                try:
+                    operation = get_operation(self.command, row)
+                except ValueError as e:
+                    # Invalid rows share the bounded queue with the results, so reading waits for writing
+                    if not put(self._record(number, row, kind=INVALID, error=str(e))):
+                        return
+                    continue
+                if stop.is_set():
+                    return
+                in_flight[position] = (number, row)
+                position += 1
+                yield operation
+
+        def collect() -> None:
+            results = self.client.pipeline(operations(), sign_workers=self.sign_workers,
+                                           send_workers=self.send_workers, queue_size=self.queue_size, outcomes=True)
+            try:
+                for result in results:
+                    if not put(self._result_record(result, *in_flight.pop(result.position))):
+                        break
+            except Exception as e:
+                errors.append(e)
+            finally:
+                results.close()  # type: ignore
+                put(_DONE)
+
+        thread = Thread(target=collect, name='csob-bulk', daemon=True)
+        thread.start()
+        try:
+            while True:
+                record = records.get()
+                if record is _DONE:
+                    break
+                yield record
+        finally:
+            stop.set()
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def _result_record(self, result: PipelineResult, number: int, row: Any) -> Dict[str, Any]:
+        outcome = result.outcome
+        if outcome is None:
+            # The call could not be signed
+            outcome = Outcome.from_exception(result.error)  # type: ignore
+        return self._outcome_record(number, row, outcome)
+
+    def _sign(self, rows: Iterable[Tuple[int, Any]]) -> Iterator[Dict[str, Any]]:
+        pipeline = Pipeline(self.client)
+        for number, row in rows:
+            try:
+                operation = get_operation(self.command, row)
+            except ValueError as e:
+                yield self._record(number, row, kind=INVALID, error=str(e))
+                continue
+            try:
+                call = pipeline.sign(operation)
+            except Exception as e:
+                yield self._outcome_record(number, row, Outcome.from_exception(e))
+                continue
+            yield self._record(number, row, kind=SIGNED, method=call.method, url=call.url, request=call.json)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='csob', description=__doc__.split('\n\n')[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=tuple(COMMANDS))
+    parser.add_argument('--input', required=True, help='CSV or JSON lines file of the payments, `-` for stdin')
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'), help='Defaults to the extension of the input')
+    parser.add_argument('--output', default='-', help='File of the results, `-` for stdout')
+    parser.add_argument('--output-format', choices=('csv', 'jsonl'), help='Defaults to the extension of the output')
+    parser.add_argument('--resume', action='store_true', help='Skip rows found in the output and append to it')
+    parser.add_argument('--dry-run', action='store_true', help='Only sign the requests')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of requests in flight')
+    parser.add_argument('--rate', type=float, help='Maximal requests per second')
+    parser.add_argument('--merchant-id', required=True)
+    parser.add_argument('--private-key', required=True, help='Path to the merchant private key')
+    parser.add_argument('--public-key', help='Path to the gateway public key')
+    parser.add_argument('--url', default='https://api.platebnibrana.csob.cz/api/v1.7/', help='API URL of the gateway')
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None, err: Optional[Callable[[str], Any]] = None) -> int:
+    """
+    Run the command line, the summary is passed to `err` (printed to stderr by default).
+
+    Returns:
+        int - exit status, 1 when any row was not processed successfully
+    """
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    input_format = get_format(args.input, args.input_format)
+    output_format = get_format(args.output, args.output_format)
+
+    resume_state = ResumeState()
+    header = True
+    if args.output != '-' and os.path.exists(args.output):
+        if not args.resume:
+            parser.error('Output {} exists, use --resume to continue it.'.format(args.output))
+        truncate_partial_line(args.output)
+        with open(args.output, encoding='utf-8', newline='') as f:
+            resume_state = ResumeState.from_output(f, output_format)
+        header = os.path.getsize(args.output) == 0
+
+    client = APIClient(args.merchant_id, args.private_key, args.public_key, api_url=args.url,
+                       rate_limiter=RateLimiter(args.rate) if args.rate else None)
+    runner = BulkRunner(client, args.command, send_workers=args.concurrency)
+    counts: Counter = Counter()
+    input_file = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', newline='')
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8', newline='')
+    try:
+        writer = RecordWriter(output_file, output_format, header)
+        rows = ((number, row) for number, row in read_rows(input_file, input_format) if number not in resume_state)
+        review = resume_state.failed if args.command not in IDEMPOTENT_COMMANDS else set()
+        for record in runner.run(rows, dry_run=args.dry_run, review=review):
+            writer.write(record)
+            counts[record['kind']] += 1
+    finally:
+        client.session.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    skipped = resume_state.watermark + len(resume_state.done)
+    summary = '{} rows: {}{}'.format(
+        sum(counts.values()), ', '.join('{}={}'.format(kind, count) for kind, count in sorted(counts.items())) or '-',
+        ', skipped={}'.format(skipped) if skipped else '')
+    if err is not None:
+        err(summary)
+    else:
+        print(summary, file=sys.stderr)
+    return 0 if set(counts) <= {OutcomeKind.OK.value, SIGNED} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
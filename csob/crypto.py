@@ -1,4 +1,10 @@
+import binascii
+import os
 from base64 import b64decode, b64encode
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
 from urllib import parse
 
 from Crypto.Hash import SHA
@@ -6,6 +12,41 @@ from Crypto.PublicKey import RSA
 from Crypto.Signature import PKCS1_v1_5
 
 
+class BatchVerification(NamedTuple):
+    verified: List[bool]
+    failures: List[int]
+
+
+_imported_keys: Dict[str, Any] = {}
+_imported_keys_lock = Lock()
+IMPORTED_KEYS_MAXSIZE = 32
+
+
+def import_key(key: str):
+    """
+    Parse key from its string representation, parsed keys are cached.
+
+    Cached keys are read without locking, a key requested by several threads at once is parsed only once.
+
+    Args:
+        key: public or private key in string representation
+
+    Returns:
+        RSA key
+    """
+    imported_key = _imported_keys.get(key)
+    if imported_key is not None:
+        return imported_key
+    with _imported_keys_lock:
+        imported_key = _imported_keys.get(key)
+        if imported_key is None:
+            imported_key = RSA.importKey(key)
+            if len(_imported_keys) >= IMPORTED_KEYS_MAXSIZE:
+                _imported_keys.pop(next(iter(_imported_keys)))
+            _imported_keys[key] = imported_key
+        return imported_key
+
+
 def get_signature(key: str, signature_str: str) -> str:
     """
     Sign a signature string with SHA-1 RSA.
@@ -17,17 +58,83 @@ def get_signature(key: str, signature_str: str) -> str:
     Returns:
 
     """
-    signer = PKCS1_v1_5.new(RSA.importKey(key))
+    signer = PKCS1_v1_5.new(import_key(key))
 
     signature = signer.sign(SHA.new(signature_str.encode('utf-8')))
 
     return b64encode(signature).decode('utf-8')
 
 
+class SignatureCache:
+    """
+    Thread-safe bounded LRU of signatures keyed by the key and the exact signature string.
+
+    PKCS#1 v1.5 signatures are deterministic, so signing the same string again (e.g. status of the same payment
+    polled in the same `dttm` second) returns the cached signature instead of redoing the RSA operation.
+    """
+    maxsize: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._signatures: 'OrderedDict[Tuple[str, str], str]' = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str, signature_str: str, sign: Callable[[str, str], str]) -> str:
+        """
+        Get cached signature or sign the string and cache the signature.
+
+        Args:
+            key: private key in string representation
+            signature_str: String to be signed
+            sign: Signs the string when it is not cached
+
+        Returns:
+            signature
+        """
+        cache_key = (key, signature_str)
+        with self._lock:
+            signature = self._signatures.get(cache_key)
+            if signature is not None:
+                self._signatures.move_to_end(cache_key)
+                self.hits += 1
+                return signature
+            self.misses += 1
+
+        signature = sign(key, signature_str)
+        with self._lock:
+            self._signatures[cache_key] = signature
+            if len(self._signatures) > self.maxsize:
+                self._signatures.popitem(last=False)
+        return signature
+
+    def clear(self) -> None:
+        with self._lock:
+            self._signatures.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._signatures), 'maxsize': self.maxsize}
+
+
+url_signature_cache = SignatureCache()
+
+
+def _get_url_signature(key: str, signature_str: str) -> str:
+    return parse.quote_plus(get_signature(key, signature_str))
+
+
 def get_url_signature(key, signature_str):
     """
     Urlize signature from `csob.crypto.get_signature`.
 
+    Signatures are cached in `url_signature_cache`.
+
     Args:
         key: private key in string representation
         signature_str: String to be signed
@@ -35,7 +142,7 @@ def get_url_signature(key, signature_str):
     Returns:
         urlize signature
     """
-    return parse.quote_plus(get_signature(key, signature_str))
+    return url_signature_cache.get(key, signature_str, _get_url_signature)
 
 
 def verify_signature(public_key: str, signature_str: str, signature: str) -> bool:
@@ -48,8 +155,76 @@ def verify_signature(public_key: str, signature_str: str, signature: str) -> boo
         signature: The provided signature
 
     Returns:
-        bool
+        bool, False for signatures which are not valid BASE64
+    """
+    verifier = PKCS1_v1_5.new(import_key(public_key))
+    try:
+        decoded = b64decode(signature)
+    except (binascii.Error, TypeError, ValueError):
+        return False
+
+    return verifier.verify(SHA.new(signature_str.encode('utf-8')), decoded)
+
+
+def _to_list(column: Any) -> List:
+    """
+    Convert list, NumPy array or Arrow array into list.
+    """
+    if hasattr(column, 'to_pylist'):
+        return column.to_pylist()
+    if hasattr(column, 'tolist'):
+        return column.tolist()
+    return list(column)
+
+
+def _verify_chunk(public_key: str, signature_strs: Sequence[str], signatures: Sequence[str]) -> List[bool]:
+    """
+    Verify chunk of signatures with a single parsed key, invalid base64 is not verified.
+    """
+    verifier = PKCS1_v1_5.new(import_key(public_key))
+    out = []
+    for signature_str, signature in zip(signature_strs, signatures):
+        try:
+            decoded = b64decode(signature)
+        except (binascii.Error, TypeError, ValueError):
+            out.append(False)
+            continue
+        out.append(bool(verifier.verify(SHA.new(signature_str.encode('utf-8')), decoded)))
+    return out
+
+
+def verify_signatures(public_key: str, signature_strs: Any, signatures: Any, workers: Optional[int] = None,
+                      chunk_size: int = 5000) -> BatchVerification:
     """
-    verifier = PKCS1_v1_5.new(RSA.importKey(public_key))
+    Verify many signatures at once.
 
-    return verifier.verify(SHA.new(signature_str.encode('utf-8')), b64decode(signature))
+    The key is parsed once per worker process and the input is verified in chunks spread across a process pool.
+
+    Args:
+        public_key: Public key to use
+        signature_strs: Strings that were signed, a list, NumPy array or Arrow array
+        signatures: The provided signatures, a list, NumPy array or Arrow array
+        workers: Number of worker processes, defaults to CPU count, 1 verifies in the current process
+        chunk_size: Number of signatures verified by a worker at once
+
+    Returns:
+        BatchVerification - verification result for every row and indices of rows which were not verified
+    """
+    signature_strs, signatures = _to_list(signature_strs), _to_list(signatures)
+    if len(signature_strs) != len(signatures):
+        raise ValueError('signature_strs and signatures have different length')
+
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    bounds = range(0, len(signatures), chunk_size)
+    if workers <= 1 or len(bounds) <= 1:
+        verified = _verify_chunk(public_key, signature_strs, signatures)
+    else:
+        verified = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk in executor.map(
+                    _verify_chunk, [public_key] * len(bounds),
+                    [signature_strs[i:i + chunk_size] for i in bounds],
+                    [signatures[i:i + chunk_size] for i in bounds]):
+                verified.extend(chunk)
+
+    return BatchVerification(verified=verified, failures=[i for i, ok in enumerate(verified) if not ok])
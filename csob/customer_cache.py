@@ -0,0 +1,163 @@
+import time
+from collections import OrderedDict
+from threading import Event, Lock
+from typing import Callable, Dict, NamedTuple, Optional, Union
+
+from csob.api_response import APIResponse
+from csob.enums import ResultCode
+from csob.exceptions import CustomerNotFoundResultCodeException
+from csob.instrumentation import Instrumentation
+
+NEGATIVE_RESULT_CODES = frozenset((ResultCode.CUSTOMER_NOT_FOUND, ResultCode.CUSTOMER_NO_CARDS))
+POSITIVE_RESULT_CODES = frozenset((ResultCode.CUSTOMER_HAVE_CARDS,))
+
+
+class _Entry(NamedTuple):
+    result: Union[APIResponse, CustomerNotFoundResultCodeException]
+    expires_at: float
+
+
+class _Flight:
+    """
+    Request of a customer in progress, other callers wait for its result.
+    """
+    __slots__ = ('done', 'result', 'error', 'invalidated')
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result: Optional[APIResponse] = None
+        self.error: Optional[BaseException] = None
+        self.invalidated = False
+
+
+class CustomerInfoCache:
+    """
+    Cache of `customer_info` results keyed by customerId.
+
+    Customers with cards (820) are cached for `ttl` seconds, unknown customers and customers without cards
+    (800, 810) for `negative_ttl` seconds. Other results and errors are not cached. Concurrent misses of the same
+    customer share a single gateway request. The customer is invalidated after a successful `oneclickPayment` init.
+    """
+    ttl: float
+    negative_ttl: float
+    maxsize: int
+
+    def __init__(self, ttl: float = 60, negative_ttl: float = 60, maxsize: int = 10000,
+                 clock: Callable[[], float] = time.monotonic,
+                 instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        Args:
+            ttl: Seconds customers with cards are cached
+            negative_ttl: Seconds unknown customers and customers without cards are cached
+            maxsize: Maximal number of cached customers
+            clock: Time source
+            instrumentation: Receives cache statistics
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._clock = clock
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = Lock()
+        self.instrumentation: Optional[Instrumentation] = None
+        if instrumentation is not None:
+            self.set_instrumentation(instrumentation)
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        if self.instrumentation is None:
+            self.instrumentation = instrumentation
+            instrumentation.register_collector('customer_info_cache', self.stats)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced, 'size': len(self._entries)}
+
+    def _get_ttl(self, result: Union[APIResponse, Exception]) -> Optional[float]:
+        if isinstance(result, CustomerNotFoundResultCodeException):
+            return self.negative_ttl
+        if not isinstance(result, APIResponse) or not result.is_verified:
+            return None
+        if result.result_code in NEGATIVE_RESULT_CODES:
+            return self.negative_ttl
+        if result.result_code in POSITIVE_RESULT_CODES:
+            return self.ttl
+        return None
+
+    def get(self, customer_id: str, fetch: Callable[[], APIResponse]) -> APIResponse:
+        """
+        Get cached result of the customer or fetch it.
+
+        Args:
+            customer_id: Customer’s ID
+            fetch: Calls the gateway
+
+        Returns:
+            APIResponse
+
+        Raises:
+            Exception raised by `fetch`
+        """
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is not None and entry.expires_at > self._clock():
+                self._entries.move_to_end(customer_id)
+                self.hits += 1
+                if isinstance(entry.result, Exception):
+                    raise entry.result
+                return entry.result
+
+            flight = self._flights.get(customer_id)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[customer_id] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result  # type: ignore
+
+        try:
+            flight.result = fetch()
+        except BaseException as e:
+            flight.error = e
+            self._store(customer_id, flight, e)
+            raise
+        else:
+            self._store(customer_id, flight, flight.result)
+            return flight.result
+        finally:
+            with self._lock:
+                del self._flights[customer_id]
+            flight.done.set()
+
+    def _store(self, customer_id: str, flight: _Flight, result: Union[APIResponse, BaseException]) -> None:
+        ttl = self._get_ttl(result)  # type: ignore
+        if ttl is None:
+            return
+        with self._lock:
+            # The customer was invalidated while its result was being fetched
+            if flight.invalidated:
+                return
+            self._entries[customer_id] = _Entry(result, self._clock() + ttl)  # type: ignore
+            self._entries.move_to_end(customer_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, customer_id: str) -> None:
+        with self._lock:
+            self._entries.pop(customer_id, None)
+            flight = self._flights.get(customer_id)
+            if flight is not None:
+                flight.invalidated = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,66 @@
+import time
+from typing import Callable, Optional
+
+from csob.exceptions import DeadlineExceededException
+
+
+class Deadline:
+    """
+    Time budget of a call shared by all the requests it makes.
+
+    The remaining budget bounds rate limiter waits and hedging and is used as the connect and read timeout
+    of the request. `DeadlineExceededException` is raised when the budget is exhausted before sending.
+    """
+    expires_at: float
+
+    def __init__(self, timeout: float, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            timeout: Budget in seconds from now
+            clock: Time source
+        """
+        self._clock = clock
+        self.expires_at = clock() + timeout
+
+    def remaining(self) -> float:
+        """
+        Get remaining seconds of the budget, zero when expired.
+        """
+        return max(0.0, self.expires_at - self._clock())
+
+    def expired(self) -> bool:
+        return self._clock() >= self.expires_at
+
+    def check(self) -> float:
+        """
+        Raise when the deadline has expired.
+
+        Returns:
+            float - remaining seconds
+
+        Raises:
+            DeadlineExceededException
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededException()
+        return remaining
+
+    def timeout(self, default: Optional[float] = None) -> float:
+        """
+        Get timeout of a request.
+
+        Args:
+            default: Timeout used when it is shorter than the remaining budget
+
+        Returns:
+            float - seconds
+
+        Raises:
+            DeadlineExceededException
+        """
+        remaining = self.check()
+        return min(remaining, default) if default is not None else remaining
+
+    def __repr__(self) -> str:
+        return '<Deadline remaining={:.3f}s>'.format(self.remaining())
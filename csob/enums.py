@@ -131,3 +131,14 @@ class ResultCode(IntEnum):
     INVALID_PARAMETER = 110
     MISSING_PARAMETER = 100
     OK = 0
+
+
+class OutcomeKind(Enum):
+    """
+    Kind of `csob.outcome.Outcome` of a call.
+    """
+    OK = 'ok'
+    GATEWAY_ERROR = 'gateway_error'
+    HTTP_ERROR = 'http_error'
+    SIGNATURE_INVALID = 'signature_invalid'
+    TRANSPORT_ERROR = 'transport_error'
@@ -17,6 +17,62 @@ class GatewaySignatureInvalid(CSOBBaseException):
     pass
 
 
+class CircuitOpenException(CSOBBaseException):
+    """
+    The circuit breaker of the endpoint is open, the request was not sent to the gateway.
+    """
+    merchant_id: str
+    endpoint: str
+    retry_after: float
+
+    def __init__(self, merchant_id: str, endpoint: str, retry_after: float) -> None:
+        self.merchant_id = merchant_id
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__()
+
+    def __str__(self) -> str:
+        return 'Circuit breaker for `{}` of merchant `{}` is open, retry after {:.1f}s.'.format(
+            self.endpoint, self.merchant_id, self.retry_after)
+
+
+class RateLimitExceededException(CSOBBaseException):
+    """
+    The request was not sent, the rate limit would require waiting longer than allowed.
+    """
+    merchant_id: str
+
+    def __init__(self, merchant_id: str) -> None:
+        self.merchant_id = merchant_id
+        super().__init__()
+
+    def __str__(self) -> str:
+        return 'Rate limit of merchant `{}` exceeded.'.format(self.merchant_id)
+
+
+class DeadlineExceededException(CSOBBaseException):
+    """
+    The request was not sent, the deadline of the call expired.
+    """
+
+    def __str__(self) -> str:
+        return 'Deadline exceeded.'
+
+
+class CassetteMissException(CSOBBaseException):
+    """
+    No response was recorded in the cassette for the request.
+    """
+    key: str
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        super().__init__()
+
+    def __str__(self) -> str:
+        return 'No recorded response for `{}`.'.format(self.key)
+
+
 class ServiceResponseException(CSOBBaseException):
     http_code: int
 
@@ -0,0 +1,251 @@
+import json
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from urllib.parse import unquote
+
+from Crypto.PublicKey import RSA
+
+from csob.crypto import get_signature
+from csob.enums import PaymentStatus, ResultCode
+from csob.utils import get_dttm
+
+if TYPE_CHECKING:
+    from csob.api import APIClient
+
+
+TEST_PRIVATE_KEY_PATH = os.path.join(sys.prefix, 'csob_keys/rsa_test_A3746UdxZO.key')
+
+ECHO_SIGNATURE = ('dttm', 'resultCode', 'resultMessage')
+PAYMENT_SIGNATURE = ('payId', 'dttm', 'resultCode', 'resultMessage', 'paymentStatus', 'authCode')
+CUSTOMER_SIGNATURE = ('customerId', 'dttm', 'resultCode', 'resultMessage')
+
+# Status the payment gets after a successful operation.
+OPERATION_STATUS = {
+    'payment/close': PaymentStatus.PAYMENT_WAITING_FOR_SETTLEMENT,
+    'payment/reverse': PaymentStatus.PAYMENT_REVERSED,
+    'payment/refund': PaymentStatus.PAYMENT_REFUND_PROCESSING,
+}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    fake_gateway: 'FakeGateway'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: _ThreadingHTTPServer
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.fake_gateway._connection_opened()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, data: Optional[Dict] = None) -> None:
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        status, data = self.server.fake_gateway.handle_path(method, self.path, self.rfile.read(length))
+        self._respond(status, data)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+
+class FakeGateway:
+    """
+    Local stand-in of the payment gateway for tests and benchmarks.
+
+    Runs a threaded HTTP/1.1 server on localhost which implements echo, payment and customer operations and signs
+    its responses with `private_key_path` (the test key shipped with the library by default). Public key matching
+    the private key is written to `public_key_path`, use it as `gateway_public_key_path` of `APIClient` or call
+    `client` to get a configured client.
+
+    Attributes `delay` (seconds added to every response) and `fail_with` (HTTP status returned instead of
+    the response) may be changed while the gateway runs.
+    """
+    delay: float = 0.0
+    fail_with: Optional[int] = None
+    path_prefix = '/api/v1.7/'
+
+    def __init__(self, private_key_path: str = TEST_PRIVATE_KEY_PATH, host: str = '127.0.0.1', port: int = 0) -> None:
+        with open(private_key_path, 'r') as f:
+            self._private_key = f.read()
+        public_key_file = tempfile.NamedTemporaryFile('wb', suffix='.pub', delete=False)
+        with public_key_file:
+            public_key_file.write(RSA.importKey(self._private_key).publickey().exportKey())
+        self.public_key_path = public_key_file.name
+        self.private_key_path = private_key_path
+        self.payments: Dict[str, Dict] = {}
+        self.customers: Dict[str, ResultCode] = {}
+        self.requests_count = 0
+        self.connections_count = 0
+        self._lock = Lock()
+        self._thread: Optional[Thread] = None
+        self._create_server(host, port)
+
+    def _create_server(self, host: str, port: int) -> None:
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.fake_gateway = self
+        self.address: Tuple = self._server.server_address[:2]
+
+    def _serve(self) -> None:
+        self._server.serve_forever()
+
+    @property
+    def url(self) -> str:
+        host, port = self.address
+        return 'http://{}:{}{}'.format(str(host), port, self.path_prefix)
+
+    def client(self, merchant_id: str = 'A3746UdxZO', **kwargs) -> 'APIClient':
+        """
+        Get client configured against this gateway.
+
+        Args:
+            merchant_id: Merchant’s ID
+            **kwargs: Other `APIClient` arguments
+
+        Returns:
+            APIClient
+        """
+        from csob.api import APIClient
+        kwargs.setdefault('private_key_path', TEST_PRIVATE_KEY_PATH)
+        return APIClient(merchant_id, gateway_public_key_path=self.public_key_path, api_url=self.url, **kwargs)
+
+    def start(self) -> 'FakeGateway':
+        self._thread = Thread(target=self._serve, name='csob-fake-gateway', daemon=True)
+        self._thread.start()
+        return self
+
+    def _stop_server(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stop(self) -> None:
+        self._stop_server()
+        if self._thread is not None:
+            self._thread.join()
+        os.unlink(self.public_key_path)
+
+    def __enter__(self) -> 'FakeGateway':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _connection_opened(self) -> None:
+        with self._lock:
+            self.connections_count += 1
+
+    def _sign(self, data: Dict, signature_keys: Tuple[str, ...]) -> Dict:
+        data['signature'] = get_signature(
+            self._private_key, '|'.join(str(data[key]) for key in signature_keys if key in data))
+        return data
+
+    def _result(self, signature_keys: Tuple[str, ...], result_code: ResultCode = ResultCode.OK, **data) -> Dict:
+        data.update({'dttm': get_dttm(), 'resultCode': int(result_code), 'resultMessage': result_code.name})
+        return self._sign(data, signature_keys)
+
+    def _payment_result(self, pay_id: str, result_code: ResultCode = ResultCode.OK) -> Dict:
+        payment = self.payments.get(pay_id)
+        if payment is None:
+            return self._result(PAYMENT_SIGNATURE, ResultCode.PAYMENT_NOT_FOUND, payId=pay_id)
+        return self._result(PAYMENT_SIGNATURE, result_code, payId=pay_id, paymentStatus=int(payment['status']))
+
+    def handle_path(self, method: str, path: str, body: bytes) -> Tuple[int, Optional[Dict]]:
+        """
+        Handle a single request given by its raw path and body.
+
+        Returns:
+            tuple - HTTP status and response JSON
+        """
+        path = path[len(self.path_prefix):] if path.startswith(self.path_prefix) else path
+        segments = [unquote(segment) for segment in path.strip('/').split('/')]
+        request_json = json.loads(body.decode('utf-8')) if method in ('POST', 'PUT') and body else {}
+        return self.handle(method, segments, request_json)
+
+    def handle(self, method: str, segments: list, request_json: Dict) -> Tuple[int, Optional[Dict]]:
+        """
+        Handle a single request.
+
+        Args:
+            method: HTTP method
+            segments: Unquoted path segments after the API prefix
+            request_json: Request body
+
+        Returns:
+            tuple - HTTP status and response JSON
+        """
+        with self._lock:
+            self.requests_count += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail_with is not None:
+            return self.fail_with, None
+
+        operation = '/'.join(segments[:2])
+        if segments[0] == 'echo':
+            return 200, self._result(ECHO_SIGNATURE)
+
+        if operation == 'payment/init' and method == 'POST':
+            with self._lock:
+                pay_id = '{:015x}'.format(len(self.payments) + 1)
+                self.payments[pay_id] = dict(request_json, status=PaymentStatus.PAYMENT_INIT)
+            return 200, self._payment_result(pay_id)
+
+        if operation == 'oneclick/init' and method == 'POST':
+            orig_pay_id = request_json.get('origPayId', '')
+            if orig_pay_id not in self.payments:
+                return 200, self._payment_result(orig_pay_id)
+            with self._lock:
+                pay_id = '{:015x}'.format(len(self.payments) + 1)
+                self.payments[pay_id] = dict(request_json, status=PaymentStatus.PAYMENT_INIT)
+            return 200, self._payment_result(pay_id)
+
+        if operation == 'oneclick/start' and method == 'POST':
+            pay_id = request_json.get('payId', '')
+            with self._lock:
+                payment = self.payments.get(pay_id)
+                if payment is not None and payment['status'] != PaymentStatus.PAYMENT_INIT:
+                    return 200, self._payment_result(pay_id, ResultCode.PAYMENT_INVALID_STATE)
+                if payment is not None:
+                    payment['status'] = PaymentStatus.PAYMENT_CONFIRMED
+            return 200, self._payment_result(pay_id)
+
+        if operation in ('payment/status', 'payment/process') and method == 'GET':
+            return 200, self._payment_result(segments[3])
+
+        if operation in OPERATION_STATUS and method in ('POST', 'PUT'):
+            pay_id = request_json.get('payId', '')
+            with self._lock:
+                if pay_id in self.payments:
+                    self.payments[pay_id]['status'] = OPERATION_STATUS[operation]
+            return 200, self._payment_result(pay_id)
+
+        if operation == 'customer/info' and method == 'GET':
+            customer_id = segments[3]
+            return 200, self._result(
+                CUSTOMER_SIGNATURE, self.customers.get(customer_id, ResultCode.CUSTOMER_NOT_FOUND),
+                customerId=customer_id)
+
+        return 404, None
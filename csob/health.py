@@ -0,0 +1,175 @@
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Callable, Deque, List, NamedTuple, Optional
+
+from csob.enums import HTTPMethod
+from csob.exceptions import GatewaySignatureInvalid
+
+if TYPE_CHECKING:
+    from csob.api import APIClient
+
+
+class HealthSample(NamedTuple):
+    ok: bool
+    verified: bool
+    latency: float
+
+
+class HealthSnapshot(NamedTuple):
+    healthy: bool
+    checked_at: Optional[float]
+    samples: int
+    success_rate: float
+    verified_rate: float
+    latency_p50: Optional[float]
+    latency_p90: Optional[float]
+    latency_p99: Optional[float]
+    last_error: Optional[str]
+
+
+def percentile(sorted_values: List[float], percent: float) -> Optional[float]:
+    """
+    Get nearest-rank percentile of already sorted values.
+
+    Args:
+        sorted_values: Values sorted ascending
+        percent: Percentile in range 0-100
+
+    Returns:
+        float or None for no values
+    """
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class HealthMonitor:
+    """
+    Periodically calls `APIClient.echo` in a background thread and keeps health of the gateway.
+
+    Results of the last `window_size` checks are kept. The gateway is healthy when the ratio of OK and verified
+    responses is at least `min_success_rate`, the 90th latency percentile is under `max_latency_p90` (if set) and
+    the last check is not older than `stale_after` seconds. `is_healthy` and `snapshot` only read the state computed
+    by the background thread, they never call the gateway and are safe to call from any thread.
+    """
+    client: 'APIClient'
+    interval: float
+    method: HTTPMethod
+    min_success_rate: float
+    max_latency_p90: Optional[float]
+    stale_after: float
+
+    def __init__(self, client: 'APIClient', interval: float = 10.0, method: HTTPMethod = HTTPMethod.GET,
+                 window_size: int = 30, min_success_rate: float = 0.9, max_latency_p90: Optional[float] = None,
+                 stale_after: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            client: Client used to call `echo`
+            interval: Seconds between two checks
+            method: HTTP method of the `echo` call
+            window_size: Number of the last checks considered
+            min_success_rate: Minimal ratio of OK and verified responses
+            max_latency_p90: Maximal 90th percentile of latency in seconds
+            stale_after: Seconds after which the last check is too old, defaults to three intervals
+            clock: Monotonic time source
+        """
+        self.client = client
+        self.interval = interval
+        self.method = method
+        self.min_success_rate = min_success_rate
+        self.max_latency_p90 = max_latency_p90
+        self.stale_after = stale_after if stale_after is not None else 3 * interval
+        self._clock = clock
+        self._samples: Deque[HealthSample] = deque(maxlen=window_size)
+        self._snapshot = HealthSnapshot(
+            healthy=False, checked_at=None, samples=0, success_rate=0.0, verified_rate=0.0, latency_p50=None,
+            latency_p90=None, latency_p99=None, last_error=None)
+        self._lock = Lock()
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+        if client.instrumentation is not None:
+            client.instrumentation.register_collector('health', self.snapshot)
+
+    def check(self) -> HealthSnapshot:
+        """
+        Call `echo` once, record the result and recompute the snapshot.
+
+        Returns:
+            HealthSnapshot
+        """
+        error = None
+        started = self._clock()
+        try:
+            api_response = self.client.echo(self.method)
+            ok, verified = api_response.is_okay, bool(api_response.is_verified)
+        except GatewaySignatureInvalid as e:
+            ok, verified, error = False, False, repr(e)
+        except Exception as e:
+            ok, verified, error = False, True, repr(e)
+        latency = self._clock() - started
+
+        with self._lock:
+            self._samples.append(HealthSample(ok=ok, verified=verified, latency=latency))
+            samples = list(self._samples)
+
+        latencies = sorted(sample.latency for sample in samples)
+        success_rate = sum(sample.ok and sample.verified for sample in samples) / len(samples)
+        latency_p90 = percentile(latencies, 90)
+        latency_ok = self.max_latency_p90 is None or latency_p90 is None or latency_p90 <= self.max_latency_p90
+        snapshot = HealthSnapshot(
+            healthy=success_rate >= self.min_success_rate and latency_ok,
+            checked_at=self._clock(),
+            samples=len(samples),
+            success_rate=success_rate,
+            verified_rate=sum(sample.verified for sample in samples) / len(samples),
+            latency_p50=percentile(latencies, 50),
+            latency_p90=latency_p90,
+            latency_p99=percentile(latencies, 99),
+            last_error=error if error is not None else self._snapshot.last_error,
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self) -> HealthSnapshot:
+        """
+        Get the last computed health, marked unhealthy when it is stale.
+
+        Returns:
+            HealthSnapshot
+        """
+        snapshot = self._snapshot
+        if snapshot.checked_at is not None and self._clock() - snapshot.checked_at > self.stale_after:
+            return snapshot._replace(healthy=False)
+        return snapshot
+
+    def is_healthy(self) -> bool:
+        return self.snapshot().healthy
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self.check()
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> None:
+        """
+        Start checking in a daemon thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name='csob-health-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the background thread.
+
+        Args:
+            timeout: Seconds to wait for the thread to finish
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
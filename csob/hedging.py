@@ -0,0 +1,226 @@
+import heapq
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import count
+from threading import Condition, Lock, Thread
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from csob.api_response import APIResponse
+from csob.deadline import Deadline
+from csob.health import percentile
+from csob.instrumentation import Instrumentation
+
+
+class HedgingPolicy:
+    """
+    Hedging of idempotent GET requests.
+
+    The request is sent in the calling thread. When its response does not arrive in the `percentile` of recent
+    latencies of the endpoint, a second request is signed and sent by a thread of the pool. The verified response
+    of the first request is used, when it fails or is not verified the response of the second one is used.
+    The second request is not sent when the first one is over in time, otherwise its response is dropped.
+
+    Every request adds `budget` tokens (up to `max_tokens`) and every hedge takes one, so at most about `budget`
+    of requests are hedged.
+
+    Emits `hedging.hedged` (the second request was sent), `hedging.hedge_won` (its response was used) and
+    `hedging.budget_exhausted` (hedging was skipped because of the budget).
+    """
+    percentile: float
+    initial_delay: float
+    min_delay: float
+    budget: float
+    max_tokens: float
+
+    def __init__(self, percentile: float = 95, initial_delay: float = 1.0, min_delay: float = 0.01,
+                 window_size: int = 100, minimum_samples: int = 20, budget: float = 0.05, max_tokens: float = 10,
+                 max_workers: int = 8, instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        Args:
+            percentile: Percentile of recent latencies after which the hedge is sent
+            initial_delay: Delay used until there are `minimum_samples` latencies of the endpoint
+            min_delay: Minimal delay in seconds
+            window_size: Number of recent latencies kept per endpoint
+            minimum_samples: Number of latencies needed to compute the delay
+            budget: Ratio of requests which may be hedged
+            max_tokens: Maximal number of hedges which may be saved up for a burst
+            max_workers: Number of threads sending the second requests
+            instrumentation: Receives hedging events
+        """
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.window_size = window_size
+        self.minimum_samples = minimum_samples
+        self.budget = budget
+        self.max_tokens = max_tokens
+        self.tokens = 0.0
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='csob-hedging')
+        self._lock = Lock()
+        # Hedges waiting for their delay (due time, sequence, endpoint, hedge, future) and the thread sending them
+        self._timers: List[Tuple[float, int, str, Callable[[], APIResponse], Future]] = []
+        self._sequence = count()
+        self._timers_changed = Condition(Lock())
+        self._timer_thread: Optional[Thread] = None
+        self._closed = False
+        self.instrumentation: Optional[Instrumentation] = None
+        if instrumentation is not None:
+            self.set_instrumentation(instrumentation)
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        if self.instrumentation is None:
+            self.instrumentation = instrumentation
+            instrumentation.register_collector('hedging', self.snapshot)
+
+    def _emit(self, event: str, **data) -> None:
+        if self.instrumentation is not None:
+            self.instrumentation.emit(event, **data)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'tokens': self.tokens,
+                'delays': {endpoint: self._get_delay(endpoint) for endpoint in self._latencies},
+            }
+
+    def _get_delay(self, endpoint: str) -> float:
+        latencies = self._latencies.get(endpoint)
+        if latencies is None or len(latencies) < self.minimum_samples:
+            return self.initial_delay
+        return max(self.min_delay, percentile(sorted(latencies), self.percentile))  # type: ignore
+
+    def get_delay(self, endpoint: str) -> float:
+        """
+        Get seconds after which the request to the endpoint is hedged.
+        """
+        with self._lock:
+            return self._get_delay(endpoint)
+
+    def record_latency(self, endpoint: str, latency: float) -> None:
+        with self._lock:
+            if endpoint not in self._latencies:
+                self._latencies[endpoint] = deque(maxlen=self.window_size)
+            self._latencies[endpoint].append(latency)
+
+    def _deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.budget)
+
+    def _withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def _timed(self, endpoint: str, attempt: Callable[[], APIResponse]) -> APIResponse:
+        started = time.monotonic()
+        try:
+            return attempt()
+        finally:
+            self.record_latency(endpoint, time.monotonic() - started)
+
+    def _schedule(self, delay: float, endpoint: str, hedge: Callable[[], APIResponse]) -> Future:
+        """
+        Send the hedge after the delay unless the returned future is cancelled before.
+        """
+        future: Future = Future()
+        with self._timers_changed:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._sequence), endpoint, hedge, future))
+            if self._timer_thread is None:
+                self._timer_thread = Thread(target=self._timer_loop, name='csob-hedging-timer', daemon=True)
+                self._timer_thread.start()
+            self._timers_changed.notify()
+        return future
+
+    def _timer_loop(self) -> None:
+        while True:
+            with self._timers_changed:
+                while not self._closed and (not self._timers or self._timers[0][0] > time.monotonic()):
+                    self._timers_changed.wait(self._timers[0][0] - time.monotonic() if self._timers else None)
+                if self._closed:
+                    return
+                _, _, endpoint, hedge, future = heapq.heappop(self._timers)
+            if not future.set_running_or_notify_cancel():
+                continue
+            if not self._withdraw():
+                self._emit('hedging.budget_exhausted', endpoint=endpoint)
+                future.set_result(None)
+                continue
+            self._emit('hedging.hedged', endpoint=endpoint)
+            self._executor.submit(self._send_hedge, endpoint, hedge, future)
+
+    def _send_hedge(self, endpoint: str, hedge: Callable[[], APIResponse], future: Future) -> None:
+        try:
+            future.set_result(self._timed(endpoint, hedge))
+        except Exception as e:
+            future.set_exception(e)
+
+    @staticmethod
+    def _hedge_response(future: Future) -> Optional[APIResponse]:
+        """
+        Wait for the sent hedge, None when it failed or was skipped because of the budget.
+        """
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def call(self, endpoint: str, first: Callable[[], APIResponse], hedge: Callable[[], APIResponse],
+             deadline: Optional[Deadline] = None) -> APIResponse:
+        """
+        Call `first` and `hedge` when `first` is slow.
+
+        Args:
+            endpoint: Key of the latencies, e.g. URL of the resource
+            first: Sends the request, called in the calling thread
+            hedge: Signs and sends another request
+            deadline: No hedge is sent when the deadline expires before the hedging delay
+
+        Returns:
+            APIResponse - response of `first` when verified, otherwise the verified response of `hedge`
+
+        Raises:
+            Exception of `first` when it fails and the hedge was not sent or failed as well
+        """
+        self._deposit()
+        delay = self.get_delay(endpoint)
+        if deadline is not None and deadline.remaining() <= delay:
+            return self._timed(endpoint, first)
+
+        secondary = self._schedule(delay, endpoint, hedge)
+        try:
+            api_response = self._timed(endpoint, first)
+        except Exception:
+            hedged = None if secondary.cancel() else self._hedge_response(secondary)
+            if hedged is None:
+                raise
+            self._emit('hedging.hedge_won', endpoint=endpoint)
+            return hedged
+
+        if api_response.is_verified or secondary.cancel():
+            return api_response
+        hedged = self._hedge_response(secondary)
+        if hedged is not None and hedged.is_verified:
+            self._emit('hedging.hedge_won', endpoint=endpoint)
+            return hedged
+        return api_response
+
+    def after_fork(self) -> None:
+        """
+        Create the threads anew in the forked process, threads of the parent process do not run in it.
+        """
+        self._lock = Lock()
+        self._timers = []
+        self._timers_changed = Condition(Lock())
+        self._timer_thread = None
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='csob-hedging')
+
+    def close(self) -> None:
+        with self._timers_changed:
+            self._closed = True
+            self._timers_changed.notify()
+        self._executor.shutdown(wait=False)
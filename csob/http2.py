@@ -0,0 +1,182 @@
+import asyncio
+import json
+from threading import Thread
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from csob.fake_gateway import TEST_PRIVATE_KEY_PATH, FakeGateway
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+except ImportError:  # pragma: no cover
+    h2 = None  # type: ignore
+
+
+class HTTP2Session(requests.Session):
+    """
+    Session sending requests through a multiplexed HTTP/2 connection.
+
+    Requests are sent by `httpx.AsyncClient` running on an event loop in a background thread, so concurrent calls
+    from several threads share a single connection to the gateway instead of opening a connection each.
+    (The synchronous `httpx.Client` is not used as it may send streams out of order when shared by threads.)
+    Responses are converted into `requests.Response`, transport errors into `requests.ConnectionError`
+    and `requests.Timeout`, so the session may be passed to `APIClient` in place of `requests.Session`.
+    TLS verification, client certificates and proxies are options of the httpx client (`verify`, `cert`, `proxy`),
+    `verify`, `cert` and `proxies` of requests (of the session or a request) raise ValueError instead
+    of being ignored.
+
+    Requires `httpx` with HTTP/2 support, install `csob-paymentgateway[http2]`.
+    """
+
+    def __init__(self, http1: bool = True, timeout: Optional[float] = None, **client_kwargs) -> None:
+        """
+        Args:
+            http1: Allow fallback to HTTP/1.1, disable it to speak HTTP/2 over plain text (prior knowledge)
+            timeout: Default timeout of requests in seconds
+            **client_kwargs: Other keyword arguments of `httpx.AsyncClient`
+        """
+        if httpx is None:
+            raise ImportError('HTTP2Session requires httpx, install csob-paymentgateway[http2].')
+        super().__init__()
+        self._client_kwargs = dict(client_kwargs, http1=http1, timeout=timeout)
+        self._start()
+
+    def _start(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, name='csob-http2-session', daemon=True)
+        self._thread.start()
+        self.client = self._run(self._create_client(**self._client_kwargs))
+
+    def after_fork(self) -> None:
+        """
+        Start the event loop and the connection anew in the forked process, the thread of the parent process
+        does not run in it.
+        """
+        self._start()
+
+    @staticmethod
+    async def _create_client(**kwargs) -> 'httpx.AsyncClient':
+        return httpx.AsyncClient(http2=True, **kwargs)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def request(self, method, url, params=None, data=None, headers=None, cookies=None, files=None, auth=None,
+                timeout=None, allow_redirects=True, proxies=None, hooks=None, stream=None, verify=None, cert=None,
+                json=None):
+        if verify not in (None, True) or self.verify is not True or cert or self.cert or proxies or self.proxies:
+            raise ValueError('verify, cert and proxies are not supported by HTTP2Session, pass verify, cert or proxy '
+                             'of httpx.AsyncClient to HTTP2Session instead.')
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+        try:
+            response = self._run(self.client.request(
+                method, url, params=params, content=data, json=json, headers=request_headers,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                follow_redirects=allow_redirects))
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e)
+
+        out = requests.Response()
+        out.status_code = response.status_code
+        out.reason = response.reason_phrase
+        out.headers = CaseInsensitiveDict(response.headers)
+        out._content = response.content
+        out.encoding = response.encoding
+        out.url = str(response.url)
+        out.elapsed = response.elapsed
+        return out
+
+    def close(self) -> None:
+        if self._loop.is_running():
+            self._run(self.client.aclose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        super().close()
+
+
+class _H2Protocol(asyncio.Protocol):
+    def __init__(self, gateway: 'FakeHTTP2Gateway') -> None:
+        self.gateway = gateway
+        self.connection = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        self.streams: Dict[int, Tuple[Dict[str, str], bytearray]] = {}
+        self.transport: Optional[asyncio.Transport] = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        self.gateway._connection_opened()
+        self.connection.initiate_connection()
+        transport.write(self.connection.data_to_send())
+
+    def data_received(self, data: bytes) -> None:
+        try:
+            events = self.connection.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.connection.data_to_send())  # type: ignore
+            self.transport.close()  # type: ignore
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.streams[event.stream_id] = (dict(event.headers), bytearray())  # type: ignore
+            elif isinstance(event, h2.events.DataReceived):
+                self.streams[event.stream_id][1].extend(event.data)
+                self.connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                asyncio.ensure_future(self._respond(event.stream_id))
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()  # type: ignore
+        self.transport.write(self.connection.data_to_send())  # type: ignore
+
+    async def _respond(self, stream_id: int) -> None:
+        headers, body = self.streams.pop(stream_id)
+        status, data = await asyncio.get_event_loop().run_in_executor(
+            None, self.gateway.handle_path, headers[':method'], headers[':path'], bytes(body))
+        payload = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.connection.send_headers(stream_id, [
+            (':status', str(status)), ('content-type', 'application/json'), ('content-length', str(len(payload)))])
+        self.connection.send_data(stream_id, payload, end_stream=True)
+        self.transport.write(self.connection.data_to_send())  # type: ignore
+
+
+class FakeHTTP2Gateway(FakeGateway):
+    """
+    `FakeGateway` speaking HTTP/2 over plain text (prior knowledge), use `HTTP2Session(http1=False)` with it.
+
+    Requires `h2`, install `csob-paymentgateway[http2]`.
+    """
+
+    def __init__(self, private_key_path: str = TEST_PRIVATE_KEY_PATH, host: str = '127.0.0.1', port: int = 0) -> None:
+        if h2 is None:
+            raise ImportError('FakeHTTP2Gateway requires h2, install csob-paymentgateway[http2].')
+        super().__init__(private_key_path, host, port)
+
+    def _create_server(self, host: str, port: int) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._h2_server = self._loop.run_until_complete(
+            self._loop.create_server(lambda: _H2Protocol(self), host, port))
+        self.address = self._h2_server.sockets[0].getsockname()[:2]
+
+    def _serve(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _stop_server(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+        self._h2_server.close()
+        self._loop.close()
@@ -0,0 +1,65 @@
+from collections import Counter
+from threading import Lock
+from typing import Any, Callable, Dict, List
+
+
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class Instrumentation:
+    """
+    Collects events emitted by the client and exports state of its components.
+
+    Events are counted in `counters` and passed to every subscribed callback. Components with an internal state
+    (e.g. circuit breakers) register a collector which is called by `collect`.
+    """
+    counters: Counter
+
+    def __init__(self) -> None:
+        self.counters = Counter()
+        self._subscribers: List[EventCallback] = []
+        self._collectors: Dict[str, Callable[[], Any]] = {}
+        self._lock = Lock()
+
+    def subscribe(self, callback: EventCallback) -> None:
+        """
+        Register callback called with every emitted event.
+
+        Args:
+            callback: Callable accepting event name and event data.
+        """
+        with self._lock:
+            self._subscribers = self._subscribers + [callback]
+
+    def emit(self, event: str, **data: Any) -> None:
+        """
+        Count the event and pass it to subscribers.
+
+        Args:
+            event: Name of the event, e.g. `circuit_breaker.opened`
+            **data: Event data
+        """
+        with self._lock:
+            self.counters[event] += 1
+        for callback in self._subscribers:
+            callback(event, data)
+
+    def register_collector(self, name: str, collector: Callable[[], Any]) -> None:
+        """
+        Register callable which exports state of a component.
+
+        Args:
+            name: Name under which the state is exported
+            collector: Callable without arguments returning the state
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Get state of all registered components.
+
+        Returns:
+            dict - collector name -> state
+        """
+        return {name: collector() for name, collector in list(self._collectors.items())}
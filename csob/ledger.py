@@ -0,0 +1,285 @@
+import sqlite3
+import time
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from csob.api_response import APIResponse
+from csob.enums import PaymentStatus
+from csob.instrumentation import Instrumentation
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS payments (
+    pay_id TEXT PRIMARY KEY,
+    order_number TEXT,
+    customer_id TEXT,
+    total_amount INTEGER,
+    closed_amount INTEGER,
+    currency TEXT,
+    payment_status INTEGER,
+    result_code INTEGER,
+    dttm TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS payments_order_number ON payments (order_number);
+CREATE INDEX IF NOT EXISTS payments_customer_id ON payments (customer_id);
+CREATE INDEX IF NOT EXISTS payments_payment_status ON payments (payment_status);
+CREATE INDEX IF NOT EXISTS payments_dttm ON payments (dttm);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pay_id TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    payment_status INTEGER,
+    result_code INTEGER,
+    dttm TEXT,
+    recorded_at REAL
+);
+CREATE INDEX IF NOT EXISTS events_pay_id ON events (pay_id);
+'''
+
+# INSERT OR IGNORE followed by UPDATE instead of an upsert, which needs SQLite 3.24
+INSERT_PAYMENT = '''
+INSERT OR IGNORE INTO payments (pay_id) VALUES (?)
+'''
+
+UPDATE_PAYMENT = '''
+UPDATE payments SET
+    order_number = COALESCE(?, order_number),
+    customer_id = COALESCE(?, customer_id),
+    total_amount = COALESCE(?, total_amount),
+    closed_amount = COALESCE(?, closed_amount),
+    currency = COALESCE(?, currency),
+    payment_status = COALESCE(?, payment_status),
+    result_code = ?,
+    dttm = ?,
+    updated_at = ?
+WHERE pay_id = ?
+'''
+
+INSERT_EVENT = '''
+INSERT INTO events (pay_id, operation, payment_status, result_code, dttm, recorded_at) VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+PAYMENT_COLUMNS = (
+    'pay_id, order_number, customer_id, total_amount, closed_amount, currency, payment_status, result_code, dttm, '
+    'updated_at')
+
+
+class LedgerPayment(NamedTuple):
+    pay_id: str
+    order_number: Optional[str]
+    customer_id: Optional[str]
+    total_amount: Optional[int]
+    closed_amount: Optional[int]
+    currency: Optional[str]
+    payment_status: Optional[PaymentStatus]
+    result_code: Optional[int]
+    dttm: Optional[str]
+    updated_at: float
+
+
+class LedgerEvent(NamedTuple):
+    pay_id: str
+    operation: str
+    payment_status: Optional[PaymentStatus]
+    result_code: Optional[int]
+    dttm: Optional[str]
+    recorded_at: float
+
+
+def _payment_status(value: Optional[int]) -> Optional[PaymentStatus]:
+    return PaymentStatus(value) if value is not None else None
+
+
+class Ledger:
+    """
+    Local record of payments and their operations stored in SQLite.
+
+    Verified responses of payment operations are queued by the resources and written in batches by a background
+    thread, so recording never blocks the request. Queries are answered from the local database, call `flush`
+    to wait until everything queued is written. The total amount of `init` and the amount of `close` are stored
+    separately, a partial close does not change `total_amount`. Records are rejected once the ledger is closed.
+
+    A batch which fails to be written (e.g. locked database or full disk) is dropped and `ledger.write_failed`
+    is emitted with the exception and the number of lost records, the writer keeps running.
+    """
+    path: str
+    batch_size: int
+    flush_interval: float
+
+    def __init__(self, path: str = ':memory:', batch_size: int = 500, flush_interval: float = 0.5,
+                 instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        Args:
+            path: Path of the SQLite database
+            batch_size: Maximal number of records written in a single transaction
+            flush_interval: Maximal seconds a record waits in the queue
+            instrumentation: Receives write failures
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.failed_batches = 0
+        self.lost_records = 0
+        self.instrumentation: Optional[Instrumentation] = None
+        if instrumentation is not None:
+            self.set_instrumentation(instrumentation)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(SCHEMA)
+        self._start()
+
+    def _start(self) -> None:
+        self._lock = Lock()
+        self._record_lock = Lock()
+        self._queue: Queue = Queue()
+        self._closed = Event()
+        self._thread = Thread(target=self._write_loop, name='csob-ledger', daemon=True)
+        self._thread.start()
+
+    def after_fork(self) -> None:
+        """
+        Start the writer anew in the forked process, records queued by the parent process are left to it.
+
+        A database file is opened again, an in-memory database is a copy private to the process.
+        """
+        if self.path != ':memory:':
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._start()
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        if self.instrumentation is None:
+            self.instrumentation = instrumentation
+            instrumentation.register_collector('ledger', self.stats)
+
+    def stats(self) -> Dict[str, int]:
+        return {'queued': self._queue.qsize(), 'failed_batches': self.failed_batches,
+                'lost_records': self.lost_records}
+
+    def record(self, operation: str, request_json: Optional[Dict], api_response: APIResponse) -> None:
+        """
+        Queue the result of a payment operation, unverified responses and responses without payId are ignored.
+
+        Args:
+            operation: Name of the operation, e.g. `init` or `close`
+            request_json: Request body, it holds order data of `init`
+            api_response: Response of the gateway
+        """
+        response_json = api_response.response_json
+        if not api_response.is_verified or not response_json or 'payId' not in response_json:
+            return
+        request_json = request_json or {}
+        amount = request_json.get('totalAmount')
+        total_amount, closed_amount = (None, amount) if operation == 'close' else (amount, None)
+        with self._record_lock:
+            if self._closed.is_set():
+                raise RuntimeError('Ledger is closed.')
+            self._queue.put((
+                response_json['payId'], request_json.get('orderNo'), request_json.get('customerId'), total_amount,
+                closed_amount, request_json.get('currency'), response_json.get('paymentStatus'),
+                response_json.get('resultCode'), response_json.get('dttm'), time.time(), operation,
+            ))
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except Empty:
+                if self._closed.is_set():
+                    return
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                self.failed_batches += 1
+                self.lost_records += len(batch)
+                if self.instrumentation is not None:
+                    self.instrumentation.emit('ledger.write_failed', error='{}: {}'.format(type(e).__name__, e),
+                                              records=len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[Tuple]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(INSERT_PAYMENT, [row[:1] for row in batch])
+            self._connection.executemany(UPDATE_PAYMENT, [row[1:10] + row[:1] for row in batch])
+            self._connection.executemany(INSERT_EVENT, [(row[0], row[10], row[6], row[7], row[8], row[9])
+                                                        for row in batch])
+
+    def flush(self) -> None:
+        """
+        Wait until all queued records are written.
+        """
+        self._queue.join()
+
+    def close(self) -> None:
+        """
+        Write the queued records and stop the writer, later records raise RuntimeError.
+        """
+        with self._record_lock:
+            self._closed.set()
+        self.flush()
+        self._thread.join()
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def _payment(row: Tuple) -> LedgerPayment:
+        return LedgerPayment(*row[:6], _payment_status(row[6]), *row[7:])  # type: ignore
+
+    def get_payment(self, pay_id: str) -> Optional[LedgerPayment]:
+        rows = self._query('SELECT {} FROM payments WHERE pay_id = ?'.format(PAYMENT_COLUMNS), (pay_id,))
+        return self._payment(rows[0]) if rows else None
+
+    def find_payments(self, order_number: Optional[str] = None, customer_id: Optional[str] = None,
+                      payment_status: Optional[PaymentStatus] = None, dttm_from: Optional[str] = None,
+                      dttm_to: Optional[str] = None, limit: Optional[int] = None) -> List[LedgerPayment]:
+        """
+        Find payments matching all the given conditions, the latest first.
+
+        Args:
+            order_number: Order number of the payment
+            customer_id: Customer’s ID of the payment
+            payment_status: Current status of the payment
+            dttm_from: Minimal `dttm` (YYYYMMDDHHMMSS) of the last operation
+            dttm_to: Maximal `dttm` (YYYYMMDDHHMMSS) of the last operation
+            limit: Maximal number of payments
+
+        Returns:
+            list of LedgerPayment
+        """
+        conditions = []
+        parameters: List[Any] = []
+        for condition, value in (('order_number = ?', order_number), ('customer_id = ?', customer_id),
+                                 ('payment_status = ?', payment_status), ('dttm >= ?', dttm_from),
+                                 ('dttm <= ?', dttm_to)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(int(value) if isinstance(value, PaymentStatus) else value)
+        sql = 'SELECT {} FROM payments'.format(PAYMENT_COLUMNS)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY dttm DESC, updated_at DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+        return [self._payment(row) for row in self._query(sql, tuple(parameters))]
+
+    def get_history(self, pay_id: str) -> List[LedgerEvent]:
+        """
+        Get recorded operations of the payment, the oldest first.
+        """
+        rows = self._query('SELECT pay_id, operation, payment_status, result_code, dttm, recorded_at FROM events '
+                           'WHERE pay_id = ? ORDER BY id', (pay_id,))
+        return [LedgerEvent(row[0], row[1], _payment_status(row[2]), *row[3:]) for row in rows]  # type: ignore
@@ -0,0 +1,351 @@
+"""
+Load generator driving `APIClient` against the local fake gateway or a configured gateway.
+
+Usage:
+    python -m csob.loadtest --mode threaded --threads 16 --rps 200 --duration 30 \\
+        --mix payment_init=1,payment_status=4,payment_close=1,echo=1 --json report.json
+
+Without `--url` a local `FakeGateway` is started. Latencies are measured from the scheduled start of the call
+when `--rps` is set, so a stalled client does not hide queueing delay (coordinated omission).
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from csob.api import APIClient
+from csob.fake_gateway import TEST_PRIVATE_KEY_PATH, FakeGateway
+from csob.instrumentation import Instrumentation
+
+OPERATIONS = ('payment_init', 'payment_status', 'payment_close', 'echo')
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of latencies in the style of HdrHistogram.
+
+    Values are kept in microseconds in buckets of `2 ** sub_bucket_bits` linear sub-buckets per power of two,
+    so the relative error of a recorded value is below `2 ** -sub_bucket_bits`.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 7) -> None:
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts: Counter = Counter()
+        self.count = 0
+        self.max = 0
+        self._lock = Lock()
+
+    def _index(self, value: int) -> int:
+        if value < (1 << self.sub_bucket_bits):
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits - 1
+        return ((shift + 1) << self.sub_bucket_bits) + (value >> shift) - (1 << self.sub_bucket_bits)
+
+    def _value(self, index: int) -> int:
+        """
+        Get the highest value of the bucket.
+        """
+        sub_buckets = 1 << self.sub_bucket_bits
+        if index < sub_buckets:
+            return index
+        shift = (index >> self.sub_bucket_bits) - 1
+        return (((index & (sub_buckets - 1)) + sub_buckets) << shift) + (1 << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        value = max(0, int(seconds * 1000000))
+        with self._lock:
+            self.counts[self._index(value)] += 1
+            self.count += 1
+            self.max = max(self.max, value)
+
+    def percentile(self, percent: float) -> float:
+        """
+        Get the percentile in seconds, zero when nothing was recorded.
+        """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, int(math.ceil(percent / 100 * self.count)))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= rank:
+                    return min(self._value(index), self.max) / 1000000
+        return self.max / 1000000
+
+
+class LoadTest:
+    """
+    Runs the mix of operations and collects the results.
+
+    CPU time of signing and verification is read from the events of the client instrumentation, a client without
+    one is replaced by its copy with a new instrumentation.
+    """
+
+    def __init__(self, client: APIClient, mix: Dict[str, float], rps: Optional[float] = None,
+                 duration: Optional[float] = None, calls: Optional[int] = None, seed: int = 0) -> None:
+        instrumentation = client.instrumentation
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+            client = client.replace(instrumentation=instrumentation)
+        self.client = client
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.rps = rps
+        self.duration = duration
+        self.calls = calls
+        self.random = random.Random(seed)
+        self.histogram = LatencyHistogram()
+        self.histograms = {name: LatencyHistogram() for name in self.operations}
+        self.result_codes: Counter = Counter()
+        self.http_statuses: Counter = Counter()
+        self.exceptions: Counter = Counter()
+        self.cpu: Counter = Counter()
+        self.pay_ids: List[str] = []
+        self._order_number = 0
+        self._scheduled = 0
+        self._lock = Lock()
+        self._started = 0.0
+        instrumentation.subscribe(self._on_event)
+
+    def _on_event(self, event: str, data: Dict[str, Any]) -> None:
+        if event in ('crypto.sign', 'crypto.verify'):
+            with self._lock:
+                self.cpu[event + '.seconds'] += data['cpu_seconds']
+                self.cpu[event + '.calls'] += 1
+
+    def _next(self) -> Optional[Tuple[str, float]]:
+        """
+        Get the next operation and its scheduled start, None when the test is over.
+        """
+        with self._lock:
+            number = self._scheduled
+            if self.calls is not None and number >= self.calls:
+                return None
+            scheduled = self._started + number / self.rps if self.rps else time.perf_counter()
+            if self.duration is not None and scheduled - self._started >= self.duration:
+                return None
+            self._scheduled += 1
+            name = self.random.choices(self.operations, self.weights)[0]
+            if name in ('payment_status', 'payment_close') and not self.pay_ids:
+                name = 'payment_init'
+            return name, scheduled
+
+    def _call(self, name: str):
+        if name == 'payment_init':
+            with self._lock:
+                self._order_number += 1
+                order_number = str(self._order_number % 10 ** 10)
+            api_response = self.client.payment_init(order_number, 100, False, 'https://localhost', 'Load test')
+            if api_response.is_okay and api_response.response_json:
+                with self._lock:
+                    self.pay_ids.append(api_response.response_json['payId'])
+            return api_response
+        if name == 'echo':
+            return self.client.echo()
+        with self._lock:
+            pay_id = self.random.choice(self.pay_ids)
+        if name == 'payment_status':
+            return self.client.payment_status(pay_id)
+        return self.client.payment_close(pay_id, None)
+
+    def run_one(self, name: str, scheduled: float) -> None:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            api_response = self._call(name)
+        except Exception as e:
+            with self._lock:
+                self.exceptions[type(e).__name__] += 1
+        else:
+            with self._lock:
+                if api_response.http_status_code is not None and api_response.http_status_code != 200:
+                    self.http_statuses[str(api_response.http_status_code)] += 1
+                elif not api_response.is_okay:
+                    self.result_codes[str(api_response.result_code)] += 1
+                elif api_response.is_verified is False:
+                    self.exceptions['GatewaySignatureInvalid'] += 1
+        latency = time.perf_counter() - scheduled
+        self.histogram.record(latency)
+        self.histograms[name].record(latency)
+
+    def _worker(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            self.run_one(*item)
+
+    def run_sync(self) -> None:
+        self._started = time.perf_counter()
+        self._worker()
+
+    def run_threaded(self, threads: int) -> None:
+        self._started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            for future in [executor.submit(self._worker) for _ in range(threads)]:
+                future.result()
+
+    def run_async(self, concurrency: int) -> None:
+        """
+        Schedule the calls from an event loop, the blocking client calls run in an executor.
+        """
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(concurrency)
+
+        async def run() -> None:
+            semaphore = asyncio.Semaphore(concurrency)
+            tasks = []
+
+            async def call(name: str, scheduled: float) -> None:
+                try:
+                    await loop.run_in_executor(executor, self.run_one, name, scheduled)
+                finally:
+                    semaphore.release()
+
+            while True:
+                await semaphore.acquire()
+                item = self._next()
+                if item is None:
+                    break
+                delay = item[1] - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(loop.create_task(call(*item)))
+            await asyncio.gather(*tasks)
+
+        self._started = time.perf_counter()
+        try:
+            loop.run_until_complete(run())
+        finally:
+            executor.shutdown()
+            loop.close()
+
+    def report(self, mode: str, duration: float) -> Dict[str, Any]:
+        def latencies(histogram: LatencyHistogram) -> Dict[str, float]:
+            return {
+                'count': histogram.count,
+                'p50_ms': histogram.percentile(50) * 1000,
+                'p90_ms': histogram.percentile(90) * 1000,
+                'p99_ms': histogram.percentile(99) * 1000,
+                'p999_ms': histogram.percentile(99.9) * 1000,
+                'max_ms': histogram.max / 1000,
+            }
+
+        return {
+            'mode': mode,
+            'calls': self.histogram.count,
+            'duration_s': duration,
+            'throughput_rps': self.histogram.count / duration if duration else 0.0,
+            'target_rps': self.rps,
+            'latency': latencies(self.histogram),
+            'operations': {name: latencies(histogram) for name, histogram in self.histograms.items()},
+            'cpu': {
+                'sign_seconds': self.cpu['crypto.sign.seconds'],
+                'sign_calls': self.cpu['crypto.sign.calls'],
+                'verify_seconds': self.cpu['crypto.verify.seconds'],
+                'verify_calls': self.cpu['crypto.verify.calls'],
+            },
+            'errors': {
+                'result_codes': dict(self.result_codes),
+                'http_statuses': dict(self.http_statuses),
+                'exceptions': dict(self.exceptions),
+            },
+        }
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError('Unknown operation `{}`, use {}.'.format(name, ', '.join(OPERATIONS)))
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m csob.loadtest', description=__doc__.split('\n\n')[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('sync', 'threaded', 'async'), default='threaded')
+    parser.add_argument('--threads', type=int, default=8, help='Threads (threaded) or concurrent calls (async)')
+    parser.add_argument('--rps', type=float, help='Target requests per second, as fast as possible when not set')
+    parser.add_argument('--duration', type=float, help='Seconds of the test')
+    parser.add_argument('--calls', type=int, help='Number of calls, defaults to 1000 without --duration')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('payment_init=1,payment_status=4,echo=1'),
+                        help='Weights of the operations, e.g. payment_init=1,payment_status=4,payment_close=1,echo=1')
+    parser.add_argument('--url', help='API URL of the gateway, a local fake gateway is started when not set')
+    parser.add_argument('--merchant-id', default='A3746UdxZO')
+    parser.add_argument('--private-key', default=TEST_PRIVATE_KEY_PATH, help='Path to the merchant private key')
+    parser.add_argument('--public-key', help='Path to the gateway public key')
+    parser.add_argument('--gateway-delay', type=float, default=0.0, help='Seconds added by the fake gateway')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Write the report as JSON to the path, `-` for stdout')
+    return parser
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    latency = report['latency']
+    cpu = report['cpu']
+    errors = report['errors']
+    lines = [
+        '{mode}: {calls} calls in {duration_s:.2f} s, {throughput_rps:.1f} calls/s'.format(**report),
+        'latency p50 {p50_ms:.2f} ms  p90 {p90_ms:.2f} ms  p99 {p99_ms:.2f} ms  p99.9 {p999_ms:.2f} ms  '
+        'max {max_ms:.2f} ms'.format(**latency),
+        'cpu sign {:.3f} s ({} calls)  verify {:.3f} s ({} calls)'.format(
+            cpu['sign_seconds'], cpu['sign_calls'], cpu['verify_seconds'], cpu['verify_calls']),
+    ]
+    for name, counts in errors.items():
+        if counts:
+            lines.append('{}: {}'.format(name, ', '.join('{}={}'.format(k, v) for k, v in sorted(counts.items()))))
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None, out: Callable[[str], Any] = print) -> Dict[str, Any]:
+    args = get_parser().parse_args(argv)
+    calls = args.calls if args.calls is not None or args.duration is not None else 1000
+
+    gateway = None
+    if args.url is None:
+        gateway = FakeGateway().start()
+        gateway.delay = args.gateway_delay
+        client = gateway.client(args.merchant_id, private_key_path=args.private_key, raise_exceptions=False,
+                                instrumentation=Instrumentation())
+    else:
+        client = APIClient(args.merchant_id, args.private_key, args.public_key, api_url=args.url,
+                           raise_exceptions=False, instrumentation=Instrumentation())
+
+    load_test = LoadTest(client, args.mix, rps=args.rps, duration=args.duration, calls=calls, seed=args.seed)
+    try:
+        started = time.perf_counter()
+        if args.mode == 'sync':
+            load_test.run_sync()
+        elif args.mode == 'threaded':
+            load_test.run_threaded(args.threads)
+        else:
+            load_test.run_async(args.threads)
+        report = load_test.report(args.mode, time.perf_counter() - started)
+    finally:
+        client.session.close()
+        if gateway is not None:
+            gateway.stop()
+
+    out(format_report(report))
+    if args.json == '-':
+        out(json.dumps(report, indent=2))
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main()
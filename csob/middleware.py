@@ -0,0 +1,263 @@
+"""
+WSGI and ASGI middleware verifying redirects of the payment gateway to the return URL.
+
+Example:
+    application = WSGIReturnURLMiddleware(application, client, ['/payment/return/'])
+
+    def view(request):
+        result = request.environ['csob.return_url']
+        if result.ok:
+            ...
+
+Requests of the return paths get `ReturnURLResult` in the WSGI environ or the ASGI scope under `csob.return_url`,
+other requests pass through untouched. The form body of POST redirects is buffered and replayed to the application.
+"""
+import asyncio
+import binascii
+import time
+from base64 import b64decode
+from concurrent.futures import Executor, ThreadPoolExecutor
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from csob.crypto import import_key
+from csob.enums import PaymentStatus
+from csob.exceptions import GatewaySignatureInvalid
+from csob.instrumentation import Instrumentation
+
+if TYPE_CHECKING:
+    from csob.api import APIClient
+
+ENVIRON_KEY = 'csob.return_url'
+
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+
+# Parameters the gateway always sends to the return URL
+REQUIRED_PARAMETERS = ('payId', 'dttm', 'resultCode', 'resultMessage', 'signature')
+
+
+class ReturnURLResult(NamedTuple):
+    """
+    Redirect of the gateway to the return URL.
+
+    The payment fields are set only when the signature is verified, `data` holds the received parameters and
+    `error` the reason why the redirect was not verified.
+    """
+    verified: bool
+    data: Dict[str, str]
+    pay_id: Optional[str] = None
+    result_code: Optional[int] = None
+    result_message: Optional[str] = None
+    payment_status: Optional[PaymentStatus] = None
+    auth_code: Optional[str] = None
+    merchant_data: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.verified and self.result_code == 0
+
+
+def decode_merchant_data(value: Optional[str]) -> Optional[str]:
+    """
+    Decode BASE64 encoded `merchantData`, None when it is missing or not valid.
+    """
+    if not value:
+        return None
+    try:
+        return b64decode(value, validate=True).decode('utf-8')
+    except (binascii.Error, ValueError):
+        return None
+
+
+def parse_parameters(query: str, body: bytes = b'') -> Dict[str, str]:
+    """
+    Get parameters of the query string and the form body, the body wins.
+    """
+    parameters = dict(parse_qsl(query, keep_blank_values=True))
+    if body:
+        parameters.update(parse_qsl(body.decode('latin-1'), keep_blank_values=True))
+    return parameters
+
+
+class ReturnURLVerifier:
+    """
+    Verifies the parameters of redirects with the gateway key of the client parsed in advance.
+
+    Emits `return_url.verified` with `seconds` of the verification and whether it was `verified`.
+    """
+
+    def __init__(self, client: 'APIClient', instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        Args:
+            client: Client with the gateway key, `outbox` of the client observes the verified redirects
+            instrumentation: Receives the verification events, defaults to the one of the client
+        """
+        self.client = client
+        self.instrumentation = instrumentation if instrumentation is not None else client.instrumentation
+        import_key(client.resource_kwargs['gateway_key'])
+
+    def verify(self, data: Dict[str, str]) -> ReturnURLResult:
+        started = time.perf_counter()
+        result = self._verify(data)
+        if self.instrumentation is not None:
+            self.instrumentation.emit('return_url.verified', seconds=time.perf_counter() - started,
+                                      verified=result.verified)
+        return result
+
+    def _verify(self, data: Dict[str, str]) -> ReturnURLResult:
+        missing = [name for name in REQUIRED_PARAMETERS if name not in data]
+        if missing:
+            return ReturnURLResult(False, data, error='Missing {}.'.format(', '.join(missing)))
+        try:
+            api_response = self.client.parse_payment_return_url_get(data)
+        except GatewaySignatureInvalid:
+            return ReturnURLResult(False, data, error='Invalid signature.')
+        if not api_response.is_verified:
+            return ReturnURLResult(False, data, error='Invalid signature.')
+
+        try:
+            result_code = int(data['resultCode'])
+            payment_status = PaymentStatus(int(data['paymentStatus'])) if data.get('paymentStatus') else None
+        except ValueError as e:
+            return ReturnURLResult(False, data, error=str(e))
+        return ReturnURLResult(
+            True, data, data['payId'], result_code, data['resultMessage'], payment_status, data.get('authCode'),
+            decode_merchant_data(data.get('merchantData')))
+
+
+class WSGIReturnURLMiddleware:
+    """
+    WSGI middleware verifying redirects to the return paths in the request thread.
+    """
+
+    def __init__(self, app: Callable, client: 'APIClient', paths: Iterable[str], environ_key: str = ENVIRON_KEY,
+                 max_body_size: int = 65536, instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        Args:
+            app: WSGI application
+            client: Client with the gateway key
+            paths: Paths of the return URLs
+            environ_key: Key of `ReturnURLResult` in the environ
+            max_body_size: Size of the largest POST body which is parsed
+            instrumentation: Receives the verification events, defaults to the one of the client
+        """
+        self.app = app
+        self.paths = frozenset(paths)
+        self.environ_key = environ_key
+        self.max_body_size = max_body_size
+        self.verifier = ReturnURLVerifier(client, instrumentation)
+
+    def _read_body(self, environ: Dict[str, Any]) -> Optional[bytes]:
+        """
+        Read the form body and replace `wsgi.input`, None when it is too large.
+        """
+        content_type = environ.get('CONTENT_TYPE', '')
+        if environ.get('REQUEST_METHOD') != 'POST' or not content_type.startswith(FORM_CONTENT_TYPE):
+            return b''
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > self.max_body_size:
+            return None
+        body = environ['wsgi.input'].read(length) if length > 0 else b''
+        environ['wsgi.input'] = BytesIO(body)
+        return body
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        if environ.get('PATH_INFO') in self.paths:
+            body = self._read_body(environ)
+            if body is None:
+                result = ReturnURLResult(False, {}, error='Request body is too large.')
+            else:
+                result = self.verifier.verify(parse_parameters(environ.get('QUERY_STRING', ''), body))
+            environ[self.environ_key] = result
+        return self.app(environ, start_response)
+
+
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class ASGIReturnURLMiddleware:
+    """
+    ASGI middleware verifying redirects to the return paths in a thread pool, so the verification does not block
+    the event loop.
+    """
+
+    def __init__(self, app: Callable, client: 'APIClient', paths: Iterable[str], scope_key: str = ENVIRON_KEY,
+                 max_body_size: int = 65536, executor: Optional[Executor] = None, max_workers: int = 4,
+                 instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        Args:
+            app: ASGI application
+            client: Client with the gateway key
+            paths: Paths of the return URLs
+            scope_key: Key of `ReturnURLResult` in the scope
+            max_body_size: Size of the largest POST body which is parsed
+            executor: Executor running the verification, a thread pool of `max_workers` is created when not set
+            max_workers: Number of threads of the created thread pool
+            instrumentation: Receives the verification events, defaults to the one of the client
+        """
+        self.app = app
+        self.paths = frozenset(paths)
+        self.scope_key = scope_key
+        self.max_body_size = max_body_size
+        self._own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(
+            max_workers, thread_name_prefix='csob-return-url')
+        self.verifier = ReturnURLVerifier(client, instrumentation)
+
+    async def _read_body(self, scope: Dict[str, Any], receive: Receive) -> Tuple[Optional[bytes], Receive]:
+        """
+        Read the form body, None when it is too large.
+
+        Returns:
+            tuple - the body and `receive` replaying the read messages to the application
+        """
+        headers = dict(scope.get('headers') or ())
+        content_type = headers.get(b'content-type', b'').decode('latin-1')
+        if scope.get('method') != 'POST' or not content_type.startswith(FORM_CONTENT_TYPE):
+            return b'', receive
+
+        messages: List[Dict[str, Any]] = []
+        size = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message['type'] != 'http.request':
+                break
+            size += len(message.get('body', b''))
+            if size > self.max_body_size or not message.get('more_body', False):
+                break
+
+        async def replay() -> Dict[str, Any]:
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        if size > self.max_body_size or messages[-1]['type'] != 'http.request':
+            return None, replay
+        return b''.join(message.get('body', b'') for message in messages), replay
+
+    async def __call__(self, scope: Dict[str, Any], receive: Receive, send: Callable) -> None:
+        if scope['type'] != 'http' or scope.get('path') not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        body, receive = await self._read_body(scope, receive)
+        if body is None:
+            result = ReturnURLResult(False, {}, error='Request body is too large.')
+        else:
+            parameters = parse_parameters(scope.get('query_string', b'').decode('latin-1'), body)
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(self.executor, self.verifier.verify, parameters)
+        await self.app(dict(scope, **{self.scope_key: result}), receive, send)
+
+    def close(self) -> None:
+        """
+        Shut down the created thread pool.
+        """
+        if self._own_executor:
+            self.executor.shutdown()
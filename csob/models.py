@@ -0,0 +1,283 @@
+from base64 import b64encode
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from csob.enums import Currency, HTTPMethod, Language, PayMethod, PayOperation
+
+
+def enum_value(value: Any) -> Any:
+    """
+    Convert enum member into its value, other values are returned unchanged.
+    """
+    return value.value if isinstance(value, Enum) else value
+
+
+def hundredths(value: Any) -> Any:
+    """
+    Convert Decimal amount into hundredths, other values are returned unchanged.
+    """
+    return int(value * 100) if isinstance(value, Decimal) else value
+
+
+def base64_text(value: str) -> str:
+    return str(b64encode(bytes(value, 'utf-8')), 'utf-8')
+
+
+def _signature_parts(value: Any) -> List[str]:
+    if isinstance(value, list):  # Cart list of dicts
+        return [str(v) for item in value for v in item.values()]
+    elif value is True:
+        return ['true']
+    elif value is False:
+        return ['false']
+    return [str(value)]
+
+
+class Field:
+    """
+    Declaration of a request field.
+
+    The value is first converted by `convert` and then validated, `error` is the message of `ValueError`
+    raised when the validation fails or a required value is missing.
+    """
+    __slots__ = ('key', 'error', 'required', 'max_length', 'choices', 'types', 'min_value', 'max_value', 'convert',
+                 'default')
+
+    def __init__(self, key: str, error: str, required: bool = True, max_length: Optional[int] = None,
+                 choices: Optional[Tuple] = None, types: Optional[Tuple[type, ...]] = None,
+                 min_value: Optional[int] = None, max_value: Optional[int] = None,
+                 convert: Optional[Callable[[Any], Any]] = None,
+                 default: Optional[Callable[[Dict], Any]] = None) -> None:
+        """
+        Args:
+            key: JSON key of the field
+            error: Message of the validation error
+            required: Whether the value must be set
+            max_length: Maximal length of the value
+            choices: Allowed values
+            types: Allowed types of the value
+            min_value: Minimal value
+            max_value: Maximal value
+            convert: Conversion applied before validation
+            default: Callable getting the already serialized fields and returning value used when none is set
+        """
+        self.key = key
+        self.error = error
+        self.required = required
+        self.max_length = max_length
+        self.choices = frozenset(choices) if choices is not None else None
+        self.types = types
+        self.min_value = min_value
+        self.max_value = max_value
+        self.convert = convert
+        self.default = default
+
+    def compile(self) -> Optional[Callable[[Any], bool]]:
+        """
+        Build the validator of the field.
+
+        Returns:
+            Callable returning whether the value is valid or None when there is nothing to validate
+        """
+        checks: List[Callable[[Any], bool]] = []
+        if self.types is not None:
+            types = self.types
+            checks.append(lambda value: isinstance(value, types))
+        if self.choices is not None:
+            choices = self.choices
+            checks.append(lambda value: value in choices)
+        if self.max_length is not None:
+            max_length = self.max_length
+            checks.append(lambda value: len(value) <= max_length)
+        if self.min_value is not None:
+            min_value = self.min_value
+            checks.append(lambda value: value >= min_value)
+        if self.max_value is not None:
+            max_value = self.max_value
+            checks.append(lambda value: value <= max_value)
+
+        if not checks:
+            return None
+        if len(checks) == 1:
+            return checks[0]
+        return lambda value: all(check(value) for check in checks)
+
+
+class _Step:
+    """
+    Compiled step of `RequestModel.dump`, `attribute` is None for keys taken from the context.
+    """
+    __slots__ = ('key', 'attribute', 'error', 'required', 'convert', 'check', 'default')
+
+    def __init__(self, key: str, attribute: Optional[str] = None, field: Optional[Field] = None) -> None:
+        self.key = key
+        self.attribute = attribute
+        self.error = field.error if field is not None else ''
+        self.required = field.required if field is not None else True
+        self.convert = field.convert if field is not None else None
+        self.check = field.compile() if field is not None else None
+        self.default = field.default if field is not None else None
+
+
+class RequestModelMeta(type):
+    """
+    Turns `Field` declarations into slots and compiles the serialization plan of the model once per class.
+
+    The plan follows `signature`, keys of the signature which are not declared as fields (`merchantId`, `dttm`)
+    are taken from the context given to `dump`.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        fields = [(attribute, field) for attribute, field in namespace.items() if isinstance(field, Field)]
+        for attribute, _ in fields:
+            del namespace[attribute]
+        namespace['__slots__'] = tuple(attribute for attribute, _ in fields)
+        cls = super().__new__(mcs, name, bases, namespace)
+
+        fields_by_key = {field.key: (attribute, field) for attribute, field in fields}
+        signature = namespace.get('signature') or tuple(field.key for _, field in fields)
+        cls._steps = tuple(_Step(key, *fields_by_key.get(key, (None, None))) for key in signature)
+        return cls
+
+
+class RequestModel(metaclass=RequestModelMeta):
+    """
+    Base of declarative request models.
+
+    Subclasses declare `Field` class attributes and `signature` - order of the JSON keys in the signature
+    string of the request.
+    """
+    __slots__: Tuple[str, ...] = ()
+    signature: Tuple[str, ...] = ()
+    _steps: Tuple[_Step, ...]
+
+    def __init__(self, **kwargs) -> None:
+        for attribute in self.__slots__:
+            setattr(self, attribute, kwargs.pop(attribute, None))
+        if kwargs:
+            raise TypeError('Unexpected arguments: {}'.format(', '.join(sorted(kwargs))))
+
+    def dump(self, context: Optional[Dict] = None) -> Tuple[Dict, str]:
+        """
+        Validate and serialize the request in a single pass.
+
+        Args:
+            context: Values of the keys which are not fields of the model, e.g. `merchantId` and `dttm`, required
+                when the signature of the model has such keys
+
+        Returns:
+            tuple - JSON in the signature order and the signature str
+
+        Raises:
+            ValueError
+        """
+        out: Dict[str, Any] = {}
+        parts: List[str] = []
+        for step in self._steps:
+            if step.attribute is None:
+                if context is None or step.key not in context:
+                    raise ValueError('{} is missing in the context.'.format(step.key))
+                value = context[step.key]
+            else:
+                value = getattr(self, step.attribute)
+                if value is None:
+                    if step.default is not None:
+                        value = step.default(out)
+                    elif step.required:
+                        raise ValueError('{} is missing.'.format(step.key))
+                    else:
+                        continue
+                if step.convert is not None:
+                    value = step.convert(value)
+                if step.check is not None and not step.check(value):
+                    raise ValueError(step.error)
+            out[step.key] = value
+            parts.extend(_signature_parts(value))
+
+        return out, '|'.join(parts)
+
+
+def _cart(value: List) -> List[Dict]:
+    return [item.dump()[0] if isinstance(item, RequestModel) else item for item in value]
+
+
+def _default_cart(out: Dict) -> List[Dict]:
+    return [{
+        'name': 'Your purchase',
+        'quantity': 1,
+        'amount': out['totalAmount'],
+    }]
+
+
+class PaymentInitRequest(RequestModel):
+    signature = (
+        'merchantId', 'orderNo', 'dttm', 'payOperation', 'payMethod', 'totalAmount', 'currency', 'closePayment',
+        'returnUrl', 'returnMethod', 'cart', 'description', 'merchantData', 'customerId', 'language', 'ttlSec',
+        'logoVersion', 'colorSchemeVersion')
+
+    order_number = Field('orderNo', 'orderNo is too long.', max_length=10)
+    pay_operation = Field('payOperation', 'payOperation invalid value', choices=tuple(i.value for i in PayOperation),
+                          convert=enum_value)
+    pay_method = Field('payMethod', 'payMethod invalid value', choices=tuple(i.value for i in PayMethod),
+                       convert=enum_value)
+    total_amount = Field('totalAmount', 'totalAmount invalid value', types=(int,), convert=hundredths)
+    currency = Field('currency', 'currency invalid value', choices=tuple(i.value for i in Currency),
+                     convert=enum_value)
+    close_payment = Field('closePayment', 'closePayment invalid value', types=(bool,))
+    return_url = Field('returnUrl', 'returnUrl is too long', max_length=300)
+    return_method = Field('returnMethod', 'returnMethod invalid value', choices=tuple(i.value for i in HTTPMethod),
+                          convert=enum_value)
+    cart = Field('cart', 'cart invalid value', types=(list,), convert=_cart, default=_default_cart)
+    description = Field('description', 'description is too long', max_length=255)
+    merchant_data = Field('merchantData', 'merchantData is too long', required=False, max_length=255,
+                          convert=base64_text)
+    customer_id = Field('customerId', 'customerId is too long', required=False, max_length=50)
+    language = Field('language', 'language is invalid', choices=tuple(i.value for i in Language), convert=enum_value)
+    ttl_sec = Field('ttlSec', 'ttlSec not in range', required=False, types=(int,), min_value=300, max_value=1800)
+    logo_version = Field('logoVersion', 'logoVersion is not a number.', required=False, types=(int,))
+    color_scheme_version = Field('colorSchemeVersion', 'colorSchemeVersion is not a number.', required=False,
+                                 types=(int,))
+
+
+class PaymentCloseRequest(RequestModel):
+    signature = ('merchantId', 'payId', 'dttm', 'totalAmount')
+
+    pay_id = Field('payId', 'payId invalid value', types=(str,))
+    total_amount = Field('totalAmount', 'totalAmount invalid value', required=False, types=(int,), min_value=0,
+                         convert=hundredths)
+
+
+class PaymentRefundRequest(RequestModel):
+    signature = ('merchantId', 'payId', 'dttm', 'amount')
+
+    pay_id = Field('payId', 'payId invalid value', types=(str,))
+    amount = Field('amount', 'amount invalid value', required=False, types=(int,), min_value=0, convert=hundredths)
+
+
+class CustomerInfoRequest(RequestModel):
+    signature = ('merchantId', 'customerId', 'dttm')
+
+    customer_id = Field('customerId', 'customerId is too long', max_length=50)
+
+
+class OneClickInitRequest(RequestModel):
+    signature = (
+        'merchantId', 'origPayId', 'orderNo', 'dttm', 'clientIp', 'totalAmount', 'currency', 'description',
+        'merchantData')
+
+    orig_pay_id = Field('origPayId', 'origPayId invalid value', types=(str,))
+    order_number = Field('orderNo', 'orderNo is too long.', max_length=10)
+    client_ip = Field('clientIp', 'clientIp invalid value', required=False, types=(str,))
+    total_amount = Field('totalAmount', 'totalAmount invalid value', types=(int,), min_value=0, convert=hundredths)
+    currency = Field('currency', 'currency invalid value', choices=tuple(i.value for i in Currency),
+                     convert=enum_value)
+    description = Field('description', 'description is too long', max_length=255)
+    merchant_data = Field('merchantData', 'merchantData is too long', required=False, max_length=255,
+                          convert=base64_text)
+
+
+class OneClickStartRequest(RequestModel):
+    signature = ('merchantId', 'payId', 'dttm')
+
+    pay_id = Field('payId', 'payId invalid value', types=(str,))
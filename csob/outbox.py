@@ -0,0 +1,354 @@
+import json
+import sqlite3
+import time
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Type
+
+from csob.api_response import APIResponse
+from csob.enums import PaymentStatus
+from csob.instrumentation import Instrumentation
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS payment_states (
+    pay_id TEXT PRIMARY KEY,
+    payment_status INTEGER NOT NULL,
+    dttm TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    pay_id TEXT NOT NULL,
+    old_status INTEGER,
+    new_status INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    dispatched_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (dispatched_at, id);
+'''
+
+
+class PaymentEvent(NamedTuple):
+    """
+    Change of `PaymentStatus` observed in a response, `source` is the operation or `return` for the return URL.
+    """
+    pay_id: str
+    old_status: Optional[PaymentStatus]
+    new_status: PaymentStatus
+    source: str
+    observed_at: float
+
+    def as_dict(self) -> Dict:
+        return {
+            'type': type(self).__name__,
+            'payId': self.pay_id,
+            'oldStatus': int(self.old_status) if self.old_status is not None else None,
+            'newStatus': int(self.new_status),
+            'source': self.source,
+            'observedAt': self.observed_at,
+        }
+
+
+class PaymentInitiated(PaymentEvent):
+    __slots__ = ()
+
+
+class StatusChanged(PaymentEvent):
+    __slots__ = ()
+
+
+class Confirmed(PaymentEvent):
+    __slots__ = ()
+
+
+class Settled(PaymentEvent):
+    __slots__ = ()
+
+
+class Reversed(PaymentEvent):
+    __slots__ = ()
+
+
+class Canceled(PaymentEvent):
+    __slots__ = ()
+
+
+class Denied(PaymentEvent):
+    __slots__ = ()
+
+
+class Refunded(PaymentEvent):
+    __slots__ = ()
+
+
+EVENT_TYPES: Dict[str, Type[PaymentEvent]] = {event_type.__name__: event_type for event_type in (
+    PaymentInitiated, StatusChanged, Confirmed, Settled, Reversed, Canceled, Denied, Refunded)}
+
+# Events emitted next to `StatusChanged` when the payment gets into the status
+STATUS_EVENTS: Dict[PaymentStatus, Type[PaymentEvent]] = {
+    PaymentStatus.PAYMENT_CONFIRMED: Confirmed,
+    PaymentStatus.PAYMENT_SETTLED: Settled,
+    PaymentStatus.PAYMENT_REVERSED: Reversed,
+    PaymentStatus.PAYMENT_CANCELED: Canceled,
+    PaymentStatus.PAYMENT_DENIED: Denied,
+    PaymentStatus.PAYMENT_REFUND_PROCESSING: Refunded,
+    PaymentStatus.PAYMENT_RETURNED: Refunded,
+}
+
+
+def get_events(pay_id: str, old_status: Optional[PaymentStatus], new_status: PaymentStatus, source: str,
+               observed_at: float) -> List[PaymentEvent]:
+    """
+    Get events of the status change, none when the status did not change.
+    """
+    if old_status == new_status:
+        return []
+    args = (pay_id, old_status, new_status, source, observed_at)
+    if old_status is None and new_status == PaymentStatus.PAYMENT_INIT:
+        return [PaymentInitiated(*args)]
+    events: List[PaymentEvent] = [StatusChanged(*args)]
+    status_event = STATUS_EVENTS.get(new_status)
+    # Refund processing followed by returned is a single refund
+    if status_event is not None and status_event is not STATUS_EVENTS.get(old_status):  # type: ignore
+        events.append(status_event(*args))
+    return events
+
+
+class EventSink:
+    """
+    Receiver of dispatched events. An exception leaves the batch in the outbox and it is sent again.
+    """
+
+    def send(self, events: List[PaymentEvent]) -> None:
+        raise NotImplementedError
+
+
+class CallbackSink(EventSink):
+    """
+    Calls the callback in the dispatching thread with every event.
+    """
+
+    def __init__(self, callback: Callable[[PaymentEvent], None]) -> None:
+        self.callback = callback
+
+    def send(self, events: List[PaymentEvent]) -> None:
+        for event in events:
+            self.callback(event)
+
+
+class QueueSink(EventSink):
+    """
+    Puts the events into a queue consumed by another thread.
+    """
+
+    def __init__(self, queue: Optional[Queue] = None) -> None:
+        self.queue: Queue = queue if queue is not None else Queue()
+
+    def send(self, events: List[PaymentEvent]) -> None:
+        for event in events:
+            self.queue.put(event)
+
+
+class JSONLinesSink(EventSink):
+    """
+    Appends the events as JSON lines to the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def send(self, events: List[PaymentEvent]) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(event.as_dict()) + '\n' for event in events))
+
+
+class Outbox:
+    """
+    Transactional outbox of payment status changes stored in SQLite.
+
+    Resources pass every verified response holding payId and paymentStatus to `observe`, as does parsing
+    of the return URL. The last known status of the payment is updated and the events of the change are inserted
+    in the same transaction. Responses older (by the gateway `dttm`) than the last known status are ignored,
+    e.g. a replayed return URL or a status call which raced a close. An observation which fails (e.g. locked
+    database) is dropped and `outbox.observe_failed` is emitted, so it never fails the call which got
+    the response. `dispatch` sends pending events in batches to the sinks in the order they were stored
+    and marks them dispatched, with `start` a background thread dispatches them every `dispatch_interval` seconds.
+    Delivery is at least once, a batch is sent again to all sinks when any of them fails.
+    """
+    path: str
+    batch_size: int
+    dispatch_interval: float
+
+    def __init__(self, path: str = ':memory:', sinks: Iterable[EventSink] = (), batch_size: int = 100,
+                 dispatch_interval: float = 1.0, clock: Callable[[], float] = time.time,
+                 instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        Args:
+            path: Path of the SQLite database
+            sinks: Receivers of the events
+            batch_size: Maximal number of events sent to a sink at once
+            dispatch_interval: Seconds between dispatches of the background thread
+            clock: Time source of `observed_at`
+            instrumentation: Receives failed observations
+        """
+        self.path = path
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.dispatch_interval = dispatch_interval
+        self._clock = clock
+        self.failed_observations = 0
+        self.instrumentation: Optional[Instrumentation] = None
+        if instrumentation is not None:
+            self.set_instrumentation(instrumentation)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(SCHEMA)
+        self._lock = Lock()
+        self._dispatch_lock = Lock()
+        self._closed = Event()
+        self._thread: Optional[Thread] = None
+
+    def after_fork(self) -> None:
+        """
+        Open the database file again in the forked process and restart dispatching when it was started.
+
+        An in-memory database is a copy private to the process, its pending events are dispatched by every process.
+        """
+        if self.path != ':memory:':
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = Lock()
+        self._dispatch_lock = Lock()
+        self._closed = Event()
+        if self._thread is not None:
+            self.start()
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        if self.instrumentation is None:
+            self.instrumentation = instrumentation
+            instrumentation.register_collector('outbox', self.stats)
+
+    def stats(self) -> Dict[str, int]:
+        return {'failed_observations': self.failed_observations}
+
+    def observe(self, source: str, api_response: APIResponse) -> List[PaymentEvent]:
+        """
+        Store events of the status change seen in the response, unverified and stale responses are ignored.
+
+        Args:
+            source: Name of the operation, e.g. `status` or `return`
+            api_response: Response of the gateway or parsed return URL
+
+        Returns:
+            list of the stored events, empty when the observation failed
+        """
+        try:
+            return self._observe(source, api_response)
+        except Exception as e:
+            self.failed_observations += 1
+            if self.instrumentation is not None:
+                self.instrumentation.emit('outbox.observe_failed', source=source,
+                                          error='{}: {}'.format(type(e).__name__, e))
+            return []
+
+    def _observe(self, source: str, api_response: APIResponse) -> List[PaymentEvent]:
+        response_json = api_response.response_json
+        if not api_response.is_verified or not response_json or response_json.get('paymentStatus') is None:
+            return []
+        pay_id = str(response_json.get('payId', ''))
+        if not pay_id:
+            return []
+        new_status = PaymentStatus(int(response_json['paymentStatus']))
+        dttm = response_json.get('dttm') or None
+        observed_at = self._clock()
+
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT payment_status, dttm FROM payment_states WHERE pay_id = ?', (pay_id,)).fetchone()
+            if row is not None and dttm is not None and row[1] is not None and str(dttm) < row[1]:
+                return []
+            old_status = PaymentStatus(row[0]) if row is not None else None
+            events = get_events(pay_id, old_status, new_status, source, observed_at)
+            if not events:
+                return []
+            # Plain INSERT or UPDATE, upserts need SQLite 3.24
+            if row is None:
+                self._connection.execute(
+                    'INSERT INTO payment_states (pay_id, payment_status, dttm, updated_at) VALUES (?, ?, ?, ?)',
+                    (pay_id, int(new_status), dttm, observed_at))
+            else:
+                self._connection.execute(
+                    'UPDATE payment_states SET payment_status = ?, dttm = COALESCE(?, dttm), updated_at = ? '
+                    'WHERE pay_id = ?', (int(new_status), dttm, observed_at, pay_id))
+            self._connection.executemany(
+                'INSERT INTO outbox (type, pay_id, old_status, new_status, source, observed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(type(event).__name__, pay_id, int(old_status) if old_status is not None else None,
+                  int(new_status), source, observed_at) for event in events])
+        return events
+
+    @staticmethod
+    def _event(row: Tuple) -> PaymentEvent:
+        event_type, pay_id, old_status, new_status, source, observed_at = row
+        return EVENT_TYPES[event_type](pay_id, PaymentStatus(old_status) if old_status is not None else None,
+                                       PaymentStatus(new_status), source, observed_at)
+
+    def pending(self, limit: Optional[int] = None) -> List[PaymentEvent]:
+        """
+        Get events not dispatched yet, the oldest first.
+        """
+        return [self._event(row[1:]) for row in self._pending(limit if limit is not None else -1)]
+
+    def _pending(self, limit: int) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT id, type, pay_id, old_status, new_status, source, observed_at FROM outbox '
+                'WHERE dispatched_at IS NULL ORDER BY id LIMIT ?', (limit,)).fetchall()
+
+    def dispatch(self) -> int:
+        """
+        Send pending events to the sinks.
+
+        Returns:
+            int - number of dispatched events
+
+        Raises:
+            Exception raised by a sink, the batch stays pending
+        """
+        dispatched = 0
+        with self._dispatch_lock:
+            while True:
+                rows = self._pending(self.batch_size)
+                if not rows:
+                    return dispatched
+                events = [self._event(row[1:]) for row in rows]
+                for sink in self.sinks:
+                    sink.send(events)
+                with self._lock, self._connection:
+                    self._connection.executemany('UPDATE outbox SET dispatched_at = ? WHERE id = ?',
+                                                 [(self._clock(), row[0]) for row in rows])
+                dispatched += len(rows)
+
+    def start(self) -> 'Outbox':
+        """
+        Dispatch the events in a background thread, failed batches are retried in the next interval.
+        """
+        self._thread = Thread(target=self._dispatch_loop, name='csob-outbox', daemon=True)
+        self._thread.start()
+        return self
+
+    def _dispatch_loop(self) -> None:
+        while not self._closed.wait(self.dispatch_interval):
+            try:
+                self.dispatch()
+            except Exception:
+                continue
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,101 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+import requests
+
+from csob.api_response import APIResponse
+from csob.enums import OutcomeKind
+from csob.exceptions import GatewaySignatureInvalid, ServiceResponseException, ServiceResultCodeException
+
+
+class Outcome(NamedTuple):
+    """
+    Result of a call reduced to plain values, cheap to create and keep in bulk.
+
+    Kinds:
+        ok: Verified response with an OK result code (including 810 and 820 of `customer_info`)
+        gateway_error: Verified response with an error result code
+        http_error: The gateway responded with HTTP status other than 200
+        signature_invalid: The signature of the response did not verify
+        transport_error: No response, the request failed or was not sent (circuit breaker, rate limiter,
+            deadline)
+
+    No exception, traceback nor `requests.Response` is kept. `error` holds the result message of gateway errors
+    and the name of the exception otherwise.
+    """
+    kind: OutcomeKind
+    result_code: Optional[int] = None
+    http_status: Optional[int] = None
+    error: Optional[str] = None
+    response_json: Optional[Dict[str, Any]] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.kind is OutcomeKind.OK
+
+    @classmethod
+    def from_api_response(cls, api_response: APIResponse) -> 'Outcome':
+        http_status = api_response.http_status_code
+        if http_status is not None and http_status != 200:
+            return cls(OutcomeKind.HTTP_ERROR, http_status=http_status)
+        response_json = api_response.response_json
+        result_code = api_response.result_code
+        if api_response.is_verified is False:
+            return cls(OutcomeKind.SIGNATURE_INVALID, result_code, http_status)
+        if not api_response.is_okay:
+            return cls(OutcomeKind.GATEWAY_ERROR, result_code, http_status, api_response.result_message, response_json)
+        return cls(OutcomeKind.OK, result_code, http_status, None, response_json)
+
+    @classmethod
+    def from_exception(cls, exception: BaseException) -> 'Outcome':
+        """
+        Get outcome of an exception raised by a call of a client with `raise_exceptions`.
+        """
+        error = type(exception).__name__
+        if isinstance(exception, ServiceResultCodeException):
+            if exception.api_response is not None:
+                return cls.from_api_response(exception.api_response)
+            return cls(OutcomeKind.GATEWAY_ERROR, getattr(exception, 'code', None), 200, exception.message or error)
+        if isinstance(exception, GatewaySignatureInvalid):
+            return cls(OutcomeKind.SIGNATURE_INVALID, http_status=200, error=error)
+        if isinstance(exception, (ServiceResponseException, requests.HTTPError)):
+            response = exception.response
+            return cls(OutcomeKind.HTTP_ERROR, http_status=response.status_code if response is not None else None,
+                       error=error)
+        return cls(OutcomeKind.TRANSPORT_ERROR, error=error)
+
+
+class OutcomeCounter:
+    """
+    Counts of outcomes by kind, result code, HTTP status and error.
+    """
+
+    def __init__(self, outcomes: Iterable[Outcome] = ()) -> None:
+        self.kinds: Counter = Counter()
+        self.result_codes: Counter = Counter()
+        self.http_statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.update(outcomes)
+
+    def add(self, outcome: Outcome) -> None:
+        self.kinds[outcome.kind] += 1
+        if outcome.kind is OutcomeKind.OK:
+            return
+        if outcome.result_code is not None:
+            self.result_codes[outcome.result_code] += 1
+        if outcome.http_status is not None and outcome.http_status != 200:
+            self.http_statuses[outcome.http_status] += 1
+        if outcome.error is not None and outcome.kind is not OutcomeKind.GATEWAY_ERROR:
+            self.errors[outcome.error] += 1
+
+    def update(self, outcomes: Iterable[Outcome]) -> None:
+        for outcome in outcomes:
+            self.add(outcome)
+
+    def as_dict(self) -> Dict[str, Dict]:
+        return {
+            'kinds': {kind.value: count for kind, count in self.kinds.items()},
+            'result_codes': {int(code): count for code, count in self.result_codes.items()},
+            'http_statuses': dict(self.http_statuses),
+            'errors': dict(self.errors),
+        }
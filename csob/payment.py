@@ -1,8 +1,10 @@
 from decimal import Decimal
 from typing import Optional, Union
 
+from csob.models import Field, RequestModel, hundredths
 
-class Item:
+
+class Item(RequestModel):
     """
     Item in a cart to be shown in Gateway.
 
@@ -14,10 +16,10 @@ class Item:
         (e.g. “Your purchase” and “Shipping & Handling”). The limitation is given by the graphical design.
 
     """
-    name: str
-    quantity: int = 1
-    amount: Union[Decimal, int]
-    description: Optional[str] = None
+    name = Field('name', 'name is too long', max_length=20)
+    quantity = Field('quantity', 'quantity invalid value', types=(int,), min_value=1)
+    amount = Field('amount', 'amount invalid value', types=(int,), min_value=0, convert=hundredths)
+    description = Field('description', 'description is too long', required=False, max_length=40)
 
     def __init__(self, name: str, amount: Union[Decimal, int], quantity: int = 1,
                  description: Optional[str] = None) -> None:
@@ -27,24 +29,17 @@ class Item:
             name: Item’s name, maximum length 20 characters
             amount: Total price for the quantity of the items in hundredths of the currency.
                     The item currency of all the requests will be automatically used as the price.
+                    (Decimals are automatically converted.)
             quantity: Quantity, must be >=1, integer only
             description: Cart item’s description, maximum length 40 characters
+
+        Raises:
+            ValueError
         """
-        self.name = name
-        self.amount = amount
-        self.quantity = quantity
-        if description is not None:
-            self.description = description
+        super().__init__(name=name, amount=amount, quantity=quantity, description=description)
+        # Validated now, so that `dict` does not raise
+        self.dump()
 
     @property
     def dict(self):
-        out_dict = {
-            'name': self.name,
-            'amount': self.amount,
-            'quantity': self.quantity
-        }
-
-        if self.description is not None:
-            out_dict['description'] = self.description
-
-        return out_dict
+        return self.dump()[0]
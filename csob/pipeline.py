@@ -0,0 +1,195 @@
+import os
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from csob.api_response import APIResponse
+from csob.deadline import Deadline
+from csob.outcome import Outcome
+from csob.resources import SignedCall
+
+if TYPE_CHECKING:
+    from csob.api import APIClient
+
+# APIClient methods which may be pipelined
+PIPELINE_OPERATIONS = frozenset((
+    'payment_init', 'payment_status', 'payment_reverse', 'payment_close', 'payment_refund', 'echo', 'customer_info',
+    'get_payment_process_url', 'oneclick_init', 'oneclick_start',
+))
+
+_DONE = object()
+
+
+class Operation(NamedTuple):
+    """
+    Call of an `APIClient` method, e.g. `Operation('payment_status', ('123',))`.
+    """
+    name: str
+    args: Tuple = ()
+    kwargs: Dict[str, Any] = {}
+
+
+class PipelineResult(NamedTuple):
+    position: int
+    operation: Operation
+    response: Optional[APIResponse]
+    error: Optional[Exception]
+    outcome: Optional[Outcome] = None
+
+
+class Pipeline:
+    """
+    Two stage executor of operations overlapping signing (CPU) with sending (network).
+
+    Signing threads call the operations on a deferred copy of the client and pass the signed calls to sending
+    threads. The stages are joined by bounded queues, so signing never gets more than `queue_size` calls ahead
+    of sending and unconsumed results stop both stages.
+
+    With `outcomes` the requests are sent without raising exceptions and every sent operation gets
+    `PipelineResult.outcome` instead of `response` and `error`, only operations which could not be signed
+    keep their `error`.
+    """
+
+    def __init__(self, client: 'APIClient', sign_workers: Optional[int] = None, send_workers: int = 8,
+                 queue_size: int = 64, deadline: Optional[Deadline] = None, outcomes: bool = False) -> None:
+        """
+        Args:
+            client: Client calling the operations
+            sign_workers: Number of signing threads, defaults to the number of CPUs
+            send_workers: Number of sending threads
+            queue_size: Size of the queues between the stages
+            deadline: Deadline of the operations which do not have their own one
+            outcomes: Return `Outcome` of the sent operations
+        """
+        self.client = client
+        self.sign_workers = sign_workers or os.cpu_count() or 1
+        self.send_workers = send_workers
+        self.queue_size = queue_size
+        self.deadline = deadline
+        self.outcomes = outcomes
+
+        options: Dict[str, Any] = {'defer': True}
+        if outcomes:
+            options['raise_exceptions'] = False
+        self._deferred_client = client.replace(**options)
+
+    def _put(self, queue: Queue, item: Any, stop: Event) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _get(self, queue: Queue, stop: Event) -> Any:
+        while not stop.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+        return _DONE
+
+    def _feed(self, operations: Iterable, pending: Queue, stop: Event) -> None:
+        try:
+            for index, operation in enumerate(operations):
+                if not self._put(pending, (index, Operation(*operation)), stop):
+                    return
+        finally:
+            for _ in range(self.sign_workers):
+                self._put(pending, _DONE, stop)
+
+    def sign(self, operation: Operation) -> SignedCall:
+        """
+        Sign the operation without sending it.
+        """
+        if operation.name not in PIPELINE_OPERATIONS:
+            raise ValueError('Operation `{}` cannot be pipelined.'.format(operation.name))
+        if operation.kwargs.get('presign_process_url'):
+            raise ValueError('`presign_process_url` cannot be pipelined.')
+        kwargs = operation.kwargs
+        if self.deadline is not None and 'deadline' not in kwargs:
+            kwargs = dict(kwargs, deadline=self.deadline)
+        return getattr(self._deferred_client, operation.name)(*operation.args, **kwargs)
+
+    def _sign_stage(self, pending: Queue, signed: Queue, stop: Event, remaining: List[int], lock: Lock) -> None:
+        while True:
+            item = self._get(pending, stop)
+            if item is _DONE:
+                break
+            index, operation = item
+            signed_item: Tuple[int, Operation, Optional[SignedCall], Optional[Exception]]
+            try:
+                signed_item = (index, operation, self.sign(operation), None)
+            except Exception as e:
+                signed_item = (index, operation, None, e)
+            if not self._put(signed, signed_item, stop):
+                return
+
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(self.send_workers):
+                self._put(signed, _DONE, stop)
+
+    def _send_stage(self, signed: Queue, results: Queue, stop: Event, remaining: List[int], lock: Lock) -> None:
+        while True:
+            item = self._get(signed, stop)
+            if item is _DONE:
+                break
+            index, operation, call, error = item
+            response = outcome = None
+            if error is None:
+                try:
+                    response = call.send()
+                except Exception as e:
+                    error = e
+                if self.outcomes:
+                    outcome = Outcome.from_exception(error) if error is not None else Outcome.from_api_response(
+                        response)  # type: ignore
+                    response = error = None
+            if not self._put(results, PipelineResult(index, operation, response, error, outcome), stop):
+                return
+
+        with lock:
+            remaining[1] -= 1
+            last = remaining[1] == 0
+        if last:
+            self._put(results, _DONE, stop)
+
+    def run(self, operations: Iterable) -> Iterator[PipelineResult]:
+        """
+        Run the operations.
+
+        Args:
+            operations: `Operation` instances or tuples of name, args and kwargs, consumed lazily
+
+        Returns:
+            Iterator of results in the order of completion, `PipelineResult.position` is the index of the operation
+        """
+        pending: Queue = Queue(self.queue_size)
+        signed: Queue = Queue(self.queue_size)
+        results: Queue = Queue(self.queue_size)
+        stop = Event()
+        remaining = [self.sign_workers, self.send_workers]
+        lock = Lock()
+
+        threads = [Thread(target=self._feed, args=(operations, pending, stop), daemon=True)]
+        threads.extend(Thread(target=self._sign_stage, args=(pending, signed, stop, remaining, lock), daemon=True)
+                       for _ in range(self.sign_workers))
+        threads.extend(Thread(target=self._send_stage, args=(signed, results, stop, remaining, lock), daemon=True)
+                       for _ in range(self.send_workers))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                result = results.get()
+                if result is _DONE:
+                    break
+                yield result
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,282 @@
+import hashlib
+import json
+import mmap
+import os
+import socket
+import struct
+import tempfile
+import time
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Lock, Thread, local
+from typing import Callable, Dict, Optional, Tuple
+
+from csob.exceptions import RateLimitExceededException
+
+BUCKET_STRUCT = struct.Struct('dd')
+
+
+def take_tokens(state: Optional[Tuple[float, float]], now: float, rate: float, capacity: float, tokens: float,
+                max_wait: Optional[float]) -> Tuple[Optional[Tuple[float, float]], Optional[float]]:
+    """
+    Reserve tokens from a token bucket.
+
+    The bucket may go below zero, the caller then has to wait until it is refilled. Nothing is reserved when
+    the wait would be longer than `max_wait`.
+
+    Args:
+        state: Tokens in the bucket and time of the last update, None for a new (full) bucket
+        now: Current time in seconds
+        rate: Tokens added per second
+        capacity: Maximal number of tokens in the bucket
+        tokens: Number of tokens to take
+        max_wait: Maximal acceptable wait in seconds
+
+    Returns:
+        tuple - new state of the bucket (None when unchanged) and seconds to wait (None when over `max_wait`)
+    """
+    available, updated_at = state if state is not None else (capacity, now)
+    available = min(capacity, available + max(0.0, now - updated_at) * rate) - tokens
+    wait = max(0.0, -available / rate)
+    if max_wait is not None and wait > max_wait:
+        return None, None
+    return (available, now), wait
+
+
+class RateLimitBackend:
+    """
+    Storage of token buckets shared by the rate limiters.
+    """
+
+    def acquire(self, key: str, rate: float, capacity: float, tokens: float = 1.0,
+                max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Reserve tokens in the bucket.
+
+        Args:
+            key: Bucket key
+            rate: Tokens added per second
+            capacity: Maximal number of tokens in the bucket
+            tokens: Number of tokens to take
+            max_wait: Maximal acceptable wait in seconds
+
+        Returns:
+            float - seconds to wait before sending or None when the wait would be longer than `max_wait`
+        """
+        raise NotImplementedError()
+
+
+class LocalBackend(RateLimitBackend):
+    """
+    Buckets held in memory of the current process.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._clock = clock
+        self._lock = Lock()
+
+    def acquire(self, key, rate, capacity, tokens=1.0, max_wait=None):
+        with self._lock:
+            state, wait = take_tokens(self._buckets.get(key), self._clock(), rate, capacity, tokens, max_wait)
+            if state is not None:
+                self._buckets[key] = state
+        return wait
+
+
+class SharedMemoryBackend(RateLimitBackend):
+    """
+    Buckets shared by all processes on one host.
+
+    Every bucket is a memory mapped file in `directory` (`/dev/shm` when available) guarded by a file lock.
+    Available on POSIX systems only.
+    """
+    directory: str
+
+    def __init__(self, directory: Optional[str] = None, clock: Callable[[], float] = time.time) -> None:
+        """
+        Args:
+            directory: Directory of the bucket files, processes sharing the limit have to use the same one
+            clock: Wall clock time source, it has to be shared by the processes
+        """
+        if directory is None:
+            directory = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                                     'csob-rate-limit')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._clock = clock
+        self._maps: Dict[str, Tuple[int, mmap.mmap]] = {}
+        self._lock = Lock()
+
+    def _get_map(self, key: str) -> Tuple[int, mmap.mmap]:
+        if key not in self._maps:
+            path = os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < BUCKET_STRUCT.size:
+                os.ftruncate(fd, BUCKET_STRUCT.size)
+            self._maps[key] = (fd, mmap.mmap(fd, BUCKET_STRUCT.size))
+        return self._maps[key]
+
+    def acquire(self, key, rate, capacity, tokens=1.0, max_wait=None):
+        import fcntl
+
+        # File locks are held by the process, the thread lock serializes threads of the process.
+        with self._lock:
+            fd, memory = self._get_map(key)
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                available, updated_at = BUCKET_STRUCT.unpack_from(memory)
+                state, wait = take_tokens(
+                    (available, updated_at) if updated_at else None, self._clock(), rate, capacity, tokens, max_wait)
+                if state is not None:
+                    BUCKET_STRUCT.pack_into(memory, 0, *state)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+        return wait
+
+
+class SocketBackend(RateLimitBackend):
+    """
+    Buckets held by a `RateLimitServer` shared by processes on several nodes.
+
+    Requests are sent as JSON lines over a persistent TCP connection per thread. A forked process opens its own
+    connection instead of sharing the one of its parent. Implement `RateLimitBackend` to use another store
+    (e.g. Redis) in production.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 1.0) -> None:
+        self.address = (host, port)
+        self.timeout = timeout
+        self._local = local()
+
+    def _get_file(self):
+        if getattr(self._local, 'file', None) is not None and self._local.pid != os.getpid():
+            self._close()
+        if getattr(self._local, 'file', None) is None:
+            connection = socket.create_connection(self.address, timeout=self.timeout)
+            self._local.connection, self._local.file, self._local.pid = (
+                connection, connection.makefile('rwb'), os.getpid())
+        return self._local.file
+
+    def _close(self) -> None:
+        file, connection = self._local.file, self._local.connection
+        self._local.file = self._local.connection = None
+        for closeable in (file, connection):
+            try:
+                closeable.close()
+            except OSError:
+                pass
+
+    def acquire(self, key, rate, capacity, tokens=1.0, max_wait=None):
+        request = json.dumps({'key': key, 'rate': rate, 'capacity': capacity, 'tokens': tokens,
+                              'max_wait': max_wait}).encode('utf-8') + b'\n'
+        try:
+            f = self._get_file()
+            f.write(request)
+            f.flush()
+            response = f.readline()
+            if not response:
+                raise ConnectionError('Rate limit server closed the connection.')
+        except OSError:
+            if getattr(self._local, 'file', None) is not None:
+                self._close()
+            raise
+        return json.loads(response.decode('utf-8'))['wait']
+
+
+class _RateLimitHandler(StreamRequestHandler):
+    server: '_RateLimitTCPServer'
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            request = json.loads(line.decode('utf-8'))
+            wait = self.server.backend.acquire(
+                request['key'], request['rate'], request['capacity'], request['tokens'], request['max_wait'])
+            self.wfile.write(json.dumps({'wait': wait}).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _RateLimitTCPServer(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    backend: RateLimitBackend
+
+
+class RateLimitServer:
+    """
+    Local stand-in of a networked bucket store serving `SocketBackend` clients.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, backend: Optional[RateLimitBackend] = None) -> None:
+        self._server = _RateLimitTCPServer((host, port), _RateLimitHandler)
+        self._server.backend = backend if backend is not None else LocalBackend()
+        self.address: Tuple = self._server.server_address[:2]
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> 'RateLimitServer':
+        self._thread = Thread(target=self._server.serve_forever, name='csob-rate-limit-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'RateLimitServer':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter consulted by the resources before sending a request.
+
+    The bucket is kept per merchant in the backend, so all processes sharing the backend share the limit.
+    """
+    rate: float
+    capacity: float
+    max_wait: Optional[float]
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, backend: Optional[RateLimitBackend] = None,
+                 key_prefix: str = 'csob:', max_wait: Optional[float] = None,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        """
+        Args:
+            rate: Requests per second allowed in total
+            capacity: Size of bursts, defaults to `rate`
+            backend: Storage of the buckets, defaults to `LocalBackend`
+            key_prefix: Prefix of the bucket keys
+            max_wait: Maximal seconds to wait, `RateLimitExceededException` is raised instead of waiting longer
+            sleep: Sleep function
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.backend = backend if backend is not None else LocalBackend()
+        self.key_prefix = key_prefix
+        self.max_wait = max_wait
+        self._sleep = sleep
+
+    def acquire(self, merchant_id: str, max_wait: Optional[float] = None) -> float:
+        """
+        Wait until a request of the merchant may be sent.
+
+        Args:
+            merchant_id: Merchant’s ID
+            max_wait: Maximal seconds to wait, overrides `max_wait` of the limiter
+
+        Returns:
+            float - seconds waited
+
+        Raises:
+            RateLimitExceededException
+        """
+        max_wait = max_wait if max_wait is not None else self.max_wait
+        wait = self.backend.acquire(self.key_prefix + merchant_id, self.rate, self.capacity, 1.0, max_wait)
+        if wait is None:
+            raise RateLimitExceededException(merchant_id)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
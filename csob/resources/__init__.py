@@ -1,18 +1,55 @@
+import cProfile
+import time
 from itertools import chain
-from typing import Iterable, Tuple, Dict, Optional, List, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urljoin
 
 import requests
 
 from csob.api_response import APIResponse
+from csob.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry
+from csob.deadline import Deadline
+from csob.customer_cache import CustomerInfoCache
 from csob.crypto import get_signature, get_url_signature, verify_signature
-from csob.exceptions import HTTP_ERROR_CSOB_EXCEPTIONS, GatewaySignatureInvalid
+from csob.enums import ResultCode
+from csob.exceptions import (
+    HTTP_ERROR_CSOB_EXCEPTIONS, DeadlineExceededException, GatewaySignatureInvalid, InternalErrorResultCodeException,
+    RateLimitExceededException, ServiceUnavailableResponseException)
+from csob.hedging import HedgingPolicy
+from csob.instrumentation import Instrumentation
+from csob.ledger import Ledger
+from csob.models import RequestModel
+from csob.outbox import Outbox
+from csob.rate_limit import RateLimiter
+from csob.routing import EndpointSet
+from csob.slow_calls import CallTrace, SlowCallRecorder, profile, time_connections
 from csob.utils import get_dttm
 
+# CPU time of the current thread (process time on Python < 3.7)
+_cpu_time = getattr(time, 'thread_time', time.process_time)
+
+
+class SignedCall:
+    """
+    Signed request of a deferred resource, `send` transmits it and parses the response.
+    """
+    __slots__ = ('resource', 'method', 'url', 'json')
+
+    def __init__(self, resource: 'CSOBResource', method: str, url: str, json: Optional[Dict] = None) -> None:
+        self.resource = resource
+        self.method = method
+        self.url = url
+        self.json = json
+
+    def send(self) -> APIResponse:
+        return self.resource._traced(self.resource._transmit, self.method, self.url, self.json)
+
 
 class CSOBResource:
     url: str
     url_args: Optional[Tuple[str, ...]] = None
+    # GET requests of idempotent resources may be hedged
+    idempotent = False
 
     request_signature: Tuple[str, ...]
     optional_request_signature: Tuple[str, ...] = tuple()
@@ -25,16 +62,57 @@ class CSOBResource:
     merchant_id: str
     session: requests.Session
     raise_exception = True
+    circuit_breakers: Optional[CircuitBreakerRegistry] = None
+    instrumentation: Optional[Instrumentation] = None
+    rate_limiter: Optional[RateLimiter] = None
+    hedging: Optional[HedgingPolicy] = None
+    deadline: Optional[Deadline] = None
+    # Deferred resources only sign the request and return `SignedCall` instead of sending it
+    defer = False
+    ledger: Optional[Ledger] = None
+    # Name of the payment operation recorded in the ledger
+    ledger_operation: Optional[str] = None
+    customer_info_cache: Optional[CustomerInfoCache] = None
+    slow_calls: Optional[SlowCallRecorder] = None
+    _trace: Optional[CallTrace] = None
+    # Start and seconds of signing done before the trace of the call is started by `_traced`
+    _signed_at: Optional[float] = None
+    _sign_seconds = 0.0
+    # Profiler of the signing when the call is sampled by the slow call recorder
+    _profiler: Optional[cProfile.Profile] = None
+    endpoints: Optional[EndpointSet] = None
+    # payId of a GET request, used to route the request to the pinned endpoint
+    _pay_id: Optional[str] = None
+    # Endpoint which created a payment, its payId gets pinned to it
+    _endpoint: Optional[str] = None
+    outbox: Optional[Outbox] = None
 
     def __init__(self, base_url: str, merchant_id: str, gateway_key: str, private_key: str,
                  session: requests.Session = requests.Session(),
-                 raise_exception: bool = True) -> None:
+                 raise_exception: bool = True, circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+                 instrumentation: Optional[Instrumentation] = None, rate_limiter: Optional[RateLimiter] = None,
+                 hedging: Optional[HedgingPolicy] = None, deadline: Optional[Deadline] = None,
+                 defer: bool = False, ledger: Optional[Ledger] = None,
+                 customer_info_cache: Optional[CustomerInfoCache] = None,
+                 slow_calls: Optional[SlowCallRecorder] = None, endpoints: Optional[EndpointSet] = None,
+                 outbox: Optional[Outbox] = None) -> None:
         self._gateway_key = gateway_key
         self._private_key = private_key
         self.raise_exception = raise_exception
         self.merchant_id = merchant_id
         self._base_url = base_url
         self.session = session
+        self.circuit_breakers = circuit_breakers
+        self.instrumentation = instrumentation
+        self.rate_limiter = rate_limiter
+        self.hedging = hedging
+        self.deadline = deadline
+        self.defer = defer
+        self.ledger = ledger
+        self.customer_info_cache = customer_info_cache
+        self.slow_calls = slow_calls
+        self.endpoints = endpoints
+        self.outbox = outbox
 
     def get_base_json(self) -> dict:
         return {
@@ -82,8 +160,7 @@ class CSOBResource:
             List - of string representations
         """
         if isinstance(item, list):  # Cart list of dicts
-            for j in item:
-                return [str(k) for k in j.values()]
+            return [str(k) for j in item for k in j.values()]
         elif item is True:
             return ['true']
         elif item is False:
@@ -151,7 +228,7 @@ class CSOBResource:
         Returns:
             Signature
         """
-        return get_signature(self._private_key, self._construct_signature_str(local_json))
+        return self._crypto('crypto.sign', get_signature, self._private_key, self._construct_signature_str(local_json))
 
     def get_url_signature(self, local_json: Dict) -> str:
         """
@@ -163,7 +240,8 @@ class CSOBResource:
         Returns:
             Signature
         """
-        return get_url_signature(self._private_key, self._construct_signature_str(local_json))
+        return self._crypto(
+            'crypto.sign', get_url_signature, self._private_key, self._construct_signature_str(local_json))
 
     def verify_signature(self, local_json: Dict) -> bool:
         """
@@ -176,11 +254,39 @@ class CSOBResource:
         Returns:
             bool
         """
-        return verify_signature(
-            self._gateway_key,
-            self._construct_verify_signature_str(local_json), local_json['signature']
+        return self._crypto(
+            'crypto.verify', verify_signature,
+            self._gateway_key, self._construct_verify_signature_str(local_json), local_json['signature']
         )
 
+    def _crypto(self, event: str, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Call the crypto function, with instrumentation its CPU time is emitted as `cpu_seconds` of the event.
+        The wall time is added to the `sign` or `verify` phase of the traced call, signing of the call sampled
+        by the slow call recorder is profiled.
+        """
+        trace = self._trace
+        if self.instrumentation is None and self.slow_calls is None:
+            return function(*args)
+        started, cpu_started = time.perf_counter(), _cpu_time()
+        try:
+            if trace is None and self.slow_calls is not None and event == 'crypto.sign':
+                if self._signed_at is None:
+                    self._profiler = self.slow_calls.sample_profiler()
+                if self._profiler is not None:
+                    return profile(self._profiler, function, *args)
+            return function(*args)
+        finally:
+            seconds = time.perf_counter() - started
+            if trace is not None:
+                trace.add(event[len('crypto.'):], seconds)
+            elif self.slow_calls is not None and event == 'crypto.sign':
+                if self._signed_at is None:
+                    self._signed_at = started
+                self._sign_seconds += seconds
+            if self.instrumentation is not None:
+                self.instrumentation.emit(event, cpu_seconds=_cpu_time() - cpu_started)
+
     def parse_response(self, response: requests.Response) -> APIResponse:
         """
         Converts `requests.Response` into `APIResponse`
@@ -227,14 +333,235 @@ class CSOBResource:
         local_json['signature'] = self.get_signature(local_json)
         return local_json
 
+    def _dump_and_sign(self, request: RequestModel) -> Dict:
+        """
+        Validate and serialize the request model and sign it with the signature str built in the same pass.
+
+        Args:
+            request: The request model, its signature has to match `request_signature`
+
+        Returns:
+            dict - signed json
+        """
+        local_json, signature_str = request.dump(self.get_base_json())
+        local_json['signature'] = self._crypto('crypto.sign', get_signature, self._private_key, signature_str)
+        return local_json
+
+    def _get_circuit_breaker(self) -> Optional[CircuitBreaker]:
+        if self.circuit_breakers is None:
+            return None
+        return self.circuit_breakers.get(self.merchant_id, self.url)
+
+    @staticmethod
+    def _is_gateway_failure(api_response: APIResponse) -> bool:
+        """
+        Check whether the response means that the gateway is failing (5xx or result code 900).
+        """
+        if api_response.http_status_code is not None and api_response.http_status_code >= 500:
+            return True
+        return api_response.result_code == ResultCode.INTERNAL_ERROR
+
+    def _wait_for_rate_limit(self, rate_limiter: RateLimiter) -> None:
+        max_wait = rate_limiter.max_wait
+        bounded_by_deadline = False
+        if self.deadline is not None:
+            remaining = self.deadline.check()
+            if max_wait is None or remaining < max_wait:
+                max_wait, bounded_by_deadline = remaining, True
+        try:
+            waited = rate_limiter.acquire(self.merchant_id, max_wait=max_wait)
+        except RateLimitExceededException:
+            if bounded_by_deadline:
+                raise DeadlineExceededException()
+            raise
+        if waited and self._trace is not None:
+            self._trace.add('rate_limit', waited)
+        if waited and self.instrumentation is not None:
+            self.instrumentation.emit('rate_limiter.waited', merchant_id=self.merchant_id, seconds=waited)
+
+    def _send(self, method: str, url: str, json: Optional[Dict] = None) -> APIResponse:
+        """
+        Send the signed request, deferred resources return `SignedCall` instead.
+        """
+        if self.defer:
+            return SignedCall(self, method, url, json)  # type: ignore
+        return self._traced(self._transmit, method, url, json)
+
+    def _traced(self, function: Callable[..., APIResponse], *args: Any) -> APIResponse:
+        """
+        Call the function sending the request, the call is passed to the slow call recorder when it is over.
+        The trace of the call starts with the signing of the request.
+        """
+        if self.slow_calls is None:
+            return function(*args)
+        trace = self._trace = self.slow_calls.start(self._signed_at, self._profiler)
+        if self._sign_seconds:
+            trace.add('sign', self._sign_seconds)
+        try:
+            return function(*args)
+        finally:
+            self.slow_calls.finish(self._trace, self.url, self.merchant_id)  # type: ignore
+
+    def _transmit(self, method: str, url: str, json: Optional[Dict] = None) -> APIResponse:
+        """
+        Send the request through the session and parse the response.
+
+        When a rate limiter is configured it is consulted first. When circuit breakers are configured the call
+        is guarded by the breaker of this resource. The remaining budget of the deadline bounds the rate limiter
+        wait and is used as the timeout of the request. With an endpoint set the request is routed by
+        `_route`. Results of payment operations are recorded in the ledger and their status changes in the outbox.
+
+        Args:
+            method: HTTP method
+            url: Whole URL of the request
+            json: Signed JSON body
+
+        Returns:
+            APIResponse
+
+        Raises:
+            DeadlineExceededException
+            RateLimitExceededException
+            CircuitOpenException
+        """
+        return self._observe(json, self._exchange(method, url, json))
+
+    def _exchange(self, method: str, url: str, json: Optional[Dict] = None) -> APIResponse:
+        """
+        Send the request through the rate limiter and the circuit breaker, hedged calls exchange twice.
+        """
+        if self.rate_limiter is not None:
+            self._wait_for_rate_limit(self.rate_limiter)
+
+        request_kwargs: Dict[str, Any] = {'json': json}
+        if self.deadline is not None:
+            request_kwargs['timeout'] = self.deadline.timeout()
+        return self._request(method, url, request_kwargs)
+
+    def _observe(self, json: Optional[Dict], api_response: APIResponse) -> APIResponse:
+        """
+        Pin the created payment and pass the result to the ledger and the outbox, once per call.
+        """
+        if self._endpoint is not None and api_response.is_okay and api_response.response_json is not None:
+            self.endpoints.pin(api_response.response_json['payId'], self._endpoint)  # type: ignore
+        if self.ledger is not None and self.ledger_operation is not None:
+            self.ledger.record(self.ledger_operation, json, api_response)
+        if self.outbox is not None and self.ledger_operation is not None:
+            self.outbox.observe(self.ledger_operation, api_response)
+        return api_response
+
+    def _session_request(self, method: str, url: str, request_kwargs: Dict[str, Any]) -> requests.Response:
+        """
+        Send the request through the session, the attempt is added to the traced call.
+        """
+        trace = self._trace
+        if trace is None:
+            return self.session.request(method, url, **request_kwargs)
+
+        attempt = trace.begin_attempt(method)
+        result: Dict[str, Any] = {}
+        with time_connections() as timings:
+            try:
+                response = self.session.request(method, url, **request_kwargs)
+                result['http_status'] = response.status_code
+                return response
+            except Exception as e:
+                result['error'] = type(e).__name__
+                raise
+            finally:
+                trace.end_attempt(attempt, timings, **result)
+
+    def _send_request(self, method: str, url: str, request_kwargs: Dict[str, Any]) -> requests.Response:
+        if self.endpoints is None or not url.startswith(self._base_url):
+            return self._session_request(method, url, request_kwargs)
+        return self._route(self.endpoints, method, url[len(self._base_url):], request_kwargs)
+
+    def _route(self, endpoints: EndpointSet, method: str, path: str,
+               request_kwargs: Dict[str, Any]) -> requests.Response:
+        """
+        Send the request to the best endpoint, requests of a pinned payment to its endpoint.
+
+        Idempotent requests fail over to the next endpoint on a transport error or HTTP 5xx, the last response or
+        error is returned. Other requests are sent to one endpoint only.
+        """
+        json = request_kwargs.get('json')
+        pay_id = json.get('payId') if json is not None else self._pay_id
+        candidates = endpoints.candidates(endpoints.get_pinned(pay_id) if pay_id is not None else None,
+                                          self.idempotent)
+        if not self.idempotent:
+            candidates = candidates[:1]
+
+        response: Optional[requests.Response] = None
+        error: Optional[Exception] = None
+        # The endpoint which answered last, `EndpointSet` always has at least one
+        used: Optional[str] = None
+        for position, endpoint in enumerate(candidates):
+            if position:
+                endpoints.failover(candidates[position - 1], endpoint)
+                if self.deadline is not None:
+                    request_kwargs = dict(request_kwargs, timeout=self.deadline.timeout())
+            started = time.monotonic()
+            used = endpoint
+            try:
+                response, error = self._session_request(method, endpoint + path, request_kwargs), None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                endpoints.record(endpoint, True, time.monotonic() - started)
+                response, error = None, e
+                continue
+            failed = response.status_code >= 500
+            endpoints.record(endpoint, failed, time.monotonic() - started)
+            if not failed:
+                break
+
+        if error is not None:
+            raise error
+        if used is None:
+            raise ValueError('No endpoint to send the request to.')
+        if pay_id is None and json is not None and 'payId' in self.response_signature:
+            self._endpoint = used
+        return response  # type: ignore
+
+    def _request(self, method: str, url: str, request_kwargs: Dict[str, Any]) -> APIResponse:
+        breaker = self._get_circuit_breaker()
+        if breaker is None:
+            return self.parse_response(self._send_request(method, url, request_kwargs))
+
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            api_response = self.parse_response(self._send_request(method, url, request_kwargs))
+        except (requests.ConnectionError, requests.Timeout, ServiceUnavailableResponseException,
+                InternalErrorResultCodeException):
+            breaker.record(True, time.monotonic() - started)
+            raise
+        except requests.HTTPError as e:
+            breaker.record(e.response is not None and e.response.status_code >= 500, time.monotonic() - started)
+            raise
+        except Exception:
+            breaker.record(False, time.monotonic() - started)
+            raise
+
+        breaker.record(self._is_gateway_failure(api_response), time.monotonic() - started)
+        return api_response
+
     def _sign_and_post(self, local_json: Dict) -> APIResponse:
-        return self.parse_response(self.session.post(self.get_url(), json=self._sign_json(local_json)))
+        return self._send('POST', self.get_url(), json=self._sign_json(local_json))
 
     def _get(self, url: str) -> APIResponse:
-        return self.parse_response(self.session.get(url))
+        return self._send('GET', url)
 
     def _construct_url_and_get(self, local_json: Dict) -> APIResponse:
-        return self._get(self.construct_url(local_json))
+        self._pay_id = local_json.get('payId')
+        url = self.construct_url(local_json)
+        if self.hedging is None or not self.idempotent or self.defer:
+            return self._get(url)
+        return self._traced(self._hedged, self.hedging, url, local_json)
+
+    def _hedged(self, hedging: HedgingPolicy, url: str, local_json: Dict) -> APIResponse:
+        api_response = hedging.call(
+            self.url, lambda: self._exchange('GET', url),
+            lambda: self._exchange('GET', self.construct_url(dict(local_json, dttm=get_dttm()))), self.deadline)
+        return self._observe(None, api_response)
 
     def _sign_and_put(self, local_json: Dict) -> APIResponse:
-        return self.parse_response(self.session.put(self.get_url(), json=self._sign_json(local_json)))
+        return self._send('PUT', self.get_url(), json=self._sign_json(local_json))
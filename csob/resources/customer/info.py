@@ -1,18 +1,21 @@
 from urllib.parse import urljoin
 
+from csob.models import CustomerInfoRequest
 from csob.resources.payment import CSOBResource
 
 
 class CustomerInfoResource(CSOBResource):
     url = 'customer/info/'
-    request_signature = ('merchantId', 'customerId', 'dttm')
+    idempotent = True
+    request_signature = CustomerInfoRequest.signature
     response_signature = ('customerId', 'dttm', 'resultCode', 'resultMessage')
 
     def get(self, customer_id: str):
-        local_json = self.get_base_json()
+        if self.customer_info_cache is None or self.defer:
+            return self._fetch(customer_id)
+        return self.customer_info_cache.get(customer_id, lambda: self._fetch(customer_id))
 
-        if len(customer_id) > 50:
-            raise ValueError('customerId is too long')
-        local_json['customerId'] = customer_id
+    def _fetch(self, customer_id: str):
+        local_json, _ = CustomerInfoRequest(customer_id=customer_id).dump(self.get_base_json())
 
         return self._construct_url_and_get(local_json)
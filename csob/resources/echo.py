@@ -6,6 +6,7 @@ from . import CSOBResource
 
 class EchoResource(CSOBResource):
     url = 'echo/'
+    idempotent = True
     request_signature = ('merchantId', 'dttm')
     response_signature = ('dttm', 'resultCode', 'resultMessage')
 
@@ -0,0 +1,4 @@
+from .init import OneClickInitResource
+from .start import OneClickStartResource
+
+__all__ = ('OneClickInitResource', 'OneClickStartResource')
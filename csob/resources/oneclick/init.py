@@ -0,0 +1,25 @@
+from csob.api_response import APIResponse
+from csob.models import OneClickInitRequest
+from csob.resources.payment import PaymentCSOBResource
+
+
+class OneClickInitResource(PaymentCSOBResource):
+    url = 'oneclick/init'
+    ledger_operation = 'oneclick_init'
+    request_signature = OneClickInitRequest.signature
+    optional_request_signature = ('clientIp', 'merchantData')
+
+    def post(self, request: OneClickInitRequest) -> APIResponse:
+        """
+        Validate, sign and send the request.
+
+        Args:
+            request: The oneclick/init request
+
+        Returns:
+            APIResponse
+
+        Raises:
+            ValueError - the request is not valid
+        """
+        return self._send('POST', self.get_url(), json=self._dump_and_sign(request))
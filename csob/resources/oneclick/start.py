@@ -0,0 +1,12 @@
+from csob.api_response import APIResponse
+from csob.models import OneClickStartRequest
+from csob.resources.payment import PaymentCSOBResource
+
+
+class OneClickStartResource(PaymentCSOBResource):
+    url = 'oneclick/start'
+    ledger_operation = 'oneclick_start'
+    request_signature = OneClickStartRequest.signature
+
+    def post(self, pay_id: str) -> APIResponse:
+        return self._send('POST', self.get_url(), json=self._dump_and_sign(OneClickStartRequest(pay_id=pay_id)))
@@ -1,18 +1,16 @@
-import json
-from typing import Optional
+from decimal import Decimal
+from typing import Optional, Union
 
+from csob.models import PaymentCloseRequest
 from csob.resources.payment import PaymentCSOBResource
 
 
 class PaymentCloseResource(PaymentCSOBResource):
     url = 'payment/close/'
-    request_signature = ('merchantId', 'payId', 'dttm', 'totalAmount')
+    ledger_operation = 'close'
+    request_signature = PaymentCloseRequest.signature
     optional_request_signature = ('totalAmount',)
 
-    def put(self, pay_id: str, total_amount: Optional[int] = None):
-        local_json = self.get_base_json_with_pay_id(pay_id)
-
-        if total_amount is not None:
-            local_json['totalAmount'] = total_amount
-
-        return self._sign_and_post(local_json)
+    def put(self, pay_id: str, total_amount: Optional[Union[Decimal, int]] = None):
+        return self._send('POST', self.get_url(), json=self._dump_and_sign(
+            PaymentCloseRequest(pay_id=pay_id, total_amount=total_amount)))
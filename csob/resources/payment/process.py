@@ -12,9 +12,24 @@ class PaymentProcessResource(PaymentCSOBResource):
     def get(self, pay_id: str):
         return self._construct_url_and_get(self.get_base_json_with_pay_id(pay_id))
 
+    def get_process_url(self, pay_id: str) -> str:
+        """
+        Construct signed URL of the payment gateway for the customer's browser without calling the API.
+
+        Args:
+            pay_id: Unique payment ID (assigned by the payment gateway in the init operation)
+
+        Returns:
+            URL
+        """
+        return self.construct_url(self.get_base_json_with_pay_id(pay_id))
+
     def parse_response_dict(self, response: dict):
         is_verified = self.verify_signature(response)
         if is_verified is False and self.raise_exception:
             raise GatewaySignatureInvalid()
 
-        return APIResponse(is_verified=is_verified, parsed_data=response)
+        api_response = APIResponse(is_verified=is_verified, parsed_data=response)
+        if self.outbox is not None:
+            self.outbox.observe('return', api_response)
+        return api_response
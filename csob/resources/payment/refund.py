@@ -1,18 +1,16 @@
-import json
-from typing import Optional
+from decimal import Decimal
+from typing import Optional, Union
 
+from csob.models import PaymentRefundRequest
 from csob.resources.payment import PaymentCSOBResource
 
 
 class PaymentRefundResource(PaymentCSOBResource):
     url = 'payment/refund/'
-    request_signature = ('merchantId', 'payId', 'dttm', 'amount')
+    ledger_operation = 'refund'
+    request_signature = PaymentRefundRequest.signature
     optional_request_signature = ('amount',)
 
-    def put(self, pay_id: str, amount: Optional[int] = None):
-        local_json = self.get_base_json_with_pay_id(pay_id)
-
-        if amount is not None:
-            local_json['amount'] = amount
-
-        return self._sign_and_put(local_json)
+    def put(self, pay_id: str, amount: Optional[Union[Decimal, int]] = None):
+        return self._send('PUT', self.get_url(), json=self._dump_and_sign(
+            PaymentRefundRequest(pay_id=pay_id, amount=amount)))
@@ -5,6 +5,7 @@ from csob.resources.payment import PaymentCSOBResource
 
 class PaymentReverseResource(PaymentCSOBResource):
     url = 'payment/reverse/'
+    ledger_operation = 'reverse'
     request_signature = ('merchantId', 'payId', 'dttm')
 
     def put(self, pay_id: str):
@@ -5,6 +5,8 @@ from csob.resources.payment import PaymentCSOBResource
 
 class PaymentStatusResource(PaymentCSOBResource):
     url = 'payment/status/'
+    ledger_operation = 'status'
+    idempotent = True
     request_signature = ('merchantId', 'payId', 'dttm')
 
     def get(self, pay_id: str):
@@ -0,0 +1,194 @@
+import random
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+from csob.instrumentation import Instrumentation
+
+
+class EndpointSnapshot(NamedTuple):
+    url: str
+    healthy: bool
+    latency: Optional[float]
+    error_rate: float
+    consecutive_failures: int
+    score: float
+
+
+class _Endpoint:
+    __slots__ = ('url', 'index', 'latency', 'error_rate', 'consecutive_failures', 'down_until', 'sampled_at')
+
+    def __init__(self, url: str, index: int) -> None:
+        self.url = url
+        self.index = index
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.sampled_at: Optional[float] = None
+
+
+class EndpointSet:
+    """
+    API URLs of the gateway ranked by health.
+
+    Every request records its latency and whether it failed (transport error or HTTP 5xx). The score of an endpoint
+    is its moving average latency increased by its moving average error rate, healthy endpoints are ranked by the
+    score, endpoints not called yet after them in the given order. An endpoint which failed `failure_threshold`
+    times in a row is down for `cooldown` seconds and ranked last, then it gets calls again. So that the ranking
+    follows latencies of all endpoints, `probe_rate` of idempotent calls without a pinned endpoint go first to
+    a healthy endpoint without a latency sample or with a sample older than `stale_after` seconds. Other calls
+    are never probed, e.g. `payment_init` is not sent to an endpoint which may be failing.
+
+    Idempotent calls (`payment_status`, `customer_info`, `echo`) fail over to the next endpoint, other calls are
+    sent to a single endpoint. Calls of a payment are pinned to the endpoint which returned its payId first.
+
+    Emits `routing.failover` when a call is sent to another endpoint, `routing.probe` and `routing.endpoint_down`.
+    """
+    alpha: float
+    error_penalty: float
+    failure_threshold: int
+    cooldown: float
+    probe_rate: float
+    stale_after: float
+
+    def __init__(self, urls: Sequence[str], alpha: float = 0.2, error_penalty: float = 10.0,
+                 failure_threshold: int = 3, cooldown: float = 30.0, max_pins: int = 10000,
+                 probe_rate: float = 0.05, stale_after: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 instrumentation: Optional[Instrumentation] = None,
+                 random: Callable[[], float] = random.random) -> None:
+        """
+        Args:
+            urls: API URLs in the order of preference, e.g. `https://api.platebnibrana.csob.cz/api/v1.7/`
+            alpha: Weight of the last request in the moving averages
+            error_penalty: Multiple of the latency added for the error rate
+            failure_threshold: Number of failures in a row after which the endpoint is down
+            cooldown: Seconds the endpoint is down
+            max_pins: Number of remembered payments pinned to an endpoint
+            probe_rate: Ratio of calls probing an endpoint without a recent latency sample
+            stale_after: Seconds after which the latency sample of an endpoint is stale
+            clock: Monotonic time source
+            instrumentation: Receives routing events
+            random: Source of random numbers sampling the probing calls
+        """
+        if not urls:
+            raise ValueError('At least one URL is required.')
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_pins = max_pins
+        self.probe_rate = probe_rate
+        self.stale_after = stale_after
+        self._random = random
+        urls = [url if url.endswith('/') else url + '/' for url in urls]
+        self._endpoints = OrderedDict((url, _Endpoint(url, index)) for index, url in enumerate(urls))
+        self._pins: 'OrderedDict[str, str]' = OrderedDict()
+        self._clock = clock
+        self._lock = Lock()
+        self.instrumentation: Optional[Instrumentation] = None
+        if instrumentation is not None:
+            self.set_instrumentation(instrumentation)
+
+    @property
+    def urls(self) -> List[str]:
+        return list(self._endpoints)
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        if self.instrumentation is None:
+            self.instrumentation = instrumentation
+            instrumentation.register_collector('endpoints', self.snapshot)
+
+    def _emit(self, event: str, **data) -> None:
+        if self.instrumentation is not None:
+            self.instrumentation.emit(event, **data)
+
+    def _score(self, endpoint: _Endpoint) -> float:
+        if endpoint.latency is None:
+            return float('inf')
+        return endpoint.latency * (1 + self.error_penalty * endpoint.error_rate)
+
+    def _is_healthy(self, endpoint: _Endpoint, now: float) -> bool:
+        return endpoint.down_until <= now
+
+    def snapshot(self) -> List[EndpointSnapshot]:
+        now = self._clock()
+        with self._lock:
+            return [
+                EndpointSnapshot(endpoint.url, self._is_healthy(endpoint, now), endpoint.latency, endpoint.error_rate,
+                                 endpoint.consecutive_failures, self._score(endpoint))
+                for endpoint in self._endpoints.values()
+            ]
+
+    def candidates(self, pinned: Optional[str] = None, idempotent: bool = False) -> List[str]:
+        """
+        Get the endpoints from the best, the pinned endpoint first. Without a pinned endpoint a probed endpoint
+        may go first for idempotent calls.
+        """
+        now = self._clock()
+        probe = None
+        with self._lock:
+            ranked = sorted(self._endpoints.values(), key=lambda endpoint: (
+                endpoint.url != pinned, not self._is_healthy(endpoint, now), self._score(endpoint), endpoint.index))
+            if idempotent and pinned is None and self.probe_rate and self._random() < self.probe_rate:
+                stale = [endpoint for endpoint in ranked[1:] if self._is_healthy(endpoint, now) and (
+                    endpoint.sampled_at is None or now - endpoint.sampled_at >= self.stale_after)]
+                if stale:
+                    probe = min(stale, key=lambda endpoint: (endpoint.sampled_at is not None,
+                                                             endpoint.sampled_at or 0.0))
+                    ranked.remove(probe)
+                    ranked.insert(0, probe)
+        if probe is not None:
+            self._emit('routing.probe', url=probe.url)
+        return [endpoint.url for endpoint in ranked]
+
+    def record(self, url: str, failed: bool, latency: float) -> None:
+        """
+        Record result of a request sent to the endpoint.
+
+        Args:
+            url: The endpoint
+            failed: Whether the request failed with transport error or HTTP 5xx
+            latency: Seconds of the request
+        """
+        went_down = False
+        with self._lock:
+            endpoint = self._endpoints.get(url)
+            if endpoint is None:
+                return
+            endpoint.error_rate += self.alpha * (failed - endpoint.error_rate)
+            if failed:
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.failure_threshold:
+                    went_down = endpoint.down_until <= self._clock()
+                    endpoint.down_until = self._clock() + self.cooldown
+            else:
+                endpoint.consecutive_failures = 0
+                endpoint.down_until = 0.0
+                endpoint.sampled_at = self._clock()
+                if endpoint.latency is None:
+                    endpoint.latency = latency
+                else:
+                    endpoint.latency += self.alpha * (latency - endpoint.latency)
+        if went_down:
+            self._emit('routing.endpoint_down', url=url)
+
+    def failover(self, from_url: str, to_url: str) -> None:
+        self._emit('routing.failover', from_url=from_url, to_url=to_url)
+
+    def pin(self, pay_id: str, url: str) -> None:
+        """
+        Pin the payment to the endpoint unless it is pinned already.
+        """
+        with self._lock:
+            if pay_id in self._pins:
+                return
+            self._pins[pay_id] = url
+            while len(self._pins) > self.max_pins:
+                self._pins.popitem(last=False)
+
+    def get_pinned(self, pay_id: str) -> Optional[str]:
+        with self._lock:
+            return self._pins.get(pay_id)
@@ -0,0 +1,253 @@
+import hashlib
+import os
+import sqlite3
+import time
+from bisect import bisect
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Sequence
+
+from csob.instrumentation import Instrumentation
+from csob.outcome import Outcome
+from csob.pipeline import Operation
+
+if TYPE_CHECKING:
+    from csob.api import APIClient
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hashing of keys to members, every member has `replicas` points on the ring.
+
+    When a member joins or leaves only the keys of its points move, other keys keep their owner.
+    """
+
+    def __init__(self, members: Iterable[str], replicas: int = 100) -> None:
+        self.members = tuple(sorted(set(members)))
+        self.replicas = replicas
+        points = sorted((_hash('{}#{}'.format(member, replica)), member)
+                        for member in self.members for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        Get member owning the key, None for an empty ring.
+        """
+        if not self._hashes:
+            return None
+        return self._owners[bisect(self._hashes, _hash(key)) % len(self._hashes)]
+
+
+class MembershipBackend:
+    """
+    Registry of live workers. Workers renew their membership by `heartbeat`, a membership not renewed
+    for `ttl` seconds expires. Implement it on top of a shared store (e.g. Redis or a database) in production.
+    """
+
+    def heartbeat(self, worker_id: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    def leave(self, worker_id: str) -> None:
+        raise NotImplementedError
+
+    def members(self) -> List[str]:
+        raise NotImplementedError
+
+
+class FileMembership(MembershipBackend):
+    """
+    Membership kept as files in a directory shared by the workers, the file holds expiry of the membership.
+    """
+
+    def __init__(self, directory: str, clock: Callable[[], float] = time.time) -> None:
+        self.directory = directory
+        self._clock = clock
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, worker_id: str) -> str:
+        return os.path.join(self.directory, '{}.member'.format(worker_id))
+
+    def heartbeat(self, worker_id: str, ttl: float) -> None:
+        temporary_path = '{}.{}.tmp'.format(self._path(worker_id), os.getpid())
+        with open(temporary_path, 'w') as f:
+            f.write(repr(self._clock() + ttl))
+        os.replace(temporary_path, self._path(worker_id))
+
+    def leave(self, worker_id: str) -> None:
+        try:
+            os.unlink(self._path(worker_id))
+        except FileNotFoundError:
+            pass
+
+    def members(self) -> List[str]:
+        now = self._clock()
+        members = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.member'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    expires_at = float(f.read())
+            except (OSError, ValueError):
+                continue
+            if expires_at > now:
+                members.append(name[:-len('.member')])
+        return sorted(members)
+
+
+class SQLiteMembership(MembershipBackend):
+    """
+    Membership kept in a SQLite database shared by the workers.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self._clock = clock
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS members (worker_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)')
+
+    def heartbeat(self, worker_id: str, ttl: float) -> None:
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO members (worker_id, expires_at) VALUES (?, ?)',
+                                     (worker_id, self._clock() + ttl))
+
+    def leave(self, worker_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM members WHERE worker_id = ?', (worker_id,))
+
+    def members(self) -> List[str]:
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT worker_id FROM members WHERE expires_at > ? ORDER BY worker_id', (self._clock(),)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class ShardedPoller:
+    """
+    Polls `payment_status` of the payIds owned by this worker.
+
+    Every round the worker renews its membership, builds a `HashRing` of the live members and polls the payIds
+    of `source` it owns through `APIClient.pipeline`, so each payId is polled by one worker and the throughput grows
+    with the number of workers. A worker joining or leaving takes over or hands over only its share of payIds
+    in the next round of every worker. Until all workers see the same members (at most `ttl` seconds after a worker
+    died) a payId may be polled twice or skipped for a round. The membership is renewed every `ttl / 3` seconds
+    during long rounds too.
+
+    Emits `sharding.poll_failed` when a round of the background thread fails.
+    """
+    worker_id: str
+    interval: float
+    ttl: float
+
+    def __init__(self, client: 'APIClient', worker_id: str, membership: MembershipBackend,
+                 source: Callable[[], Iterable[str]], on_result: Callable[[str, Outcome], None],
+                 interval: float = 60.0, ttl: Optional[float] = None, replicas: int = 100,
+                 send_workers: int = 8, instrumentation: Optional[Instrumentation] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            client: Client calling the gateway
+            worker_id: Unique ID of the worker
+            membership: Registry of live workers shared by all workers
+            source: Returns payIds of all open payments, called every round
+            on_result: Called with the payId and the outcome of its status call
+            interval: Seconds between two rounds
+            ttl: Seconds after which a worker which stopped renewing its membership is dropped, defaults to three
+                intervals
+            replicas: Points of every worker on the hash ring
+            send_workers: Number of threads sending the status calls
+            instrumentation: Receives failures of the rounds, defaults to the one of the client
+            clock: Monotonic time source timing the renewals of the membership
+        """
+        self.client = client
+        self.worker_id = worker_id
+        self.membership = membership
+        self.source = source
+        self.on_result = on_result
+        self.interval = interval
+        self.ttl = ttl if ttl is not None else 3 * interval
+        self.replicas = replicas
+        self.send_workers = send_workers
+        self.instrumentation = instrumentation if instrumentation is not None else client.instrumentation
+        self._clock = clock
+        self._heartbeat_at = 0.0
+        self._ring = HashRing((), replicas)
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+
+    def heartbeat(self) -> None:
+        self.membership.heartbeat(self.worker_id, self.ttl)
+        self._heartbeat_at = self._clock()
+
+    def get_ring(self) -> HashRing:
+        """
+        Renew the membership and get the ring of the live members, the ring is rebuilt only when they changed.
+        """
+        self.heartbeat()
+        members: Sequence[str] = self.membership.members()
+        if self.worker_id not in members:
+            members = list(members) + [self.worker_id]
+        if tuple(sorted(members)) != self._ring.members:
+            self._ring = HashRing(members, self.replicas)
+        return self._ring
+
+    def owned(self, ring: HashRing) -> Iterable[str]:
+        return (pay_id for pay_id in self.source() if ring.owner(pay_id) == self.worker_id)
+
+    def poll_once(self) -> int:
+        """
+        Run a single round.
+
+        Returns:
+            int - number of polled payIds
+        """
+        ring = self.get_ring()
+        polled = 0
+        operations = (Operation('payment_status', (pay_id,)) for pay_id in self.owned(ring))
+        for result in self.client.pipeline(operations, send_workers=self.send_workers, outcomes=True):
+            polled += 1
+            if self._clock() - self._heartbeat_at >= self.ttl / 3:
+                self.heartbeat()
+            outcome = result.outcome
+            if outcome is None:
+                # The call could not be signed
+                outcome = Outcome.from_exception(result.error)  # type: ignore
+            self.on_result(result.operation.args[0], outcome)
+        return polled
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                if self.instrumentation is not None:
+                    self.instrumentation.emit('sharding.poll_failed', worker_id=self.worker_id,
+                                              error='{}: {}'.format(type(e).__name__, e))
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> 'ShardedPoller':
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name='csob-poller-{}'.format(self.worker_id), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop polling and leave, other workers take over the payIds in their next round.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.membership.leave(self.worker_id)
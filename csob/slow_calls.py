@@ -0,0 +1,323 @@
+import cProfile
+import io
+import pstats
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock, local
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import requests
+import urllib3.connection
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from csob.instrumentation import Instrumentation
+
+_connection_timing = local()
+
+
+class SlowCall(NamedTuple):
+    """
+    Capture of a call which took at least the threshold of `SlowCallRecorder`.
+
+    `phases` holds seconds spent signing, waiting for the rate limiter, opening a new connection (`connect` is
+    DNS and TCP, `tls` the handshake), waiting for the response after the connection was ready (`wait`, sending
+    the request and the gateway processing), reading the response (`receive`) and verifying it, `other` is the
+    rest (e.g. time in the pipeline queues). `attempts` lists every request sent by the call with the same
+    timings, more than one when the call was hedged. Requests still in flight when the call finished have
+    `duration` None. The timings of requests come from the connections of `TimedHTTPAdapter` mounted by
+    `SlowCallRecorder.mount`, for other transports they are all counted as `wait` and `connection_reused` is None.
+    """
+    endpoint: str
+    merchant_id: str
+    started_at: float
+    duration: float
+    phases: Dict[str, float]
+    connection_reused: Optional[bool]
+    attempts: List[Dict[str, Any]]
+    profile: Optional[str]
+
+
+class CallTrace:
+    """
+    Timings of a single call collected by the resource.
+    """
+    __slots__ = ('started', 'started_at', 'phases', 'attempts', 'connection_reused', 'profiler', '_lock')
+
+    def __init__(self, profiler: Optional[cProfile.Profile] = None, started: Optional[float] = None) -> None:
+        """
+        Args:
+            profiler: Profiler of the signing of the call
+            started: `time.perf_counter` of the start of the call, e.g. of signing, defaults to now
+        """
+        now = time.perf_counter()
+        self.started = started if started is not None else now
+        self.started_at = time.time() - (now - self.started)
+        self.phases: Dict[str, float] = {}
+        self.attempts: List[Dict[str, Any]] = []
+        self.connection_reused: Optional[bool] = None
+        self.profiler = profiler
+        self._lock = Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def begin_attempt(self, method: str) -> Dict[str, Any]:
+        """
+        Add a request of the call, its `duration` is None until `end_attempt`.
+        """
+        attempt = {'method': method, 'started': time.perf_counter() - self.started, 'duration': None}
+        with self._lock:
+            self.attempts.append(attempt)
+        return attempt
+
+    def end_attempt(self, attempt: Dict[str, Any], timings: Dict[str, float], **result: Any) -> None:
+        """
+        Finish the request with timings of its urllib3 connection collected by `time_connections`.
+        """
+        now = time.perf_counter()
+        duration = now - self.started - attempt['started']
+        tls_connect = timings.get('tls_connect', 0.0)
+        connect = timings.get('connect', 0.0) + tls_connect
+        tcp = min(timings.get('tcp', connect), connect) if tls_connect else connect
+        first_byte = timings.get('first_byte')
+        wait = (first_byte if first_byte is not None else now) - self.started - attempt['started'] - connect
+        split = {'connect': tcp, 'tls': connect - tcp, 'wait': max(0.0, wait),
+                 'receive': now - first_byte if first_byte is not None else 0.0}
+        connection_reused = None
+        if timings:
+            connection_reused = 'connect' not in timings and 'tls_connect' not in timings
+        with self._lock:
+            attempt.update(result)
+            attempt.update(split, duration=duration, connection_reused=connection_reused)
+            for phase, seconds in split.items():
+                self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            if connection_reused is not None:
+                self.connection_reused = connection_reused
+
+
+def profile(profiler: cProfile.Profile, function: Callable[..., Any], *args: Any) -> Any:
+    """
+    Call the function under the profiler, without it when another profiler of the thread is running.
+    """
+    try:
+        profiler.enable()
+    except ValueError:
+        return function(*args)
+    try:
+        return function(*args)
+    finally:
+        profiler.disable()
+
+
+class _Timing:
+    """
+    Adds seconds of the block to the timings collected by `time_connections` in the current thread.
+    """
+    __slots__ = ('key', 'timings', 'started')
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+
+    def __enter__(self) -> None:
+        self.timings = getattr(_connection_timing, 'timings', None)
+        self.started = time.perf_counter()
+
+    def __exit__(self, *args: Any) -> None:
+        if self.timings is not None:
+            self.timings[self.key] = self.timings.get(self.key, 0.0) + time.perf_counter() - self.started
+
+
+class TimedHTTPConnection(urllib3.connection.HTTPConnection):
+    """
+    Connection adding seconds of opening it (`connect`, `tcp` of DNS and TCP) and `first_byte` of the response
+    to the timings of `time_connections`.
+    """
+
+    def connect(self) -> None:
+        with _Timing('connect'):
+            super().connect()
+
+    def _new_conn(self):  # type: ignore
+        with _Timing('tcp'):
+            return super()._new_conn()
+
+    def getresponse(self, *args: Any, **kwargs: Any) -> Any:  # type: ignore
+        try:
+            return super().getresponse(*args, **kwargs)
+        finally:
+            timings = getattr(_connection_timing, 'timings', None)
+            if timings is not None:
+                timings.setdefault('first_byte', time.perf_counter())
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, urllib3.connection.HTTPSConnection):
+    """
+    `TimedHTTPConnection` of HTTPS, opening it (DNS, TCP and TLS handshake) is added to `tls_connect`.
+    """
+
+    def connect(self) -> None:
+        with _Timing('tls_connect'):
+            urllib3.connection.HTTPSConnection.connect(self)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    Adapter whose connection pools time the connections of requests sent within `time_connections`.
+    """
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+@contextmanager
+def time_connections() -> Iterator[Dict[str, float]]:
+    """
+    Collect timings of the `TimedHTTPAdapter` connection used by the current thread: seconds of `connect` of a new
+    HTTP connection or `tls_connect` of a new HTTPS connection and `tcp` (DNS and TCP) within them, and `first_byte`,
+    the `time.perf_counter` of the response headers.
+    """
+    previous = getattr(_connection_timing, 'timings', None)
+    timings: Dict[str, float] = {}
+    _connection_timing.timings = timings
+    try:
+        yield timings
+    finally:
+        _connection_timing.timings = previous
+
+
+class SlowCallRecorder:
+    """
+    Ring buffer of captures of calls slower than `threshold` seconds.
+
+    Resources time the phases of every call with a few clock reads, the capture is built only for slow calls.
+    The signing of `profile_rate` of calls is run under `cProfile` and the statistics are kept when the call is slow.
+    `APIClient` mounts `TimedHTTPAdapter` for the gateway URLs on its session to time connecting and waiting
+    for the response.
+
+    Emits `slow_call.recorded` with the endpoint and duration of every capture.
+    """
+    threshold: float
+    maxsize: int
+    profile_rate: float
+
+    def __init__(self, threshold: float = 1.0, maxsize: int = 100, profile_rate: float = 0.0,
+                 instrumentation: Optional[Instrumentation] = None,
+                 random: Callable[[], float] = random.random) -> None:
+        """
+        Args:
+            threshold: Duration in seconds from which calls are captured
+            maxsize: Number of kept captures, the oldest are dropped
+            profile_rate: Ratio of calls whose signing is profiled
+            instrumentation: Receives slow call events
+            random: Source of random numbers sampling the profiled calls
+        """
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.profile_rate = profile_rate
+        self.recorded = 0
+        self._random = random
+        self._captures: Deque[SlowCall] = deque(maxlen=maxsize)
+        self._lock = Lock()
+        self.instrumentation: Optional[Instrumentation] = None
+        if instrumentation is not None:
+            self.set_instrumentation(instrumentation)
+
+    def set_instrumentation(self, instrumentation: Instrumentation) -> None:
+        if self.instrumentation is None:
+            self.instrumentation = instrumentation
+            instrumentation.register_collector('slow_calls', self.stats)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'recorded': self.recorded, 'size': len(self._captures)}
+
+    @staticmethod
+    def mount(session: requests.Session, urls: Iterable[str]) -> None:
+        """
+        Mount `TimedHTTPAdapter` for the URLs on the session, URLs served by a custom adapter are left to it.
+        """
+        for url in urls:
+            adapter = session.get_adapter(url)
+            if type(adapter) is HTTPAdapter:
+                session.mount(url, TimedHTTPAdapter(max_retries=adapter.max_retries))
+
+    def sample_profiler(self) -> Optional[cProfile.Profile]:
+        """
+        Get profiler of the signing of a call, None for calls which are not sampled by `profile_rate`.
+        """
+        if self.profile_rate and self._random() < self.profile_rate:
+            return cProfile.Profile()
+        return None
+
+    def start(self, started: Optional[float] = None, profiler: Optional[cProfile.Profile] = None) -> CallTrace:
+        """
+        Start trace of a call, `started` is `time.perf_counter` of its start and `profiler` the profiler
+        of its signing when it began before sending.
+        """
+        return CallTrace(profiler, started)
+
+    def finish(self, trace: CallTrace, endpoint: str, merchant_id: str) -> Optional[SlowCall]:
+        """
+        Capture the call when it took at least the threshold.
+
+        Returns:
+            SlowCall or None
+        """
+        duration = time.perf_counter() - trace.started
+        if duration < self.threshold:
+            return None
+
+        with trace._lock:
+            phases = dict(trace.phases)
+            attempts = [dict(attempt) for attempt in trace.attempts]
+        phases['other'] = max(0.0, duration - sum(phases.values()))
+        profile = None
+        if trace.profiler is not None:
+            stream = io.StringIO()
+            try:
+                pstats.Stats(trace.profiler, stream=stream).sort_stats('cumulative').print_stats(20)
+            except TypeError:
+                # Nothing was profiled
+                pass
+            else:
+                profile = stream.getvalue()
+        slow_call = SlowCall(endpoint, merchant_id, trace.started_at, duration, phases, trace.connection_reused,
+                             attempts, profile)
+
+        with self._lock:
+            self._captures.append(slow_call)
+            self.recorded += 1
+        if self.instrumentation is not None:
+            self.instrumentation.emit('slow_call.recorded', endpoint=endpoint, duration=duration)
+        return slow_call
+
+    def dump(self, clear: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get the captures from the oldest as dicts.
+
+        Args:
+            clear: Remove the returned captures
+        """
+        with self._lock:
+            captures = list(self._captures)
+            if clear:
+                self._captures.clear()
+        return [dict(capture._asdict()) for capture in captures]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._captures.clear()
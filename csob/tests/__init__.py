@@ -0,0 +1,10 @@
+class FakeClock:
+    """
+    Clock of the tests, returns `now` set by the test.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,40 @@
+import unittest
+from unittest import mock
+
+from csob.fake_gateway import FakeGateway
+from csob.resources.payment.process import PaymentProcessResource
+from csob.tests.resources import get_private_key, get_gateway_key
+
+
+class TestPaymentProcessResource(unittest.TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.instance = PaymentProcessResource(
+            private_key=get_private_key(),
+            base_url="https://iapi.iplatebnibrana.csob.cz/api/v1.7/",
+            merchant_id="TestId",
+            gateway_key=get_gateway_key(),
+            session=self.session,
+        )
+
+    @mock.patch('csob.resources.get_dttm', return_value='20190310082622')
+    def test_get_process_url(self, get_dttm):
+        url = self.instance.get_process_url('123')
+
+        self.assertTrue(url.startswith(
+            'https://iapi.iplatebnibrana.csob.cz/api/v1.7/payment/process/TestId/123/20190310082622/'))
+        self.assertEqual(url, self.instance.construct_url(
+            {'merchantId': 'TestId', 'payId': '123', 'dttm': '20190310082622'}))
+        self.session.request.assert_not_called()
+
+
+class TestPresignedProcessUrl(unittest.TestCase):
+    def test_payment_init_presign_process_url(self):
+        with FakeGateway() as gateway:
+            client = gateway.client()
+            api_response = client.payment_init('1', 100, False, 'https://localhost', 'Test', presign_process_url=True)
+            requests_count = gateway.requests_count
+
+        self.assertIn('/payment/process/A3746UdxZO/{}/'.format(api_response.response_json['payId']),
+                      api_response.process_url)
+        self.assertEqual(1, requests_count)
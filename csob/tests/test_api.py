@@ -0,0 +1,129 @@
+import gc
+import multiprocessing
+import unittest
+from unittest import mock
+
+import requests
+
+from csob.api import APIClient
+from csob.fake_gateway import FakeGateway
+from csob.health import HealthMonitor
+from csob.hedging import HedgingPolicy
+from csob.instrumentation import Instrumentation
+from csob.ledger import Ledger
+from csob.outbox import Outbox, QueueSink
+from csob.resources import SignedCall
+from csob.tests.resources import PRIVATE_KEY_PATH
+
+
+def _call_after_fork(client, queue):
+    client.after_fork()
+    api_response = client.payment_status(client.payment_init(
+        '1', 100, False, 'https://localhost', 'Test').response_json['payId'])
+    client.ledger.flush()
+    events = client.outbox.sinks[0].queue
+    queue.put((api_response.is_verified, len(client.ledger.find_payments()), events.get(timeout=5) is not None))
+
+
+class TestForkLifecycle(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+
+    def tearDown(self):
+        self.gateway.stop()
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+
+    def test_warm_up(self):
+        client = self.gateway.client()
+        with mock.patch('csob.api.import_key') as import_key:
+            client.warm_up()
+
+        self.assertIn('_private_key', client.__dict__)
+        self.assertIn('gateway_public_key', client.__dict__)
+        self.assertEqual(2, import_key.call_count)
+
+    def test_after_fork_new_session(self):
+        client = self.gateway.client().prepare_for_fork()
+        session = client.session
+
+        client.after_fork()
+
+        self.assertIsNot(session, client.session)
+        self.assertIs(client.session, client.resource_kwargs['session'])
+        self.assertEqual('application/json', client.session.headers['Content-Type'])
+        self.assertTrue(client.echo().is_okay)
+
+    def test_after_fork_given_session(self):
+        session = requests.Session()
+        session.headers['Authorization'] = 'Token'
+        client = self.gateway.client(session=session)
+        client.echo()
+
+        client.after_fork()
+
+        self.assertIs(session, client.session)
+        self.assertIs(session, client.resource_kwargs['session'])
+        self.assertTrue(client.echo().is_okay)
+
+    def test_after_fork_preconnect(self):
+        client = self.gateway.client().prepare_for_fork()
+        client.after_fork(preconnect=2)
+        self.assertEqual(2, self.gateway.connections_count)
+
+        for _ in range(3):
+            client.echo()
+        self.assertEqual(2, self.gateway.connections_count)
+
+    def test_after_fork_restarts_components(self):
+        ledger = Ledger()
+        outbox = Outbox(sinks=[QueueSink()], dispatch_interval=0.01).start()
+        hedging = HedgingPolicy(initial_delay=0.05)
+        client = self.gateway.client(ledger=ledger, outbox=outbox, hedging=hedging)
+        client.echo()
+        client.prepare_for_fork()
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        process = context.Process(target=_call_after_fork, args=(client, queue), daemon=True)
+        process.start()
+        self.assertEqual((True, 1, True), queue.get(timeout=10))
+        process.join()
+        hedging.close()
+        outbox.close()
+        ledger.close()
+
+    def test_prepare_for_fork_with_running_monitor(self):
+        client = self.gateway.client()
+        monitor = HealthMonitor(client, interval=60)
+        monitor.start()
+        try:
+            with self.assertRaisesRegex(RuntimeError, 'csob-health-monitor'):
+                client.prepare_for_fork()
+        finally:
+            monitor.stop()
+        client.prepare_for_fork()
+
+    def test_session_generator(self):
+        client = APIClient('TestId', PRIVATE_KEY_PATH, session_generator_str='requests.Session')
+        self.assertIsInstance(client.session, requests.Session)
+
+
+class TestReplace(unittest.TestCase):
+    def test_replace(self):
+        with FakeGateway() as gateway:
+            client = gateway.client()
+            instrumentation = Instrumentation()
+            copy = client.replace(raise_exceptions=False, instrumentation=instrumentation)
+
+            self.assertIsNone(client.instrumentation)
+            self.assertTrue(client.resource_kwargs['raise_exception'])
+            self.assertIs(instrumentation, copy.resource_kwargs['instrumentation'])
+            self.assertIs(client.session, copy.session)
+            gateway.fail_with = 503
+            self.assertEqual(503, copy.echo().http_status_code)
+            self.assertEqual(1, instrumentation.counters['crypto.sign'])
+
+            gateway.fail_with = None
+            self.assertIsInstance(client.replace(defer=True).echo(), SignedCall)
+            with self.assertRaisesRegex(ValueError, 'merchant_id'):
+                client.replace(merchant_id='other')
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from csob.cassette import CassetteMode, CassetteSession, get_request_key
+from csob.enums import HTTPMethod, PaymentStatus
+from csob.exceptions import CassetteMissException
+from csob.fake_gateway import FakeGateway
+
+
+class TestGetRequestKey(unittest.TestCase):
+    def test_signed_get_url(self):
+        self.assertEqual(
+            'GET /api/v1.7/payment/status/TestId/123/{dttm}/{signature}',
+            get_request_key('get', 'https://host/api/v1.7/payment/status/TestId/123/20190310082622/ab%2Fcd%3D'))
+
+    def test_body(self):
+        self.assertEqual(
+            'PUT /api/v1.7/payment/close {"merchantId":"TestId","payId":"123"}',
+            get_request_key('PUT', 'http://localhost:8000/api/v1.7/payment/close/',
+                            {'payId': '123', 'merchantId': 'TestId', 'dttm': '20190310082622', 'signature': 'x'}))
+
+
+class TestCassetteSession(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.path = os.path.join(tempfile.mkdtemp(), 'cassette.jsonl.gz')
+
+    def tearDown(self):
+        self.gateway.stop()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def test_record_and_replay(self):
+        session = CassetteSession(self.path, CassetteMode.RECORD)
+        client = self.gateway.client(session=session)
+        pay_id = client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+        client.payment_status(pay_id)
+        client.echo(HTTPMethod.POST)
+        session.close()
+
+        requests_count = self.gateway.requests_count
+        self.gateway.fail_with = 500
+        client = self.gateway.client(session=CassetteSession(self.path))
+
+        api_response = client.payment_status(pay_id)
+        self.assertTrue(api_response.is_verified)
+        self.assertEqual(PaymentStatus.PAYMENT_INIT, api_response.payment_status)
+        self.assertTrue(client.echo(HTTPMethod.POST).is_okay)
+        self.assertEqual(requests_count, self.gateway.requests_count)
+
+        with self.assertRaises(CassetteMissException):
+            client.echo(HTTPMethod.GET)
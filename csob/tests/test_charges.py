@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from csob.charges import ChargeCheckpoint, ChargeEngine, ChargeJob
+from csob.enums import PaymentStatus, PayOperation, ResultCode
+from csob.fake_gateway import FakeGateway
+
+
+class TestChargeEngine(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.client = self.gateway.client()
+        self.template = self.client.payment_init(
+            '1', 100, True, 'https://localhost', 'Template', customer_id='customer',
+            pay_operation=PayOperation.ONE_CLICK_PAYMENT).response_json['payId']
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.directory, 'checkpoint.jsonl')
+
+    def tearDown(self):
+        self.gateway.stop()
+        if os.path.exists(self.checkpoint_path):
+            os.unlink(self.checkpoint_path)
+        os.rmdir(self.directory)
+
+    def engine(self):
+        return ChargeEngine(self.client, 'Subscription', concurrency=4, checkpoint_path=self.checkpoint_path,
+                            sleep=lambda seconds: None)
+
+    def test_run(self):
+        jobs = [ChargeJob(self.template, str(i), 100) for i in range(20)] + [ChargeJob('unknown', 'x', 100)]
+        outcomes = {outcome.job.order_number: outcome for outcome in self.engine().run(jobs)}
+
+        self.assertEqual(21, len(outcomes))
+        self.assertTrue(all(outcomes[str(i)].ok for i in range(20)))
+        self.assertEqual(PaymentStatus.PAYMENT_CONFIRMED, outcomes['0'].payment_status)
+        self.assertEqual(PaymentStatus.PAYMENT_CONFIRMED, self.gateway.payments[outcomes['0'].pay_id]['status'])
+        self.assertFalse(outcomes['x'].ok)
+        self.assertEqual(ResultCode.PAYMENT_NOT_FOUND, outcomes['x'].result_code)
+
+        # Finished jobs are not run again
+        requests_count = self.gateway.requests_count
+        outcomes = list(self.engine().run(jobs))
+        self.assertEqual(21, len(outcomes))
+        self.assertTrue(all(outcome.resumed for outcome in outcomes))
+        self.assertEqual(requests_count, self.gateway.requests_count)
+
+    def test_resume_after_init(self):
+        pay_id = self.client.oneclick_init(self.template, '1', 100, 'Subscription').response_json['payId']
+        checkpoint = ChargeCheckpoint(self.checkpoint_path)
+        checkpoint.write('1', step='init', payId=pay_id)
+        checkpoint.close()
+
+        outcome, = self.engine().run([ChargeJob(self.template, '1', 100)])
+        self.assertTrue(outcome.ok)
+        self.assertTrue(outcome.resumed)
+        self.assertEqual(pay_id, outcome.pay_id)
+        self.assertEqual(2, len(self.gateway.payments))
+
+    def test_errors_leave_job_unfinished(self):
+        self.gateway.fail_with = 503
+        outcome, = self.engine().run([ChargeJob(self.template, '1', 100)])
+        self.assertFalse(outcome.ok)
+        self.assertIn('ServiceUnavailable', outcome.error)
+
+        self.gateway.fail_with = None
+        outcome, = self.engine().run([ChargeJob(self.template, '1', 100)])
+        self.assertTrue(outcome.ok)
+
+    def test_http_errors_leave_job_unfinished(self):
+        self.client = self.gateway.client(raise_exceptions=False)
+        self.gateway.fail_with = 503
+        outcome, = self.engine().run([ChargeJob(self.template, '1', 100)])
+        self.assertFalse(outcome.ok)
+        self.assertEqual('HTTP 503', outcome.error)
+
+        self.gateway.fail_with = None
+        outcome, = self.engine().run([ChargeJob(self.template, '1', 100)])
+        self.assertTrue(outcome.ok)
+        self.assertFalse(outcome.resumed)
+
+    def test_close_early(self):
+        self.gateway.delay = 0.05
+        outcomes = self.engine().run(ChargeJob(self.template, str(i), 100) for i in range(20))
+        next(outcomes)
+        outcomes.close()
+
+        # At most the jobs running when the iterator was closed were charged besides the consumed one
+        self.assertLessEqual(len(self.gateway.payments) - 1, 1 + 4)
@@ -0,0 +1,121 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from csob.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitState
+from csob.exceptions import CircuitOpenException, ServiceUnavailableResponseException
+from csob.instrumentation import Instrumentation
+from csob.resources.echo import EchoResource
+from csob.tests import FakeClock
+from csob.tests.resources import get_private_key, get_gateway_key
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.instrumentation = Instrumentation()
+        self.breaker = CircuitBreaker('TestId', 'echo/', window_size=4, minimum_calls=4, reset_timeout=10,
+                                      instrumentation=self.instrumentation, clock=self.clock)
+
+    def trip(self):
+        for _ in range(4):
+            self.breaker.before_call()
+            self.breaker.record(True, 0.1)
+
+    def test_opens_on_error_rate(self):
+        for failed in (False, True, False):
+            self.breaker.before_call()
+            self.breaker.record(failed, 0.1)
+        self.assertEqual(CircuitState.CLOSED, self.breaker.state)
+
+        self.breaker.before_call()
+        self.breaker.record(True, 0.1)
+        self.assertEqual(CircuitState.OPEN, self.breaker.state)
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.before_call()
+        self.assertEqual(1, self.instrumentation.counters['circuit_breaker.open'])
+        self.assertEqual(1, self.instrumentation.counters['circuit_breaker.rejected'])
+
+    def test_latency_counts_as_failure(self):
+        self.breaker.latency_threshold = 1.0
+        for _ in range(4):
+            self.breaker.before_call()
+            self.breaker.record(False, 2.0)
+        self.assertEqual(CircuitState.OPEN, self.breaker.state)
+
+    def test_half_open_trial_call(self):
+        self.trip()
+        self.clock.now = 10
+        self.breaker.before_call()
+        self.assertEqual(CircuitState.HALF_OPEN, self.breaker.state)
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.before_call()
+
+        self.breaker.record(False, 0.1)
+        self.assertEqual(CircuitState.CLOSED, self.breaker.state)
+
+    def test_half_open_probe(self):
+        probe = mock.Mock(return_value=False)
+        self.breaker.probe = probe
+        self.trip()
+        self.clock.now = 10
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.before_call()
+        self.assertEqual(CircuitState.OPEN, self.breaker.state)
+
+        probe.return_value = True
+        self.clock.now = 20
+        self.breaker.before_call()
+        self.assertEqual(CircuitState.CLOSED, self.breaker.state)
+        self.assertEqual(2, probe.call_count)
+
+
+class TestCircuitBreakerRegistry(unittest.TestCase):
+    def test_breaker_per_merchant_and_endpoint(self):
+        instrumentation = Instrumentation()
+        registry = CircuitBreakerRegistry(instrumentation=instrumentation, minimum_calls=1)
+        probe = mock.Mock()
+        registry.register_probe('A', probe)
+
+        self.assertIs(registry.get('A', 'echo/'), registry.get('A', 'echo/'))
+        self.assertIsNot(registry.get('A', 'echo/'), registry.get('B', 'echo/'))
+        self.assertIs(probe, registry.get('A', 'payment/init').probe)
+        self.assertIsNone(registry.get('B', 'echo/').probe)
+        self.assertEqual(3, len(instrumentation.collect()['circuit_breakers']))
+
+
+class TestResourceWithCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.registry = CircuitBreakerRegistry(minimum_calls=2, window_size=2)
+        self.resource = EchoResource(
+            private_key=get_private_key(),
+            base_url="https://iapi.iplatebnibrana.csob.cz/api/v1.7/",
+            merchant_id="TestId",
+            gateway_key=get_gateway_key(),
+            session=self.session,
+            circuit_breakers=self.registry,
+        )
+
+    def test_fails_fast_when_open(self):
+        response = requests.Response()
+        response.status_code = 503
+        self.session.request.return_value = response
+
+        for _ in range(2):
+            with self.assertRaises(ServiceUnavailableResponseException):
+                self.resource.post()
+        with self.assertRaises(CircuitOpenException):
+            self.resource.post()
+
+        self.assertEqual(2, self.session.request.call_count)
+        self.assertEqual(CircuitState.OPEN, self.registry.get('TestId', 'echo/').state)
+
+    def test_connection_error_is_failure(self):
+        self.session.request.side_effect = requests.ConnectionError()
+
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.resource.get()
+        self.assertEqual(CircuitState.OPEN, self.registry.get('TestId', 'echo/').state)
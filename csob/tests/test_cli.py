@@ -0,0 +1,175 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from csob.cli import FIELDS, BulkRunner, ResumeState, get_operation, main
+from csob.fake_gateway import TEST_PRIVATE_KEY_PATH, FakeGateway
+from csob.pipeline import Operation
+
+
+class TestGetOperation(unittest.TestCase):
+    def test_get_operation(self):
+        self.assertEqual(Operation('payment_status', ('123',)), get_operation('status', {'payId': ' 123 '}))
+        self.assertEqual(Operation('payment_refund', ('123', 500)),
+                         get_operation('refund', {'payId': '123', 'amount': '500'}))
+        self.assertEqual(Operation('payment_close', ('123', None)),
+                         get_operation('close', {'payId': '123', 'amount': ''}))
+        for row in (None, [], {'amount': 1}, {'payId': '1', 'amount': '1.5'}, {'payId': '1', 'amount': -1}):
+            with self.subTest(row=row):
+                self.assertRaises(ValueError, get_operation, 'refund', row)
+
+    def test_resume_state(self):
+        state = ResumeState()
+        for row in (2, 1, 3, 6, 5):
+            state.add(row)
+        self.assertEqual(3, state.watermark)
+        self.assertEqual({5, 6}, state.done)
+        self.assertEqual([1, 2, 3, 5, 6], [row for row in range(1, 8) if row in state])
+
+
+class TestBulkRunner(unittest.TestCase):
+    def test_invalid_rows_are_streamed(self):
+        read = []
+
+        def rows():
+            for number in range(1, 10001):
+                read.append(number)
+                yield number, {}
+
+        with FakeGateway() as gateway:
+            client = gateway.client()
+            records = BulkRunner(client, 'status', queue_size=4).run(rows())
+            self.assertEqual('invalid', next(records)['kind'])
+            self.assertLess(len(read), 100)
+            records.close()
+            client.session.close()
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        client = self.gateway.client()
+        self.pay_ids = [client.payment_init(str(i), 100, True, 'https://localhost', 'Test').response_json['payId']
+                        for i in range(6)]
+        client.session.close()
+        self.directory = tempfile.mkdtemp()
+        self.summaries = []
+
+    def tearDown(self):
+        self.gateway.stop()
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def main(self, *args):
+        return main(list(args) + ['--merchant-id', 'A3746UdxZO', '--private-key', TEST_PRIVATE_KEY_PATH,
+                                  '--public-key', self.gateway.public_key_path, '--url', self.gateway.url,
+                                  '--concurrency', '3'], err=self.summaries.append)
+
+    def read_jsonl(self, name):
+        with open(self.path(name)) as f:
+            return [json.loads(line) for line in f]
+
+    def test_jsonl(self):
+        with open(self.path('input.jsonl'), 'w') as f:
+            for pay_id in self.pay_ids:
+                f.write(json.dumps({'payId': pay_id}) + '\n\n')
+            f.write('{"amount": 1}\n')
+
+        requests_count = self.gateway.requests_count
+        self.assertEqual(1, self.main('status', '--input', self.path('input.jsonl'), '--output',
+                                      self.path('output.jsonl')))
+        self.assertEqual(requests_count + 6, self.gateway.requests_count)
+        records = sorted(self.read_jsonl('output.jsonl'), key=lambda record: record['row'])
+        self.assertEqual(list(range(1, 8)), [record['row'] for record in records])
+        self.assertEqual(['ok'] * 6 + ['invalid'], [record['kind'] for record in records])
+        self.assertEqual(self.pay_ids, [record['payId'] for record in records[:6]])
+        self.assertEqual(['Missing payId.'], [record['error'] for record in records if record['error']])
+        self.assertEqual('7 rows: invalid=1, ok=6', self.summaries[-1])
+
+        # Output is not overwritten
+        with self.assertRaises(SystemExit):
+            self.main('status', '--input', self.path('input.jsonl'), '--output', self.path('output.jsonl'))
+
+    def test_resume_csv(self):
+        with open(self.path('input.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['payId', 'amount'])
+            for pay_id in self.pay_ids:
+                writer.writerow([pay_id, 100])
+
+        # The previous run was interrupted after rows 1, 2 and 4
+        with open(self.path('output.csv'), 'w', newline='') as f:
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            for row in (1, 2, 4):
+                writer.writerow({'row': row, 'payId': self.pay_ids[row - 1], 'command': 'close', 'kind': 'ok'})
+            f.write('5,')
+
+        requests_count = self.gateway.requests_count
+        self.assertEqual(0, self.main('close', '--input', self.path('input.csv'), '--output', self.path('output.csv'),
+                                      '--resume', '--rate', '100'))
+        self.assertEqual(requests_count + 3, self.gateway.requests_count)
+        with open(self.path('output.csv'), newline='') as f:
+            records = list(csv.DictReader(f))
+        # The truncated line is dropped
+        self.assertEqual(['1', '2', '4', '3', '5', '6'],
+                         [record['row'] for record in records[:3]] + sorted(record['row'] for record in records[3:]))
+        self.assertEqual({'close'}, {record['command'] for record in records[3:]})
+        self.assertEqual({'7'}, {record['paymentStatus'] for record in records[3:]})
+        self.assertEqual('3 rows: ok=3, skipped=3', self.summaries[-1])
+
+    def test_resume_retries_failures(self):
+        with open(self.path('input.jsonl'), 'w') as f:
+            for pay_id in self.pay_ids:
+                f.write(json.dumps({'payId': pay_id}) + '\n')
+        with open(self.path('output.jsonl'), 'w') as f:
+            for row, kind in ((1, 'ok'), (2, 'transport_error'), (3, 'http_error'), (4, 'gateway_error')):
+                f.write(json.dumps({'row': row, 'payId': self.pay_ids[row - 1], 'kind': kind}) + '\n')
+
+        requests_count = self.gateway.requests_count
+        self.assertEqual(0, self.main('status', '--input', self.path('input.jsonl'), '--output',
+                                      self.path('output.jsonl'), '--resume'))
+        self.assertEqual(requests_count + 4, self.gateway.requests_count)
+        self.assertEqual([2, 3, 5, 6], sorted(record['row'] for record in self.read_jsonl('output.jsonl')[4:]))
+
+    def test_resume_does_not_resend_refunds(self):
+        with open(self.path('input.jsonl'), 'w') as f:
+            for pay_id in self.pay_ids[:4]:
+                f.write(json.dumps({'payId': pay_id, 'amount': 50}) + '\n')
+        with open(self.path('output.jsonl'), 'w') as f:
+            for row, kind in ((1, 'ok'), (2, 'transport_error'), (3, 'http_error'), (3, 'signature_invalid')):
+                f.write(json.dumps({'row': row, 'payId': self.pay_ids[row - 1], 'kind': kind}) + '\n')
+
+        requests_count = self.gateway.requests_count
+        self.assertEqual(1, self.main('refund', '--input', self.path('input.jsonl'), '--output',
+                                      self.path('output.jsonl'), '--resume'))
+        self.assertEqual(requests_count + 1, self.gateway.requests_count)
+        records = sorted(self.read_jsonl('output.jsonl')[4:], key=lambda record: record['row'])
+        self.assertEqual([(2, 'review'), (3, 'review'), (4, 'ok')],
+                         [(record['row'], record['kind']) for record in records])
+
+        # Rows written for review are final
+        requests_count = self.gateway.requests_count
+        self.assertEqual(0, self.main('refund', '--input', self.path('input.jsonl'), '--output',
+                                      self.path('output.jsonl'), '--resume'))
+        self.assertEqual(requests_count, self.gateway.requests_count)
+
+    def test_dry_run(self):
+        with open(self.path('input.jsonl'), 'w') as f:
+            f.write(json.dumps({'payId': self.pay_ids[0], 'amount': 50}) + '\n')
+
+        requests_count = self.gateway.requests_count
+        self.assertEqual(0, self.main('refund', '--dry-run', '--input', self.path('input.jsonl'), '--output',
+                                      self.path('output.jsonl')))
+        self.assertEqual(requests_count, self.gateway.requests_count)
+        record, = self.read_jsonl('output.jsonl')
+        self.assertEqual('signed', record['kind'])
+        self.assertEqual('PUT', record['method'])
+        self.assertEqual(self.gateway.url + 'payment/refund/', record['url'])
+        self.assertEqual(50, record['request']['amount'])
+        self.assertTrue(record['request']['signature'])
@@ -1,8 +1,11 @@
 import os
 import sys
 import unittest
+from unittest import mock
 
-from csob.crypto import get_signature, get_url_signature, verify_signature
+from csob.crypto import (
+    SignatureCache, get_signature, get_url_signature, url_signature_cache, verify_signature, verify_signatures
+)
 
 
 class TestSinging(unittest.TestCase):
@@ -34,6 +37,41 @@ class TestSinging(unittest.TestCase):
         self.assertEqual(get_url_signature(self.key, signature_str), expected_output)
 
 
+class TestSignatureCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = SignatureCache(maxsize=2)
+        self.sign = mock.Mock(side_effect=lambda key, signature_str: 'signed ' + signature_str)
+
+    def test_hit(self):
+        self.assertEqual('signed a', self.cache.get('key', 'a', self.sign))
+        self.assertEqual('signed a', self.cache.get('key', 'a', self.sign))
+        self.assertEqual(1, self.sign.call_count)
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}, self.cache.stats())
+
+    def test_key_is_part_of_cache_key(self):
+        self.cache.get('key', 'a', self.sign)
+        self.cache.get('other key', 'a', self.sign)
+        self.assertEqual(2, self.sign.call_count)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.get('key', 'a', self.sign)
+        self.cache.get('key', 'b', self.sign)
+        self.cache.get('key', 'a', self.sign)
+        self.cache.get('key', 'c', self.sign)
+        self.cache.get('key', 'a', self.sign)
+        self.assertEqual(3, self.sign.call_count)
+        self.cache.get('key', 'b', self.sign)
+        self.assertEqual(4, self.sign.call_count)
+
+    def test_get_url_signature_is_cached(self):
+        with open(os.path.join(sys.prefix, "csob_keys/rsa_test_A3746UdxZO.key")) as f:
+            key = f.read()
+        url_signature_cache.clear()
+        self.assertEqual(get_url_signature(key, 'A3746UdxZO|1|20190312143240'),
+                         get_url_signature(key, 'A3746UdxZO|1|20190312143240'))
+        self.assertEqual(1, url_signature_cache.hits)
+
+
 class TestVerify(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -61,3 +99,38 @@ class TestVerify(unittest.TestCase):
         )
 
         self.assertFalse(verify_signature(self.gateway_pub_key, signature_str, signature))
+        self.assertFalse(verify_signature(self.gateway_pub_key, signature_str, 'abc'))
+
+
+class TestVerifySignatures(unittest.TestCase):
+    signature = (
+        'ktff0QgQsl15PYt2O5rLA0h0ncCUB2F6JPTOzaIPvJP7/pyV2nphurt8/Lr+OykI7TsLr3ElM/S0BEHXxaPs/mtsYkxKswdnCWAfDGczs'
+        'cAr1ysd7BWstPwMPV3LATyN3jeHXO+8Z1Ycru9GC9lYKVmrtpl5KVH/N0hP7IUOpx6McbzVGdhhJFpFrJnLQYjZ/94sLvBWi2zzthlkFh'
+        '2q4c2eUsVGEKAePFmbnyCL4NPrxdgVzxtVUH80Ywna23ho+9H03JBcV8KkBiD5ABgXCAtQJz3Naa0lZRCiyOLMb8lX/3RWgDGBCr3WIM6'
+        '5iiDq00o8tM9VXto6lfczK8a8zQ=='
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(sys.prefix, "csob_keys/mips_iplatebnibrana.csob.cz.pub")) as f:
+            cls.gateway_pub_key = f.read()
+
+    def test_verify_signatures(self):
+        result = verify_signatures(
+            self.gateway_pub_key, ['20190312144643|0|OK', '20190312144643|1|FOOBAR', '20190312144643|0|OK'],
+            [self.signature, self.signature, 'not base64!'], workers=1)
+
+        self.assertEqual([True, False, False], result.verified)
+        self.assertEqual([1, 2], result.failures)
+
+    def test_verify_signatures_pool(self):
+        result = verify_signatures(
+            self.gateway_pub_key, ('20190312144643|0|OK', '20190312144643|1|FOOBAR') * 3, (self.signature,) * 6,
+            workers=2, chunk_size=2)
+
+        self.assertEqual([True, False] * 3, result.verified)
+        self.assertEqual([1, 3, 5], result.failures)
+
+    def test_verify_signatures_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            verify_signatures(self.gateway_pub_key, ['20190312144643|0|OK'], [])
@@ -0,0 +1,106 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from unittest import mock
+
+import requests
+
+from csob.api_response import APIResponse
+from csob.customer_cache import CustomerInfoCache
+from csob.enums import PayOperation, ResultCode
+from csob.exceptions import CustomerNotFoundResultCodeException
+from csob.fake_gateway import FakeGateway
+from csob.tests import FakeClock
+
+
+def response(result_code, is_verified=True):
+    return APIResponse(parsed_data={'resultCode': result_code, 'resultMessage': ''}, is_verified=is_verified)
+
+
+class TestCustomerInfoCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = CustomerInfoCache(ttl=10, negative_ttl=60, clock=self.clock)
+
+    def test_ttl(self):
+        fetch = mock.Mock(return_value=response(ResultCode.CUSTOMER_HAVE_CARDS))
+        self.cache.get('a', fetch)
+        self.cache.get('a', fetch)
+        self.assertEqual(1, fetch.call_count)
+        self.clock.now = 10
+        self.cache.get('a', fetch)
+        self.assertEqual(2, fetch.call_count)
+        self.assertEqual({'hits': 1, 'misses': 2, 'coalesced': 0, 'size': 1}, self.cache.stats())
+
+    def test_negative_ttl(self):
+        for result_code in (ResultCode.CUSTOMER_NO_CARDS, ResultCode.CUSTOMER_NOT_FOUND):
+            fetch = mock.Mock(return_value=response(result_code))
+            self.cache.get(str(result_code), fetch)
+            self.clock.now += 30
+            self.cache.get(str(result_code), fetch)
+            self.assertEqual(1, fetch.call_count)
+
+        fetch = mock.Mock(side_effect=CustomerNotFoundResultCodeException())
+        for _ in range(2):
+            with self.assertRaises(CustomerNotFoundResultCodeException):
+                self.cache.get('b', fetch)
+        self.assertEqual(1, fetch.call_count)
+
+    def test_errors_are_not_cached(self):
+        for result in (response(ResultCode.INTERNAL_ERROR), response(ResultCode.CUSTOMER_HAVE_CARDS, False)):
+            fetch = mock.Mock(return_value=result)
+            self.cache.get('a', fetch)
+            self.cache.get('a', fetch)
+            self.assertEqual(2, fetch.call_count)
+
+        fetch = mock.Mock(side_effect=requests.ConnectionError())
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.cache.get('a', fetch)
+        self.assertEqual(2, fetch.call_count)
+
+    def test_stampede(self):
+        started, release = Event(), Event()
+        fetch = mock.Mock(side_effect=lambda: started.set() or release.wait(5) and response(
+            ResultCode.CUSTOMER_HAVE_CARDS))
+        with ThreadPoolExecutor(8) as executor:
+            first = executor.submit(self.cache.get, 'a', fetch)
+            started.wait(5)
+            others = [executor.submit(self.cache.get, 'a', fetch) for _ in range(7)]
+            release.set()
+            results = [first.result()] + [future.result() for future in others]
+        self.assertEqual(1, fetch.call_count)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_invalidate(self):
+        fetch = mock.Mock(return_value=response(ResultCode.CUSTOMER_NO_CARDS))
+        self.cache.get('a', fetch)
+        self.cache.invalidate('a')
+        self.cache.get('a', fetch)
+        self.assertEqual(2, fetch.call_count)
+
+        # Result fetched before the invalidation is not stored
+        def fetch_and_invalidate():
+            self.cache.invalidate('b')
+            return response(ResultCode.CUSTOMER_NO_CARDS)
+        self.cache.get('b', fetch_and_invalidate)
+        self.assertEqual(1, self.cache.stats()['size'])
+
+
+class TestClientCustomerInfoCache(unittest.TestCase):
+    def test_one_click_init_invalidates(self):
+        cache = CustomerInfoCache()
+        with FakeGateway() as gateway:
+            client = gateway.client(customer_info_cache=cache)
+            self.assertEqual(ResultCode.CUSTOMER_NOT_FOUND, client.customer_info('customer').result_code)
+            gateway.customers['customer'] = ResultCode.CUSTOMER_HAVE_CARDS
+            self.assertEqual(ResultCode.CUSTOMER_NOT_FOUND, client.customer_info('customer').result_code)
+            self.assertEqual(1, gateway.requests_count)
+
+            client.payment_init('1', 100, False, 'https://localhost', 'Test', customer_id='customer')
+            self.assertEqual(ResultCode.CUSTOMER_NOT_FOUND, client.customer_info('customer').result_code)
+
+            client.payment_init('2', 100, False, 'https://localhost', 'Test', customer_id='customer',
+                                pay_operation=PayOperation.ONE_CLICK_PAYMENT)
+            self.assertEqual(ResultCode.CUSTOMER_HAVE_CARDS, client.customer_info('customer').result_code)
+            self.assertEqual(4, gateway.requests_count)
@@ -0,0 +1,61 @@
+import unittest
+
+import requests
+
+from csob.deadline import Deadline
+from csob.exceptions import DeadlineExceededException, RateLimitExceededException
+from csob.fake_gateway import FakeGateway
+from csob.rate_limit import RateLimiter
+from csob.tests import FakeClock
+
+
+class TestDeadline(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.deadline = Deadline(2, clock=self.clock)
+
+    def test_remaining(self):
+        self.clock.now = 0.5
+        self.assertEqual(1.5, self.deadline.remaining())
+        self.assertEqual(1.5, self.deadline.timeout())
+        self.assertEqual(1.0, self.deadline.timeout(1.0))
+        self.assertFalse(self.deadline.expired())
+
+    def test_expired(self):
+        self.clock.now = 3
+        self.assertEqual(0, self.deadline.remaining())
+        self.assertTrue(self.deadline.expired())
+        with self.assertRaises(DeadlineExceededException):
+            self.deadline.check()
+
+
+class TestClientDeadline(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+
+    def tearDown(self):
+        self.gateway.stop()
+
+    def test_expired_deadline_is_not_sent(self):
+        client = self.gateway.client()
+        with self.assertRaises(DeadlineExceededException):
+            client.payment_status('000000000000001', deadline=Deadline(0))
+        self.assertEqual(0, self.gateway.requests_count)
+
+    def test_remaining_budget_is_timeout(self):
+        self.gateway.delay = 0.5
+        client = self.gateway.client()
+        with self.assertRaises(requests.Timeout):
+            client.echo(deadline=Deadline(0.1))
+        self.assertTrue(client.echo(deadline=Deadline(5)).is_verified)
+
+    def test_rate_limiter_wait_is_bounded(self):
+        client = self.gateway.client(rate_limiter=RateLimiter(1, max_wait=10))
+        client.echo(deadline=Deadline(5))
+        with self.assertRaises(DeadlineExceededException):
+            client.echo(deadline=Deadline(0.5))
+
+        client.rate_limiter.max_wait = 0.1
+        with self.assertRaises(RateLimitExceededException):
+            client.echo(deadline=Deadline(0.5))
+        self.assertEqual(1, self.gateway.requests_count)
@@ -0,0 +1,71 @@
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from csob.enums import HTTPMethod
+from csob.exceptions import GatewaySignatureInvalid
+from csob.health import HealthMonitor, percentile
+from csob.tests import FakeClock
+
+
+class TestHealthMonitor(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.client = mock.Mock(instrumentation=None)
+        self.client.echo.return_value = mock.Mock(is_okay=True, is_verified=True)
+        self.monitor = HealthMonitor(self.client, interval=5, window_size=4, min_success_rate=0.75, clock=self.clock)
+
+    def test_not_healthy_before_first_check(self):
+        self.assertFalse(self.monitor.is_healthy())
+        self.client.echo.assert_not_called()
+
+    def test_healthy(self):
+        self.monitor.check()
+        self.assertTrue(self.monitor.is_healthy())
+        self.client.echo.assert_called_once_with(HTTPMethod.GET)
+
+    def test_success_rate(self):
+        self.monitor.check()
+        self.client.echo.side_effect = requests.ConnectionError()
+        self.monitor.check()
+        snapshot = self.monitor.snapshot()
+        self.assertFalse(snapshot.healthy)
+        self.assertEqual(0.5, snapshot.success_rate)
+        self.assertEqual(1.0, snapshot.verified_rate)
+        self.assertIn('ConnectionError', snapshot.last_error)
+
+    def test_signature_verification(self):
+        self.client.echo.side_effect = GatewaySignatureInvalid()
+        self.monitor.check()
+        self.assertEqual(0.0, self.monitor.snapshot().verified_rate)
+
+    def test_stale(self):
+        self.monitor.check()
+        self.clock.now = 16
+        self.assertFalse(self.monitor.is_healthy())
+
+    def test_background_thread(self):
+        checked = threading.Event()
+        response = self.client.echo.return_value
+
+        def echo(method):
+            checked.set()
+            return response
+
+        self.client.echo.side_effect = echo
+        self.monitor.start()
+        self.assertTrue(checked.wait(timeout=1))
+        self.monitor.stop(timeout=1)
+        self.assertGreaterEqual(self.client.echo.call_count, 1)
+        self.assertTrue(self.monitor.is_healthy())
+
+
+class TestPercentile(unittest.TestCase):
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(50.0, percentile(values, 50))
+        self.assertEqual(99.0, percentile(values, 99))
+        self.assertEqual(1.0, percentile(values, 0))
+        self.assertIsNone(percentile([], 50))
@@ -0,0 +1,146 @@
+import multiprocessing
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+
+from csob.fake_gateway import FakeGateway
+from csob.hedging import HedgingPolicy
+from csob.instrumentation import Instrumentation
+from csob.ledger import Ledger
+
+
+class FailingFirstGateway(FakeGateway):
+    """
+    Answers the first request late with HTTP 503.
+    """
+    received = 0
+
+    def handle(self, method, segments, request_json):
+        with self._lock:
+            self.received += 1
+            first = self.received == 1
+        if first:
+            time.sleep(0.2)
+            return 503, None
+        return super().handle(method, segments, request_json)
+
+
+def response(is_verified=True):
+    return mock.Mock(is_verified=is_verified)
+
+
+def failing_call():
+    time.sleep(0.2)
+    raise requests.Timeout()
+
+
+def _hedge_after_fork(policy, queue):
+    policy.after_fork()
+    queue.put(policy.call('echo/', failing_call, lambda: response()).is_verified)
+
+
+class TestHedgingPolicy(unittest.TestCase):
+    def setUp(self):
+        self.instrumentation = Instrumentation()
+        self.policy = HedgingPolicy(initial_delay=0.05, budget=1, instrumentation=self.instrumentation)
+
+    def tearDown(self):
+        self.policy.close()
+
+    def test_fast_call_is_not_hedged(self):
+        hedge = mock.Mock()
+        result = response()
+        self.assertIs(result, self.policy.call('echo/', lambda: result, hedge))
+        hedge.assert_not_called()
+        self.assertEqual(0, self.instrumentation.counters['hedging.hedged'])
+
+    def test_hedge_wins(self):
+        result = response()
+        self.assertIs(result, self.policy.call('echo/', failing_call, lambda: result))
+        self.assertEqual(1, self.instrumentation.counters['hedging.hedged'])
+        self.assertEqual(1, self.instrumentation.counters['hedging.hedge_won'])
+
+    def test_verified_first_response_is_used(self):
+        result = response()
+        hedge = mock.Mock(return_value=response())
+        self.assertIs(result, self.policy.call('echo/', lambda: time.sleep(0.2) or result, hedge))
+        hedge.assert_called_once_with()
+        self.assertEqual(0, self.instrumentation.counters['hedging.hedge_won'])
+
+    def test_failed_hedge(self):
+        with self.assertRaises(requests.Timeout):
+            self.policy.call('echo/', failing_call, mock.Mock(side_effect=requests.ConnectionError()))
+
+    def test_calls_are_not_limited_by_workers(self):
+        self.policy.initial_delay = 1
+        result = response()
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            started = time.monotonic()
+            futures = [executor.submit(self.policy.call, 'echo/', lambda: time.sleep(0.2) or result, mock.Mock())
+                       for _ in range(32)]
+            self.assertEqual([result] * 32, [future.result() for future in futures])
+            self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(0, self.instrumentation.counters['hedging.hedged'])
+
+    def test_unverified_hedge_is_not_used(self):
+        result = response(False)
+        hedge = mock.Mock(return_value=response(False))
+        self.assertIs(result, self.policy.call('echo/', lambda: time.sleep(0.2) or result, hedge))
+        hedge.assert_called_once_with()
+        self.assertEqual(0, self.instrumentation.counters['hedging.hedge_won'])
+
+    def test_budget(self):
+        self.policy.budget = 0.5
+        result = response()
+        hedge = mock.Mock(return_value=response())
+        self.policy.initial_delay = 0
+        self.assertIs(result, self.policy.call('echo/', lambda: time.sleep(0.05) or result, hedge))
+        hedge.assert_not_called()
+        self.assertEqual(1, self.instrumentation.counters['hedging.budget_exhausted'])
+
+    def test_delay_percentile(self):
+        self.policy.minimum_samples = 10
+        self.assertEqual(0.05, self.policy.get_delay('echo/'))
+        for latency in range(1, 21):
+            self.policy.record_latency('echo/', latency / 100)
+        self.assertEqual(0.19, self.policy.get_delay('echo/'))
+        self.assertEqual(0.05, self.policy.get_delay('customer/info/'))
+
+
+class TestResourceHedging(unittest.TestCase):
+    def test_failing_status_is_hedged(self):
+        instrumentation = Instrumentation()
+        policy = HedgingPolicy(initial_delay=0.05, budget=1)
+        ledger = Ledger()
+        with FailingFirstGateway() as gateway:
+            client = gateway.client(hedging=policy, instrumentation=instrumentation, ledger=ledger)
+            api_response = client.payment_status('000000000000001')
+            self.assertTrue(api_response.is_verified)
+            self.assertEqual(2, gateway.received)
+            self.assertEqual(1, instrumentation.counters['hedging.hedge_won'])
+        ledger.flush()
+        self.assertEqual(1, len(ledger.get_history('000000000000001')))
+        ledger.close()
+        policy.close()
+
+    def test_after_fork(self):
+        policy = HedgingPolicy(initial_delay=0.05, budget=1)
+        policy.call('echo/', failing_call, response)
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        process = context.Process(target=_hedge_after_fork, args=(policy, queue))
+        process.start()
+        self.assertTrue(queue.get(timeout=5))
+        process.join()
+        policy.close()
+
+    def test_non_idempotent_resource_is_not_hedged(self):
+        policy = HedgingPolicy(initial_delay=0.05, budget=1)
+        with FailingFirstGateway() as gateway:
+            client = gateway.client(hedging=policy, raise_exceptions=False)
+            client.payment_close('000000000000001', None)
+            self.assertEqual(1, gateway.received)
+        policy.close()
@@ -0,0 +1,62 @@
+import multiprocessing
+import socket
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from csob import http2
+
+
+def _echo_after_fork(client, queue):
+    client.after_fork()
+    queue.put(client.echo().is_okay)
+
+
+@unittest.skipIf(http2.httpx is None or http2.h2 is None, 'httpx and h2 are not installed')
+class TestHTTP2Session(unittest.TestCase):
+    def setUp(self):
+        self.session = http2.HTTP2Session(http1=False)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_concurrent_calls_share_connection(self):
+        with http2.FakeHTTP2Gateway() as gateway:
+            client = gateway.client(session=self.session)
+            pay_id = client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+            with ThreadPoolExecutor(8) as executor:
+                responses = list(executor.map(lambda _: client.payment_status(pay_id), range(16)))
+            connections_count = gateway.connections_count
+
+        self.assertTrue(all(api_response.is_verified for api_response in responses))
+        self.assertEqual(1, connections_count)
+
+    def test_after_fork(self):
+        with http2.FakeHTTP2Gateway() as gateway:
+            client = gateway.client(session=self.session)
+            client.echo()
+            context = multiprocessing.get_context('fork')
+            queue = context.Queue()
+            process = context.Process(target=_echo_after_fork, args=(client, queue), daemon=True)
+            process.start()
+            self.assertTrue(queue.get(timeout=10))
+            process.join()
+
+    def test_requests_options(self):
+        for kwargs in ({'verify': False}, {'verify': '/etc/ssl/ca.pem'}, {'cert': '/etc/ssl/client.pem'},
+                       {'proxies': {'https': 'http://proxy:3128'}}):
+            with self.subTest(**kwargs), self.assertRaisesRegex(ValueError, 'not supported'):
+                self.session.get('http://127.0.0.1/', **kwargs)
+
+        self.session.verify = False
+        with self.assertRaisesRegex(ValueError, 'not supported'):
+            self.session.get('http://127.0.0.1/')
+
+    def test_connection_error(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+
+        with self.assertRaises(requests.ConnectionError):
+            self.session.get('http://127.0.0.1:{}/'.format(port))
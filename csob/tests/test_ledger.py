@@ -0,0 +1,114 @@
+import os
+import tempfile
+import sqlite3
+import unittest
+from unittest import mock
+
+from csob.enums import PaymentStatus
+from csob.fake_gateway import FakeGateway
+from csob.instrumentation import Instrumentation
+from csob.ledger import Ledger
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.ledger = Ledger(flush_interval=0.05)
+        self.client = self.gateway.client(ledger=self.ledger)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.gateway.stop()
+
+    def init(self, order_number, customer_id=None):
+        return self.client.payment_init(order_number, 100, False, 'https://localhost', 'Test',
+                                        customer_id=customer_id).response_json['payId']
+
+    def test_records_operations(self):
+        pay_id = self.init('1', 'customer')
+        self.client.payment_status(pay_id)
+        self.client.payment_close(pay_id, None)
+        self.ledger.flush()
+
+        payment = self.ledger.get_payment(pay_id)
+        self.assertEqual(('1', 'customer', 100, None, 'CZK'), payment[1:6])
+        self.assertEqual(PaymentStatus.PAYMENT_WAITING_FOR_SETTLEMENT, payment.payment_status)
+        self.assertEqual(['init', 'status', 'close'], [event.operation for event in self.ledger.get_history(pay_id)])
+        self.assertIsNone(self.ledger.get_payment('unknown'))
+
+    def test_write_failure(self):
+        instrumentation = Instrumentation()
+        self.ledger.set_instrumentation(instrumentation)
+        write = self.ledger._write
+        errors = [sqlite3.OperationalError('locked')]
+
+        def fail_once(batch):
+            if errors:
+                raise errors.pop()
+            write(batch)
+
+        with mock.patch.object(self.ledger, '_write', side_effect=fail_once):
+            lost_pay_id = self.init('1')
+            self.ledger.flush()
+            pay_id = self.init('2')
+            self.ledger.flush()
+
+        self.assertEqual(1, instrumentation.counters['ledger.write_failed'])
+        self.assertEqual({'queued': 0, 'failed_batches': 1, 'lost_records': 1}, instrumentation.collect()['ledger'])
+        self.assertIsNone(self.ledger.get_payment(lost_pay_id))
+        self.assertIsNotNone(self.ledger.get_payment(pay_id))
+
+    def test_partial_close(self):
+        pay_id = self.init('1')
+        self.client.payment_close(pay_id, 60)
+        self.ledger.flush()
+
+        payment = self.ledger.get_payment(pay_id)
+        self.assertEqual((100, 60), (payment.total_amount, payment.closed_amount))
+
+    def test_record_after_close(self):
+        pay_id = self.init('1')
+        self.ledger.close()
+        with self.assertRaises(RuntimeError):
+            self.client.payment_status(pay_id)
+        self.ledger.flush()
+
+    def test_find_payments(self):
+        first = self.init('1', 'customer')
+        second = self.init('2', 'customer')
+        self.init('3')
+        self.client.payment_reverse(second)
+        self.client.echo()
+        self.ledger.flush()
+
+        self.assertEqual([first], [payment.pay_id for payment in self.ledger.find_payments(order_number='1')])
+        self.assertEqual({first, second},
+                         {payment.pay_id for payment in self.ledger.find_payments(customer_id='customer')})
+        self.assertEqual([second], [payment.pay_id for payment in self.ledger.find_payments(
+            customer_id='customer', payment_status=PaymentStatus.PAYMENT_REVERSED)])
+        self.assertEqual(3, len(self.ledger.find_payments(dttm_from='20000101000000')))
+        self.assertEqual(2, len(self.ledger.find_payments(limit=2)))
+
+    def test_unverified_responses_are_not_recorded(self):
+        self.gateway.fail_with = 500
+        client = self.gateway.client(ledger=self.ledger, raise_exceptions=False)
+        client.payment_status('1')
+        self.ledger.flush()
+        self.assertEqual([], self.ledger.find_payments())
+
+
+class TestLedgerFile(unittest.TestCase):
+    def test_persistent(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'ledger.sqlite3')
+        with FakeGateway() as gateway:
+            ledger = Ledger(path)
+            pay_id = gateway.client(ledger=ledger).payment_init(
+                '1', 100, False, 'https://localhost', 'Test').response_json['payId']
+            ledger.close()
+
+        ledger = Ledger(path)
+        self.assertEqual('1', ledger.get_payment(pay_id).order_number)
+        ledger.close()
+        os.unlink(path)
+        os.rmdir(directory)
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+
+from csob.fake_gateway import FakeGateway
+from csob.instrumentation import Instrumentation
+from csob.loadtest import LatencyHistogram, LoadTest, main, parse_mix
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentile(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(0.0, histogram.percentile(99))
+        for millisecond in range(1, 1001):
+            histogram.record(millisecond / 1000)
+        self.assertEqual(1000, histogram.count)
+        self.assertAlmostEqual(0.5, histogram.percentile(50), delta=0.5 / 100)
+        self.assertAlmostEqual(0.99, histogram.percentile(99), delta=0.99 / 100)
+        self.assertEqual(1.0, histogram.percentile(100))
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_parse_mix(self):
+        self.assertEqual({'payment_init': 1.0, 'echo': 3.0}, parse_mix('payment_init, echo=3'))
+
+    def test_errors(self):
+        with FakeGateway() as gateway:
+            client = gateway.client(raise_exceptions=False, instrumentation=Instrumentation())
+            load_test = LoadTest(client, {'payment_status': 1}, calls=4)
+            load_test.pay_ids.append('unknown')
+            load_test.run_sync()
+            gateway.fail_with = 503
+            load_test.calls = 6
+            load_test.run_sync()
+        errors = load_test.report('sync', 1.0)['errors']
+        self.assertEqual({'140': 4}, errors['result_codes'])
+        self.assertEqual({'503': 2}, errors['http_statuses'])
+
+    def test_client_without_instrumentation(self):
+        with FakeGateway() as gateway:
+            client = gateway.client(raise_exceptions=False)
+            load_test = LoadTest(client, {'echo': 1}, calls=2)
+            load_test.run_sync()
+        self.assertIsNone(client.instrumentation)
+        self.assertIsNotNone(load_test.client.instrumentation)
+        self.assertEqual(2, load_test.cpu['crypto.sign.calls'])
+        self.assertEqual(2, load_test.cpu['crypto.verify.calls'])
+
+    def test_main(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            for mode in ('sync', 'threaded', 'async'):
+                report = main(['--mode', mode, '--calls', '12', '--threads', '3', '--json', path,
+                               '--mix', 'payment_init=1,payment_status=1,payment_close=1,echo=1'],
+                              out=lambda text: None)
+                with open(path) as f:
+                    self.assertEqual(report, json.load(f))
+                self.assertEqual(12, report['calls'])
+                self.assertEqual(12, report['latency']['count'])
+                self.assertEqual(12, report['cpu']['sign_calls'])
+                self.assertEqual(12, report['cpu']['verify_calls'])
+                self.assertEqual({}, report['errors']['exceptions'])
+        finally:
+            os.unlink(path)
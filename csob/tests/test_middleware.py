@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import unittest
+from io import BytesIO
+from urllib.parse import urlencode
+
+from csob.enums import PaymentStatus
+from csob.fake_gateway import FakeGateway
+from csob.instrumentation import Instrumentation
+from csob.middleware import ASGIReturnURLMiddleware, WSGIReturnURLMiddleware, decode_merchant_data
+from csob.models import base64_text
+
+
+class MiddlewareTestCase(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.instrumentation = Instrumentation()
+        self.events = []
+        self.instrumentation.subscribe(
+            lambda event, data: self.events.append((event, data, threading.current_thread().name)))
+        self.client = self.gateway.client(instrumentation=self.instrumentation)
+        self.pay_id = self.client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+        self.gateway.payments[self.pay_id]['status'] = PaymentStatus.PAYMENT_CONFIRMED
+        self.data = {key: str(value) for key, value in self.gateway._payment_result(self.pay_id).items()}
+        self.data['merchantData'] = base64_text('order=1')
+        self.received = []
+
+    def tearDown(self):
+        self.gateway.stop()
+
+    def assert_verified(self, result):
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(self.pay_id, result.pay_id)
+        self.assertEqual(PaymentStatus.PAYMENT_CONFIRMED, result.payment_status)
+        self.assertEqual('order=1', result.merchant_data)
+        event, data, _ = [event for event in self.events if event[0] == 'return_url.verified'][-1]
+        self.assertTrue(data['verified'])
+        self.assertGreater(data['seconds'], 0)
+
+
+class TestWSGIReturnURLMiddleware(MiddlewareTestCase):
+    def app(self, environ, start_response):
+        self.received.append((environ.get('csob.return_url'), environ['wsgi.input'].read()))
+        return [b'']
+
+    def call(self, path, query='', body=b'', method='GET'):
+        middleware = WSGIReturnURLMiddleware(self.app, self.client, ['/return/'])
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'wsgi.input': BytesIO(body),
+                   'CONTENT_LENGTH': str(len(body)), 'CONTENT_TYPE': 'application/x-www-form-urlencoded'}
+        middleware(environ, lambda status, headers: None)
+        return self.received[-1]
+
+    def test_get(self):
+        result, _ = self.call('/return/', urlencode(self.data))
+        self.assert_verified(result)
+        self.assertIsNone(self.call('/other/', urlencode(self.data))[0])
+
+    def test_post(self):
+        body = urlencode(self.data).encode('utf-8')
+        result, received_body = self.call('/return/', body=body, method='POST')
+        self.assert_verified(result)
+        self.assertEqual(body, received_body)
+
+    def test_invalid(self):
+        result, _ = self.call('/return/', urlencode(dict(self.data, paymentStatus='7')))
+        self.assertFalse(result.verified)
+        self.assertIsNone(result.pay_id)
+        self.assertEqual('Invalid signature.', result.error)
+
+        result, _ = self.call('/return/', urlencode(dict(self.data, signature='abc')))
+        self.assertFalse(result.verified)
+        self.assertEqual('Invalid signature.', result.error)
+
+        result, _ = self.call('/return/', urlencode({'payId': self.pay_id}))
+        self.assertEqual('Missing dttm, resultCode, resultMessage, signature.', result.error)
+
+        self.assertIsNone(decode_merchant_data('not base64'))
+
+
+class TestASGIReturnURLMiddleware(MiddlewareTestCase):
+    async def app(self, scope, receive, send):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        self.received.append((scope.get('csob.return_url'), body))
+
+    def call(self, path, query=b'', chunks=(), method='GET', max_body_size=65536):
+        middleware = ASGIReturnURLMiddleware(self.app, self.client, ['/return/'], max_body_size=max_body_size)
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+                 'headers': [(b'content-type', b'application/x-www-form-urlencoded')]}
+        messages = [{'type': 'http.request', 'body': chunk, 'more_body': index < len(chunks) - 1}
+                    for index, chunk in enumerate(chunks)]
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(middleware(scope, receive, None))
+        finally:
+            loop.close()
+            middleware.close()
+        return self.received[-1]
+
+    def test_get(self):
+        result, _ = self.call('/return/', urlencode(self.data).encode('utf-8'))
+        self.assert_verified(result)
+        self.assertTrue(self.events[-1][2].startswith('csob-return-url'))
+        self.assertIsNone(self.call('/other/', urlencode(self.data).encode('utf-8'))[0])
+
+    def test_post(self):
+        body = urlencode(self.data).encode('utf-8')
+        result, received_body = self.call('/return/', chunks=(body[:10], body[10:]), method='POST')
+        self.assert_verified(result)
+        self.assertEqual(body, received_body)
+
+        result, received_body = self.call('/return/', chunks=(body[:10], body[10:]), method='POST', max_body_size=20)
+        self.assertEqual('Request body is too large.', result.error)
+        self.assertEqual(body, received_body)
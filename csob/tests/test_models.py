@@ -0,0 +1,99 @@
+import unittest
+from decimal import Decimal
+
+from csob.enums import Currency, HTTPMethod, Language, PayMethod, PayOperation
+from csob.models import CustomerInfoRequest, PaymentCloseRequest, PaymentInitRequest
+from csob.payment import Item
+from csob.resources.payment.init import PaymentInitResource
+from csob.tests.resources import get_private_key, get_gateway_key
+
+
+class TestPaymentInitRequest(unittest.TestCase):
+    context = {'merchantId': 'TestId', 'dttm': '20190310082622'}
+
+    def get_request(self, **kwargs):
+        init_kwargs = dict(
+            order_number='1234', pay_operation=PayOperation.PAYMENT, pay_method=PayMethod.CARD,
+            total_amount=Decimal('10.5'), currency=Currency.CZK, close_payment=True, return_url='https://localhost',
+            return_method=HTTPMethod.POST, description='Test', language=Language.CZ)
+        init_kwargs.update(kwargs)
+        return PaymentInitRequest(**init_kwargs)
+
+    def test_dump(self):
+        local_json, signature_str = self.get_request(merchant_data='data').dump(self.context)
+
+        self.assertEqual(
+            ['merchantId', 'orderNo', 'dttm', 'payOperation', 'payMethod', 'totalAmount', 'currency', 'closePayment',
+             'returnUrl', 'returnMethod', 'cart', 'description', 'merchantData', 'language'],
+            list(local_json))
+        self.assertEqual(1050, local_json['totalAmount'])
+        self.assertEqual('ZGF0YQ==', local_json['merchantData'])
+        self.assertEqual([{'name': 'Your purchase', 'quantity': 1, 'amount': 1050}], local_json['cart'])
+        self.assertEqual(
+            'TestId|1234|20190310082622|payment|card|1050|CZK|true|https://localhost|POST|Your purchase|1|1050|Test|'
+            'ZGF0YQ==|CZ', signature_str)
+
+    def test_signature_str_matches_resource(self):
+        resource = PaymentInitResource(
+            base_url='https://iapi.iplatebnibrana.csob.cz/api/v1.7/', merchant_id='TestId',
+            gateway_key=get_gateway_key(), private_key=get_private_key())
+        local_json, signature_str = self.get_request(
+            cart=[Item('Purchase', 1000), Item('Shipping', Decimal('0.5'), description='Post')], ttl_sec=600,
+        ).dump(self.context)
+
+        self.assertEqual(resource._construct_signature_str(local_json), signature_str)
+        self.assertIn('|Purchase|1|1000|Shipping|1|50|Post|', signature_str)
+
+    def test_validation(self):
+        for kwargs, message in (
+                ({'order_number': '12345678901'}, 'orderNo is too long.'),
+                ({'pay_operation': 'foo'}, 'payOperation invalid value'),
+                ({'currency': 'XXX'}, 'currency invalid value'),
+                ({'close_payment': 'true'}, 'closePayment invalid value'),
+                ({'return_url': 'x' * 301}, 'returnUrl is too long'),
+                ({'customer_id': 'x' * 51}, 'customerId is too long'),
+                ({'ttl_sec': 299}, 'ttlSec not in range'),
+                ({'logo_version': '1'}, 'logoVersion is not a number.'),
+                ({'description': None}, 'description is missing.'),
+                ({'order_number': None}, 'orderNo is missing.'),
+        ):
+            with self.subTest(kwargs=kwargs):
+                with self.assertRaisesRegex(ValueError, message):
+                    self.get_request(**kwargs).dump(self.context)
+
+    def test_missing_context(self):
+        for context in (None, {'merchantId': 'TestId'}):
+            with self.subTest(context=context):
+                with self.assertRaisesRegex(ValueError, 'is missing in the context.'):
+                    self.get_request().dump(context)
+
+    def test_unexpected_argument(self):
+        with self.assertRaises(TypeError):
+            PaymentInitRequest(foo=1)
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            self.get_request().foo = 1
+
+
+class TestOtherRequests(unittest.TestCase):
+    def test_close_request_optional_amount(self):
+        context = {'merchantId': 'TestId', 'dttm': '20190310082622'}
+        self.assertEqual(
+            ({'merchantId': 'TestId', 'payId': 'abc', 'dttm': '20190310082622'}, 'TestId|abc|20190310082622'),
+            PaymentCloseRequest(pay_id='abc').dump(context))
+        self.assertEqual(
+            'TestId|abc|20190310082622|150',
+            PaymentCloseRequest(pay_id='abc', total_amount=Decimal('1.5')).dump(context)[1])
+
+    def test_customer_info_request(self):
+        with self.assertRaisesRegex(ValueError, 'customerId is too long'):
+            CustomerInfoRequest(customer_id='x' * 51).dump({'merchantId': 'TestId', 'dttm': '20190310082622'})
+
+    def test_item(self):
+        self.assertEqual({'name': 'Shipping', 'quantity': 2, 'amount': 100},
+                         Item('Shipping', Decimal('1'), quantity=2).dict)
+        with self.assertRaisesRegex(ValueError, 'name is too long'):
+            Item('x' * 21, 100)
+        with self.assertRaisesRegex(ValueError, 'quantity invalid value'):
+            Item('Shipping', 100, quantity=0)
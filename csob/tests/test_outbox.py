@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from csob.api_response import APIResponse
+from csob.enums import PaymentStatus
+from csob.fake_gateway import FakeGateway
+from csob.instrumentation import Instrumentation
+from csob.outbox import (
+    CallbackSink, Confirmed, JSONLinesSink, Outbox, PaymentInitiated, QueueSink, Refunded, Settled, StatusChanged,
+    get_events)
+
+
+class TestGetEvents(unittest.TestCase):
+    def test_events(self):
+        def types(old_status, new_status):
+            return [type(event) for event in get_events('1', old_status, new_status, 'status', 0.0)]
+
+        self.assertEqual([PaymentInitiated], types(None, PaymentStatus.PAYMENT_INIT))
+        self.assertEqual([], types(PaymentStatus.PAYMENT_INIT, PaymentStatus.PAYMENT_INIT))
+        self.assertEqual([StatusChanged], types(PaymentStatus.PAYMENT_INIT, PaymentStatus.PAYMENT_IN_PROGRESS))
+        self.assertEqual([StatusChanged, Settled], types(None, PaymentStatus.PAYMENT_SETTLED))
+        self.assertEqual([StatusChanged, Refunded],
+                         types(PaymentStatus.PAYMENT_SETTLED, PaymentStatus.PAYMENT_REFUND_PROCESSING))
+        self.assertEqual([StatusChanged],
+                         types(PaymentStatus.PAYMENT_REFUND_PROCESSING, PaymentStatus.PAYMENT_RETURNED))
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.received = []
+        self.outbox = Outbox(sinks=[CallbackSink(self.received.append)], batch_size=2)
+        self.client = self.gateway.client(outbox=self.outbox)
+
+    def tearDown(self):
+        self.outbox.close()
+        self.gateway.stop()
+
+    def test_events_of_calls(self):
+        pay_id = self.client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+        self.client.payment_status(pay_id)
+        self.gateway.payments[pay_id]['status'] = PaymentStatus.PAYMENT_CONFIRMED
+        self.client.payment_status(pay_id)
+        self.client.payment_status(pay_id)
+        self.client.payment_close(pay_id, None)
+        self.client.payment_status('unknown')
+
+        self.assertEqual(4, len(self.outbox.pending()))
+        self.assertEqual([], self.received)
+        self.assertEqual(4, self.outbox.dispatch())
+        self.assertEqual(0, self.outbox.dispatch())
+        self.assertEqual([
+            PaymentInitiated(pay_id, None, PaymentStatus.PAYMENT_INIT, 'init', self.received[0].observed_at),
+            StatusChanged(pay_id, PaymentStatus.PAYMENT_INIT, PaymentStatus.PAYMENT_CONFIRMED, 'status',
+                          self.received[1].observed_at),
+            Confirmed(pay_id, PaymentStatus.PAYMENT_INIT, PaymentStatus.PAYMENT_CONFIRMED, 'status',
+                      self.received[2].observed_at),
+            StatusChanged(pay_id, PaymentStatus.PAYMENT_CONFIRMED, PaymentStatus.PAYMENT_WAITING_FOR_SETTLEMENT,
+                          'close', self.received[3].observed_at),
+        ], self.received)
+        self.assertIsInstance(self.received[2], Confirmed)
+
+    def test_return_url(self):
+        pay_id = self.client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+        self.gateway.payments[pay_id]['status'] = PaymentStatus.PAYMENT_CANCELED
+        data = {key: str(value) for key, value in self.gateway._payment_result(pay_id).items()}
+        self.assertTrue(self.client.parse_payment_return_url_get(data).is_verified)
+        self.assertEqual(['PaymentInitiated', 'StatusChanged', 'Canceled'],
+                         [type(event).__name__ for event in self.outbox.pending()])
+        self.assertEqual('return', self.outbox.pending()[-1].source)
+
+    def test_stale_observation(self):
+        def observe(status, dttm):
+            data = {'payId': '1', 'dttm': dttm, 'resultCode': 0, 'paymentStatus': int(status)}
+            return self.outbox.observe('status', APIResponse(parsed_data=data, is_verified=True))
+
+        observe(PaymentStatus.PAYMENT_INIT, '20200101120000')
+        observe(PaymentStatus.PAYMENT_CONFIRMED, '20200101120005')
+        self.assertEqual([], observe(PaymentStatus.PAYMENT_INIT, '20200101120001'))
+        self.assertEqual([], observe(PaymentStatus.PAYMENT_CONFIRMED, '20200101120010'))
+        self.assertEqual(['PaymentInitiated', 'StatusChanged', 'Confirmed'],
+                         [type(event).__name__ for event in self.outbox.pending()])
+
+    def test_failed_observation(self):
+        instrumentation = Instrumentation()
+        self.client = self.gateway.client(outbox=self.outbox, instrumentation=instrumentation)
+        with mock.patch.object(self.outbox, '_connection', mock.MagicMock(
+                execute=mock.Mock(side_effect=sqlite3.OperationalError('locked')))):
+            response = self.client.payment_init('1', 100, False, 'https://localhost', 'Test')
+        self.assertTrue(response.is_verified)
+        self.assertEqual(1, instrumentation.counters['outbox.observe_failed'])
+        self.assertEqual({'failed_observations': 1}, instrumentation.collect()['outbox'])
+
+    def test_failed_sink(self):
+        self.outbox.sinks = [mock.Mock(send=mock.Mock(side_effect=IOError))]
+        self.client.payment_init('1', 100, False, 'https://localhost', 'Test')
+        with self.assertRaises(IOError):
+            self.outbox.dispatch()
+        self.assertEqual(1, len(self.outbox.pending()))
+
+    def test_sinks(self):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        try:
+            queue_sink = QueueSink()
+            self.outbox.sinks = [JSONLinesSink(path), queue_sink]
+            self.outbox.dispatch_interval = 0.05
+            pay_id = self.client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+            self.outbox.start()
+            self.assertIsInstance(queue_sink.queue.get(timeout=5), PaymentInitiated)
+            with open(path) as f:
+                record, = [json.loads(line) for line in f]
+            self.assertEqual({'type': 'PaymentInitiated', 'payId': pay_id, 'oldStatus': None, 'newStatus': 1,
+                              'source': 'init'}, {key: value for key, value in record.items() if key != 'observedAt'})
+        finally:
+            os.unlink(path)
+
+    def test_persistence(self):
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        try:
+            outbox = Outbox(path)
+            client = self.gateway.client(outbox=outbox)
+            pay_id = client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+            outbox.close()
+
+            outbox = Outbox(path)
+            client = self.gateway.client(outbox=outbox)
+            client.payment_status(pay_id)
+            self.assertEqual([PaymentInitiated], [type(event) for event in outbox.pending()])
+            outbox.close()
+        finally:
+            os.unlink(path)
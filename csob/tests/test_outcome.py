@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from csob.api_response import APIResponse
+from csob.deadline import Deadline
+from csob.enums import OutcomeKind, ResultCode
+from csob.exceptions import (
+    CircuitOpenException, PaymentNotFoundResultCodeException, ServiceResultCodeException,
+    ServiceUnavailableResponseException)
+from csob.fake_gateway import FakeGateway
+from csob.outcome import Outcome, OutcomeCounter
+
+
+def response(result_code, is_verified=True):
+    return APIResponse(parsed_data={'resultCode': result_code, 'resultMessage': 'Message'}, is_verified=is_verified)
+
+
+class TestOutcome(unittest.TestCase):
+    def test_from_api_response(self):
+        self.assertEqual(Outcome(OutcomeKind.OK, 0, response_json={'resultCode': 0, 'resultMessage': 'Message'}),
+                         Outcome.from_api_response(response(ResultCode.OK)))
+        self.assertTrue(Outcome.from_api_response(response(ResultCode.CUSTOMER_NO_CARDS)).ok)
+        outcome = Outcome.from_api_response(response(ResultCode.PAYMENT_NOT_FOUND))
+        self.assertEqual((OutcomeKind.GATEWAY_ERROR, 140, 'Message'),
+                         (outcome.kind, outcome.result_code, outcome.error))
+        self.assertEqual(OutcomeKind.SIGNATURE_INVALID, Outcome.from_api_response(response(0, False)).kind)
+        self.assertEqual(Outcome(OutcomeKind.HTTP_ERROR, http_status=503),
+                         Outcome.from_api_response(APIResponse(mock.Mock(status_code=503))))
+
+    def test_from_exception(self):
+        self.assertEqual(Outcome(OutcomeKind.TRANSPORT_ERROR, error='ConnectionError'),
+                         Outcome.from_exception(requests.ConnectionError()))
+        outcome = Outcome.from_exception(CircuitOpenException('A', 'echo/', 1))
+        self.assertEqual(OutcomeKind.TRANSPORT_ERROR, outcome.kind)
+        self.assertEqual(Outcome(OutcomeKind.HTTP_ERROR, http_status=503, error='ServiceUnavailableResponseException'),
+                         Outcome.from_exception(ServiceUnavailableResponseException(mock.Mock(status_code=503))))
+        outcome = Outcome.from_exception(PaymentNotFoundResultCodeException())
+        self.assertEqual((OutcomeKind.GATEWAY_ERROR, 140), (outcome.kind, outcome.result_code))
+
+    def test_api_response_raises_instance(self):
+        api_response = response(ResultCode.PAYMENT_NOT_FOUND)
+        with self.assertRaises(PaymentNotFoundResultCodeException) as context:
+            APIResponse(parsed_data=api_response.response_json, is_verified=True, raise_exception=True)
+        self.assertEqual('Message', context.exception.message)
+        self.assertEqual(140, context.exception.api_response.result_code)
+        self.assertEqual(140, Outcome.from_exception(context.exception).result_code)
+
+        with self.assertRaises(ServiceResultCodeException):
+            APIResponse(parsed_data={'resultCode': 999, 'resultMessage': ''}, is_verified=True, raise_exception=True)
+
+    def test_counter(self):
+        counter = OutcomeCounter([
+            Outcome(OutcomeKind.OK, 0),
+            Outcome(OutcomeKind.GATEWAY_ERROR, 140, 200, 'Payment not found'),
+            Outcome(OutcomeKind.GATEWAY_ERROR, 140, 200, 'Payment not found'),
+            Outcome(OutcomeKind.HTTP_ERROR, http_status=503),
+            Outcome(OutcomeKind.TRANSPORT_ERROR, error='ConnectionError'),
+        ])
+        self.assertEqual({
+            'kinds': {'ok': 1, 'gateway_error': 2, 'http_error': 1, 'transport_error': 1},
+            'result_codes': {140: 2},
+            'http_statuses': {503: 1},
+            'errors': {'ConnectionError': 1},
+        }, counter.as_dict())
+
+
+class TestPipelineOutcomes(unittest.TestCase):
+    def test_pipeline(self):
+        with FakeGateway() as gateway:
+            client = gateway.client()
+            pay_id = client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+            operations = [('payment_status', (pay_id,)), ('payment_status', ('unknown',)),
+                          ('payment_status', (pay_id,), {'deadline': Deadline(0)}), ('warm_up',)]
+            results = sorted(client.pipeline(operations, outcomes=True))
+
+        self.assertTrue(results[0].outcome.ok)
+        self.assertEqual(pay_id, results[0].outcome.response_json['payId'])
+        self.assertEqual(ResultCode.PAYMENT_NOT_FOUND, results[1].outcome.result_code)
+        self.assertEqual('DeadlineExceededException', results[2].outcome.error)
+        self.assertTrue(all(result.response is None and result.error is None for result in results[:3]))
+        self.assertIsNone(results[3].outcome)
+        self.assertIsInstance(results[3].error, ValueError)
+        self.assertEqual({'ok': 1, 'gateway_error': 1, 'transport_error': 1},
+                         OutcomeCounter(result.outcome for result in results[:3]).as_dict()['kinds'])
@@ -0,0 +1,47 @@
+import unittest
+
+from csob.api_response import APIResponse
+from csob.deadline import Deadline
+from csob.exceptions import DeadlineExceededException
+from csob.fake_gateway import FakeGateway
+from csob.pipeline import Operation
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.client = self.gateway.client()
+
+    def tearDown(self):
+        self.gateway.stop()
+
+    def test_operations(self):
+        operations = [Operation('payment_init', (str(i), 100, False, 'https://localhost', 'Test')) for i in range(20)]
+        results = sorted(self.client.pipeline(operations, sign_workers=2, send_workers=4, queue_size=2))
+        self.assertEqual(list(range(20)), [result.position for result in results])
+        self.assertTrue(all(isinstance(result.response, APIResponse) and result.response.is_verified
+                            for result in results))
+        self.assertEqual(20, len(self.gateway.payments))
+
+        pay_id = results[0].response.response_json['payId']
+        result, = self.client.pipeline([('payment_status', (pay_id,))])
+        self.assertEqual(pay_id, result.response.response_json['payId'])
+
+    def test_errors(self):
+        results = sorted(self.client.pipeline([
+            ('echo',),
+            ('warm_up',),
+            ('customer_info', ('x' * 51,)),
+            ('payment_status', ('1',), {'deadline': Deadline(0)}),
+        ]))
+        self.assertIsNone(results[0].error)
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertIsInstance(results[2].error, ValueError)
+        self.assertIsInstance(results[3].error, DeadlineExceededException)
+        self.assertEqual(1, self.gateway.requests_count)
+
+    def test_stop_consuming(self):
+        results = self.client.pipeline((Operation('echo') for _ in range(1000)), queue_size=1)
+        next(results)
+        results.close()
+        self.assertLess(self.gateway.requests_count, 1000)
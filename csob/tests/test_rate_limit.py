@@ -0,0 +1,147 @@
+import multiprocessing
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from csob.exceptions import RateLimitExceededException
+from csob.fake_gateway import FakeGateway
+from csob.instrumentation import Instrumentation
+from csob.rate_limit import (
+    LocalBackend, RateLimiter, RateLimitServer, SharedMemoryBackend, SocketBackend, take_tokens
+)
+from csob.tests import FakeClock
+
+
+def _acquire_without_wait(directory, count, queue):
+    backend = SharedMemoryBackend(directory)
+    queue.put(sum(1 for _ in range(count) if backend.acquire('key', 0.001, 10, max_wait=0) is not None))
+
+
+def _acquire_through_socket(backend, queue):
+    wait = backend.acquire('key', 100, 100)
+    queue.put((wait, backend._local.connection.getsockname()))
+
+
+class TestTakeTokens(unittest.TestCase):
+    def test_new_bucket_is_full(self):
+        state, wait = take_tokens(None, 10.0, 1.0, 5.0, 1.0, None)
+        self.assertEqual((4.0, 10.0), state)
+        self.assertEqual(0.0, wait)
+
+    def test_refill_is_capped(self):
+        state, wait = take_tokens((0.0, 0.0), 100.0, 1.0, 5.0, 1.0, None)
+        self.assertEqual((4.0, 100.0), state)
+
+    def test_wait_and_max_wait(self):
+        state, wait = take_tokens((0.0, 10.0), 10.0, 2.0, 5.0, 1.0, None)
+        self.assertEqual((-1.0, 10.0), state)
+        self.assertEqual(0.5, wait)
+        self.assertEqual((None, None), take_tokens((0.0, 10.0), 10.0, 2.0, 5.0, 1.0, 0.1))
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+        self.sleeps = []
+        self.limiter = RateLimiter(2, capacity=2, backend=LocalBackend(self.clock), sleep=self.sleeps.append)
+
+    def test_waits_when_empty(self):
+        self.assertEqual(0, self.limiter.acquire('A'))
+        self.assertEqual(0, self.limiter.acquire('A'))
+        self.assertEqual(0.5, self.limiter.acquire('A'))
+        self.assertEqual(1.0, self.limiter.acquire('A'))
+        self.assertEqual([0.5, 1.0], self.sleeps)
+        # Buckets are per merchant
+        self.assertEqual(0, self.limiter.acquire('B'))
+
+    def test_max_wait(self):
+        self.limiter.max_wait = 0.5
+        for _ in range(3):
+            self.limiter.acquire('A')
+        with self.assertRaises(RateLimitExceededException):
+            self.limiter.acquire('A')
+        self.clock.now += 0.5
+        self.assertEqual(0.5, self.limiter.acquire('A'))
+
+
+class TestSharedMemoryBackend(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_shared_by_instances(self):
+        clock = FakeClock(1000.0)
+        first = SharedMemoryBackend(self.directory, clock=clock)
+        second = SharedMemoryBackend(self.directory, clock=clock)
+        self.assertEqual(0, first.acquire('key', 1, 1))
+        self.assertEqual(1, second.acquire('key', 1, 1))
+        self.assertIsNone(first.acquire('key', 1, 1, max_wait=1))
+        self.assertEqual(0, second.acquire('other', 1, 1))
+
+    def test_shared_by_processes(self):
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        processes = [
+            context.Process(target=_acquire_without_wait, args=(self.directory, 10, queue)) for _ in range(3)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(10, sum(queue.get() for _ in processes))
+
+
+class TestSocketBackend(unittest.TestCase):
+    def test_shared_through_server(self):
+        clock = FakeClock(1000.0)
+        with RateLimitServer(backend=LocalBackend(clock)) as server:
+            first = SocketBackend(*server.address)
+            second = SocketBackend(*server.address)
+            self.assertEqual(0, first.acquire('key', 2, 1))
+            self.assertEqual(0.5, second.acquire('key', 2, 1))
+            self.assertIsNone(first.acquire('key', 2, 1, max_wait=0))
+
+    def test_forked_process_connects_again(self):
+        with RateLimitServer() as server:
+            backend = SocketBackend(*server.address)
+            backend.acquire('key', 100, 100)
+            context = multiprocessing.get_context('fork')
+            queue = context.Queue()
+            process = context.Process(target=_acquire_through_socket, args=(backend, queue))
+            process.start()
+            wait, address = queue.get(timeout=5)
+            process.join()
+            self.assertEqual(0, wait)
+            self.assertNotEqual(backend._local.connection.getsockname(), address)
+            self.assertEqual(0, backend.acquire('key', 100, 100))
+
+    def test_error_closes_connection(self):
+        server = RateLimitServer().start()
+        backend = SocketBackend(*server.address, timeout=0.1)
+        backend.acquire('key', 100, 100)
+        connection = backend._local.connection
+        backend._local.file.write = mock.Mock(side_effect=OSError())
+        with self.assertRaises(OSError):
+            backend.acquire('key', 100, 100)
+        server.stop()
+        self.assertEqual(-1, connection.fileno())
+        self.assertIsNone(backend._local.file)
+
+
+class TestResourceRateLimit(unittest.TestCase):
+    def test_limits_requests(self):
+        instrumentation = Instrumentation()
+        sleeps = []
+        limiter = RateLimiter(1, backend=LocalBackend(FakeClock(1000.0)), sleep=sleeps.append, max_wait=1)
+        with FakeGateway() as gateway:
+            client = gateway.client(rate_limiter=limiter, instrumentation=instrumentation)
+            client.echo()
+            client.echo()
+            with self.assertRaises(RateLimitExceededException):
+                client.echo()
+            self.assertEqual(2, gateway.requests_count)
+        self.assertEqual([1.0], sleeps)
+        self.assertEqual(1, instrumentation.counters['rate_limiter.waited'])
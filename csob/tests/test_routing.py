@@ -0,0 +1,125 @@
+import unittest
+
+from csob.enums import ResultCode
+from csob.fake_gateway import FakeGateway
+from csob.instrumentation import Instrumentation
+from csob.routing import EndpointSet
+from csob.tests import FakeClock
+
+
+class TestEndpointSet(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.endpoints = EndpointSet(['http://a', 'http://b/', 'http://c/'], cooldown=10, probe_rate=0,
+                                     clock=self.clock)
+
+    def test_ranking(self):
+        self.assertEqual(['http://a/', 'http://b/', 'http://c/'], self.endpoints.candidates())
+        self.endpoints.record('http://a/', False, 0.2)
+        self.endpoints.record('http://b/', False, 0.1)
+        self.assertEqual(['http://b/', 'http://a/', 'http://c/'], self.endpoints.candidates())
+        self.assertEqual(['http://c/', 'http://b/', 'http://a/'], self.endpoints.candidates(pinned='http://c/'))
+
+        # Errors raise the score
+        self.endpoints.record('http://b/', True, 0.1)
+        self.assertEqual(['http://a/', 'http://b/', 'http://c/'], self.endpoints.candidates())
+
+    def test_down(self):
+        for _ in range(3):
+            self.endpoints.record('http://a/', True, 0.1)
+        self.assertEqual(['http://b/', 'http://c/', 'http://a/'], self.endpoints.candidates())
+        self.assertFalse(self.endpoints.snapshot()[0].healthy)
+
+        self.clock.now = 10
+        self.assertEqual(['http://a/', 'http://b/', 'http://c/'], self.endpoints.candidates())
+        self.endpoints.record('http://a/', True, 0.1)
+        self.assertEqual('http://a/', self.endpoints.candidates()[-1])
+        self.endpoints.record('http://a/', False, 0.1)
+        self.assertTrue(self.endpoints.snapshot()[0].healthy)
+
+    def test_probe(self):
+        instrumentation = Instrumentation()
+        samples = iter([0.0, 0.5, 0.0])
+        endpoints = EndpointSet(['http://a/', 'http://b/', 'http://c/'], probe_rate=0.1, stale_after=60,
+                                clock=self.clock, instrumentation=instrumentation, random=lambda: next(samples))
+        endpoints.record('http://a/', False, 0.1)
+        endpoints.record('http://b/', False, 0.2)
+
+        # The endpoint without a sample is probed, unless the call is not idempotent, not sampled or pinned
+        self.assertEqual(['http://a/', 'http://b/', 'http://c/'], endpoints.candidates())
+        self.assertEqual(['http://c/', 'http://a/', 'http://b/'], endpoints.candidates(idempotent=True))
+        self.assertEqual(['http://a/', 'http://b/', 'http://c/'], endpoints.candidates(idempotent=True))
+        self.assertEqual(['http://b/', 'http://a/', 'http://c/'],
+                         endpoints.candidates(pinned='http://b/', idempotent=True))
+
+        # Then the endpoint with a stale sample
+        endpoints.record('http://c/', False, 0.3)
+        self.clock.now = 30
+        endpoints.record('http://a/', False, 0.1)
+        endpoints.record('http://c/', False, 0.3)
+        self.clock.now = 70
+        self.assertEqual(['http://b/', 'http://a/', 'http://c/'], endpoints.candidates(idempotent=True))
+        self.assertEqual(2, instrumentation.counters['routing.probe'])
+
+    def test_pins(self):
+        endpoints = EndpointSet(['http://a/'], max_pins=2)
+        for pay_id in ('1', '2', '3'):
+            endpoints.pin(pay_id, 'http://a/')
+        endpoints.pin('3', 'http://b/')
+        self.assertIsNone(endpoints.get_pinned('1'))
+        self.assertEqual('http://a/', endpoints.get_pinned('3'))
+
+
+class TestRouting(unittest.TestCase):
+    def setUp(self):
+        self.first = FakeGateway().start()
+        self.second = FakeGateway().start()
+        self.instrumentation = Instrumentation()
+        self.endpoints = EndpointSet([self.first.url, self.second.url], probe_rate=0)
+        self.client = self.first.client(endpoints=self.endpoints, raise_exceptions=False,
+                                        instrumentation=self.instrumentation)
+
+    def tearDown(self):
+        self.first.stop()
+        self.second.stop()
+
+    def test_failover(self):
+        self.first.fail_with = 503
+        self.assertTrue(self.client.echo().is_okay)
+        self.assertEqual(1, self.second.requests_count)
+        self.assertEqual(1, self.instrumentation.counters['routing.failover'])
+
+        # Transport errors fail over too, the stopped gateway goes down after three failures
+        self.first.stop()
+        self.endpoints.record(self.first.url, False, 0.0)
+        self.first = FakeGateway().start()
+        for _ in range(4):
+            self.assertTrue(self.client.echo().is_okay)
+        self.assertEqual(5, self.second.requests_count)
+        self.assertEqual(4, self.instrumentation.counters['routing.failover'])
+        self.assertEqual(1, self.instrumentation.counters['routing.endpoint_down'])
+        self.assertEqual([self.second.url, self.endpoints.urls[0]], self.endpoints.candidates())
+
+    def test_pinning(self):
+        pay_id = self.client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+        self.endpoints.record(self.first.url, False, 1.0)
+        self.endpoints.record(self.second.url, False, 0.001)
+        self.assertEqual(self.second.url, self.endpoints.candidates()[0])
+
+        self.assertEqual(ResultCode.OK, self.client.payment_status(pay_id).result_code)
+        self.assertEqual(0, self.second.requests_count)
+
+        # Non-idempotent calls do not fail over
+        self.first.fail_with = 503
+        self.assertEqual(503, self.client.payment_close(pay_id, None).http_status_code)
+        self.assertEqual(0, self.second.requests_count)
+
+    def test_probe_idempotent_calls_only(self):
+        endpoints = EndpointSet([self.first.url, self.second.url], probe_rate=1, random=lambda: 0.0)
+        client = self.first.client(endpoints=endpoints, raise_exceptions=False)
+        endpoints.record(endpoints.urls[0], False, 0.01)
+
+        client.payment_init('1', 100, False, 'https://localhost', 'Test')
+        self.assertEqual(0, self.second.requests_count)
+        client.echo()
+        self.assertEqual(1, self.second.requests_count)
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from collections import Counter
+
+from csob.fake_gateway import FakeGateway
+from csob.instrumentation import Instrumentation
+from csob.sharding import FileMembership, HashRing, ShardedPoller, SQLiteMembership
+from csob.tests import FakeClock
+
+
+class TestHashRing(unittest.TestCase):
+    def test_owner(self):
+        keys = [str(i) for i in range(3000)]
+        ring = HashRing(['a', 'b', 'c'])
+        owners = {key: ring.owner(key) for key in keys}
+        counts = Counter(owners.values())
+        self.assertEqual({'a', 'b', 'c'}, set(counts))
+        self.assertTrue(all(600 < count < 1400 for count in counts.values()), counts)
+
+        # Only keys of the new member move
+        joined = HashRing(['a', 'b', 'c', 'd'])
+        moved = [key for key in keys if joined.owner(key) != owners[key]]
+        self.assertTrue(all(joined.owner(key) == 'd' for key in moved))
+        self.assertTrue(500 < len(moved) < 1000, len(moved))
+
+        self.assertIsNone(HashRing([]).owner('1'))
+
+
+class TestMembership(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.clock = FakeClock(1000.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_backends(self):
+        sqlite_membership = SQLiteMembership(os.path.join(self.directory, 'members.sqlite'), clock=self.clock)
+        backends = [FileMembership(os.path.join(self.directory, 'members'), clock=self.clock), sqlite_membership]
+        for membership in backends:
+            with self.subTest(membership=type(membership).__name__):
+                self.clock.now = 1000.0
+                membership.heartbeat('a', 10)
+                membership.heartbeat('b', 20)
+                self.assertEqual(['a', 'b'], membership.members())
+                self.clock.now += 15
+                self.assertEqual(['b'], membership.members())
+                membership.heartbeat('a', 10)
+                membership.leave('b')
+                membership.leave('c')
+                self.assertEqual(['a'], membership.members())
+        sqlite_membership.close()
+
+
+class TestShardedPoller(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.client = self.gateway.client()
+        self.pay_ids = [self.client.payment_init(str(i), 100, False, 'https://localhost', 'Test').response_json['payId']
+                        for i in range(30)]
+        self.directory = tempfile.mkdtemp()
+        self.membership = FileMembership(self.directory)
+
+    def tearDown(self):
+        self.gateway.stop()
+        shutil.rmtree(self.directory)
+
+    def poller(self, worker_id, results):
+        return ShardedPoller(self.client, worker_id, self.membership, lambda: self.pay_ids,
+                             lambda pay_id, outcome: results.append((worker_id, pay_id, outcome)))
+
+    def test_rounds(self):
+        results = []
+        pollers = [self.poller(worker_id, results) for worker_id in ('a', 'b', 'c')]
+        for poller in pollers:
+            poller.get_ring()
+
+        requests_count = self.gateway.requests_count
+        self.assertEqual(30, sum(poller.poll_once() for poller in pollers))
+        self.assertEqual(requests_count + 30, self.gateway.requests_count)
+        self.assertEqual(sorted(self.pay_ids), sorted(pay_id for _, pay_id, _ in results))
+        self.assertTrue(all(outcome.ok for _, _, outcome in results))
+        self.assertEqual(3, len({worker_id for worker_id, _, _ in results}))
+
+        # The remaining workers take over payIds of the worker which left
+        pollers.pop().stop()
+        results.clear()
+        for poller in pollers:
+            poller.poll_once()
+        self.assertEqual(sorted(self.pay_ids), sorted(pay_id for _, pay_id, _ in results))
+        self.assertEqual({'a', 'b'}, {worker_id for worker_id, _, _ in results})
+
+    def test_long_round_renews_membership(self):
+        clock = FakeClock(1000.0)
+        membership = FileMembership(self.directory, clock=clock)
+
+        def on_result(pay_id, outcome):
+            # Every call takes a third of the membership ttl
+            clock.now += 10
+
+        poller = ShardedPoller(self.client, 'a', membership, lambda: self.pay_ids, on_result, interval=10, ttl=30,
+                               clock=clock)
+        self.assertEqual(30, poller.poll_once())
+        self.assertEqual(['a'], membership.members())
+
+    def test_failed_rounds_are_emitted(self):
+        instrumentation = Instrumentation()
+
+        def source():
+            raise IOError('unavailable')
+
+        poller = ShardedPoller(self.client, 'a', self.membership, source, lambda pay_id, outcome: None,
+                               interval=0.01, instrumentation=instrumentation).start()
+        try:
+            for _ in range(100):
+                if instrumentation.counters['sharding.poll_failed']:
+                    break
+                time.sleep(0.01)
+        finally:
+            poller.stop()
+        self.assertGreater(instrumentation.counters['sharding.poll_failed'], 0)
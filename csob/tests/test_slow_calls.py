@@ -0,0 +1,110 @@
+import unittest
+from unittest import mock
+
+import requests
+import urllib3.connection
+from requests.adapters import HTTPAdapter
+
+from csob.fake_gateway import FakeGateway
+from csob.hedging import HedgingPolicy
+from csob.instrumentation import Instrumentation
+from csob.slow_calls import SlowCallRecorder, TimedHTTPAdapter
+from csob.tests.test_hedging import FailingFirstGateway
+
+
+class TestSlowCallRecorder(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+
+    def tearDown(self):
+        self.gateway.stop()
+
+    def test_fast_calls_are_not_captured(self):
+        recorder = SlowCallRecorder(threshold=10)
+        client = self.gateway.client(slow_calls=recorder)
+        client.payment_init('1', 100, False, 'https://localhost', 'Test')
+        self.assertEqual([], recorder.dump())
+
+    def test_capture(self):
+        instrumentation = Instrumentation()
+        recorder = SlowCallRecorder(threshold=0.05, maxsize=2, instrumentation=instrumentation)
+        client = self.gateway.client(slow_calls=recorder)
+        self.gateway.delay = 0.1
+        pay_id = client.payment_init('1', 100, False, 'https://localhost', 'Test').response_json['payId']
+        client.payment_status(pay_id)
+        client.payment_close(pay_id, None)
+
+        captures = recorder.dump()
+        self.assertEqual(['payment/status/', 'payment/close/'], [capture['endpoint'] for capture in captures])
+        capture = captures[0]
+        self.assertEqual(client.merchant_id, capture['merchant_id'])
+        self.assertGreaterEqual(capture['duration'], 0.1)
+        self.assertEqual({'sign', 'connect', 'tls', 'wait', 'receive', 'verify', 'other'}, set(capture['phases']))
+        self.assertGreater(capture['phases']['sign'], 0)
+        self.assertGreaterEqual(capture['phases']['wait'], 0.1)
+        self.assertEqual(0, capture['phases']['connect'])
+        self.assertTrue(capture['connection_reused'])
+        self.assertEqual(1, len(capture['attempts']))
+        self.assertEqual({'method': 'GET', 'http_status': 200}, {
+            key: value for key, value in capture['attempts'][0].items() if key in ('method', 'http_status')})
+        self.assertIsNone(capture['profile'])
+
+        self.assertEqual({'recorded': 3, 'size': 2}, instrumentation.collect()['slow_calls'])
+        self.assertEqual(3, instrumentation.counters['slow_call.recorded'])
+        recorder.dump(clear=True)
+        self.assertEqual([], recorder.dump())
+
+    def test_new_connection(self):
+        recorder = SlowCallRecorder(threshold=0)
+        client = self.gateway.client(slow_calls=recorder)
+        client.echo()
+        capture, = recorder.dump()
+        self.assertFalse(capture['connection_reused'])
+        self.assertGreater(capture['phases']['connect'], 0)
+        self.assertEqual(0, capture['phases']['tls'])
+        self.assertGreater(capture['attempts'][0]['connect'], 0)
+
+    def test_adapter_of_client_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=1)
+        session.mount('https://', adapter)
+        recorder = SlowCallRecorder(threshold=0)
+        client = self.gateway.client(slow_calls=recorder, session=session)
+        self.assertIsInstance(client.session.get_adapter(self.gateway.url), TimedHTTPAdapter)
+        self.assertIs(adapter, session.get_adapter('https://localhost/'))
+        self.assertIsInstance(requests.Session().get_adapter(self.gateway.url), HTTPAdapter)
+        self.assertNotIsInstance(requests.Session().get_adapter(self.gateway.url), TimedHTTPAdapter)
+        self.assertEqual('HTTPConnection.connect', urllib3.connection.HTTPConnection.connect.__qualname__)
+
+    def test_calls_without_request_are_not_traced(self):
+        recorder = SlowCallRecorder(threshold=0)
+        client = self.gateway.client(slow_calls=recorder, raise_exceptions=False)
+        with mock.patch.object(recorder, 'start', wraps=recorder.start) as start:
+            client.construct_payment_process_url('123')
+            client.parse_payment_return_url_get({
+                'payId': '123', 'dttm': '20190101000000', 'resultCode': '0', 'resultMessage': 'OK',
+                'signature': 'abc='})
+        start.assert_not_called()
+
+    def test_profile(self):
+        recorder = SlowCallRecorder(threshold=0.05, profile_rate=1)
+        client = self.gateway.client(slow_calls=recorder)
+        self.gateway.delay = 0.1
+        client.echo()
+        capture, = recorder.dump()
+        self.assertIn('get_url_signature', capture['profile'])
+
+    def test_hedged_call(self):
+        gateway = FailingFirstGateway().start()
+        try:
+            recorder = SlowCallRecorder(threshold=0)
+            hedging = HedgingPolicy(initial_delay=0.05, budget=1)
+            client = gateway.client(slow_calls=recorder, hedging=hedging)
+            client.echo()
+            hedging.close()
+        finally:
+            gateway.stop()
+        capture, = recorder.dump()
+        first, hedge = capture['attempts']
+        self.assertEqual(503, first['http_status'])
+        self.assertEqual(200, hedge['http_status'])
@@ -0,0 +1,92 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from unittest import mock
+
+from Crypto.PublicKey import RSA
+
+from csob import crypto
+from csob.fake_gateway import FakeGateway
+
+THREADS = 64
+
+
+def run_concurrently(function, threads=THREADS):
+    barrier = Barrier(threads)
+
+    def run(_):
+        barrier.wait(5)
+        return function()
+
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(run, range(threads)))
+
+
+class TestThreadSafety(unittest.TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+
+    def tearDown(self):
+        self.gateway.stop()
+
+    def test_lazy_initialization(self):
+        client = self.gateway.client()
+
+        def slow_open(*args, **kwargs):
+            time.sleep(0.01)
+            return open(*args, **kwargs)
+
+        with mock.patch('csob.api.open', side_effect=slow_open, create=True) as opened:
+            snapshots = run_concurrently(lambda: client.resource_kwargs)
+
+        self.assertEqual(2, opened.call_count)
+        self.assertTrue(all(snapshot is snapshots[0] for snapshot in snapshots))
+        with self.assertRaises(TypeError):
+            client.resource_kwargs['session'] = None  # type: ignore
+
+    def test_keys_are_parsed_once(self):
+        client = self.gateway.client()
+        key = client.gateway_public_key
+        import_key = RSA.importKey
+
+        def slow_import_key(*args, **kwargs):
+            time.sleep(0.01)
+            return import_key(*args, **kwargs)
+
+        with mock.patch.dict(crypto._imported_keys, clear=True):
+            with mock.patch.object(RSA, 'importKey', side_effect=slow_import_key) as imported:
+                keys = run_concurrently(lambda: crypto.import_key(key))
+        self.assertEqual(1, imported.call_count)
+        self.assertTrue(all(parsed is keys[0] for parsed in keys))
+
+    def test_gateway_public_key_is_not_shared(self):
+        client = self.gateway.client()
+        self.assertIsNotNone(client.gateway_public_key)
+        self.assertIsNone(type(client)._gateway_public_key)
+        self.assertIsNone(client._gateway_public_key)
+
+    def test_concurrent_calls(self):
+        client = self.gateway.client()
+
+        def call():
+            pay_ids = []
+            for _ in range(5):
+                api_response = client.payment_init('1', 100, False, 'https://localhost', 'Test')
+                self.assertTrue(api_response.is_okay and api_response.is_verified)
+                pay_id = api_response.response_json['payId']
+                self.assertTrue(client.payment_status(pay_id).is_verified)
+                pay_ids.append(pay_id)
+            return pay_ids
+
+        pay_ids = [pay_id for pay_ids in run_concurrently(call, threads=16) for pay_id in pay_ids]
+        self.assertEqual(80, len(set(pay_ids)))
+        self.assertEqual(80, len(self.gateway.payments))
+
+    def test_after_fork_swaps_snapshot(self):
+        client = self.gateway.client()
+        snapshot = client.resource_kwargs
+        client.after_fork()
+        self.assertIsNot(snapshot, client.resource_kwargs)
+        self.assertIsNot(snapshot['session'], client.resource_kwargs['session'])
+        self.assertIs(client.session, client.resource_kwargs['session'])
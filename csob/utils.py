@@ -1,5 +1,8 @@
 from datetime import datetime
-from typing import Optional
+from threading import RLock
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
 
 
 def get_dttm(date_time: Optional[datetime] = None) -> str:
@@ -13,3 +16,29 @@ def get_dttm(date_time: Optional[datetime] = None) -> str:
         dttm - str
     """
     return (date_time or datetime.now()).strftime('%Y%m%d%H%M%S')
+
+
+class locked_cached_property(Generic[T]):
+    """
+    Property computed once per instance and stored in its `__dict__`, like `cached_property`.
+
+    The first computation is guarded by a lock so concurrent first accesses from several threads compute the value
+    only once, later reads find the value in `__dict__` without locking. A stored value may be replaced by assigning
+    to `__dict__`, which is atomic.
+    """
+
+    def __init__(self, function: Callable[[Any], T]) -> None:
+        self.function = function
+        self.__doc__ = function.__doc__
+        self.name = function.__name__
+        self.lock = RLock()
+
+    def __get__(self, instance: Any, owner: Any = None) -> T:
+        if instance is None:
+            return self  # type: ignore
+        with self.lock:
+            try:
+                return instance.__dict__[self.name]
+            except KeyError:
+                value = instance.__dict__[self.name] = self.function(instance)
+                return value
@@ -35,7 +35,7 @@ setup(
         'Typing :: Typed',
     ],
     keywords='payments finance csob paymentgateway',
-    packages=find_packages(exclude=['contrib', 'docs', 'tests']),
+    packages=find_packages(exclude=['contrib', 'docs', 'tests', 'benchmarks', 'benchmarks.*']),
     python_requires='>=3.6, <4',
     install_requires=[
         'pycrypto',
@@ -51,6 +51,14 @@ setup(
             'freezegun',
             'mock',
         ],
+        'http2': [
+            'httpx[http2]',
+        ],
+    },
+    entry_points={
+        'console_scripts': [
+            'csob = csob.cli:main',
+        ],
     },
     data_files=[('csob_keys', [
         'csob_keys/mips_platebnibrana.csob.cz.cer',